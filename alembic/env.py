@@ -1,10 +1,16 @@
 from logging.config import fileConfig
 
+import re
+
+import sqlalchemy as sa
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
 from alembic import context
 
+from database.database import DATABASE_URL
+from database import models
+
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
@@ -14,11 +20,32 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Use the same database as the app unless a URL was passed in explicitly
+if DATABASE_URL and config.get_main_option("sqlalchemy.url").startswith("driver://"):
+    config.set_main_option("sqlalchemy.url", DATABASE_URL.replace("%", "%%"))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
-target_metadata = None
+target_metadata = models.Base.metadata
+
+# Search indexes the search migrations create by hand, with dialect specific
+# DDL the metadata can't describe: FTS5 tables and their shadow tables on
+# SQLite, GIN and FULLTEXT indexes elsewhere
+SEARCH_OBJECTS = re.compile(r"^(products|suppliers)_fts(_\w+)?$|^(ix|ft)_\w+_(search|trgm)$")
+
+
+def include_name(name, type_, parent_names):
+    return not (type_ in ("table", "index") and SEARCH_OBJECTS.match(name or ""))
+
+
+def compare_type(context, inspected_column, metadata_column, inspected_type, metadata_type):
+    # SQLite reflects the declared type name: Uuid is declared CHAR(32), and
+    # back_image kept VARCHAR when it became JSON, which SQLite stores as text anyway
+    if context.dialect.name == "sqlite" and isinstance(metadata_type, (sa.Uuid, sa.JSON)):
+        return False
+    return None
 
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
@@ -44,6 +71,9 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
+        compare_type=compare_type,
+        render_as_batch=url.startswith("sqlite"),
     )
 
     with context.begin_transaction():
@@ -65,7 +95,12 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            compare_type=compare_type,
+            # SQLite can't ALTER most things in place, batch mode rebuilds the table
+            render_as_batch=connection.dialect.name == "sqlite",
         )
 
         with context.begin_transaction():
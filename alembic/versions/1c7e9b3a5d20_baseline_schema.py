@@ -0,0 +1,128 @@
+"""baseline schema
+
+Revision ID: 1c7e9b3a5d20
+Revises:
+Create Date: 2026-10-17 08:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c7e9b3a5d20'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+PAYMENT_METHODS = ("cash", "card", "mobile_money", "bank_transfer", "credit")
+SALE_STATUSES = ("completed", "pending", "refunded", "partially_refunded")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The tables the app used to create_all before migrations existed; databases
+    # bootstrapped that way already have them and only run the revisions after this one
+    tables = sa.inspect(op.get_bind()).get_table_names()
+
+    if "users" not in tables:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("names", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False, unique=True),
+            sa.Column("phone", sa.Integer(), nullable=False, unique=True),
+            sa.Column("password", sa.String(), nullable=False),
+            sa.Column("role", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.UniqueConstraint("email", name="unique_user_email"),
+        )
+    if "products" not in tables:
+        op.create_table(
+            "products",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("created_by", sa.Uuid(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("product_name", sa.String(), nullable=False),
+            sa.Column("selling_price", sa.Float(), nullable=False),
+            sa.Column("buying_price", sa.Float(), nullable=False),
+            sa.Column("quantity", sa.Integer(), nullable=False),
+            sa.Column("category", sa.String(), nullable=False),
+            sa.Column("brand", sa.String(), nullable=False),
+            sa.Column("front_image", sa.String(), nullable=False),
+            sa.Column("back_image", sa.String(), nullable=False),
+            sa.Column("description", sa.String(), nullable=False),
+            sa.Column("sku", sa.String(), nullable=False, unique=True),
+            sa.Column("unit", sa.String(), nullable=False),
+            sa.Column("low_stock_alert", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("last_modified", sa.DateTime(), nullable=True),
+            sa.UniqueConstraint("sku", name="unique_product_sku"),
+        )
+    if "sales" not in tables:
+        op.create_table(
+            "sales",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("buyer_name", sa.String(100), nullable=False),
+            sa.Column("buyer_phone", sa.String(20), nullable=False),
+            sa.Column("buyer_email", sa.String(), nullable=True),
+            sa.Column("payment_method", sa.Enum(*PAYMENT_METHODS, name="paymentmethoddb"), nullable=False),
+            sa.Column("payment_reference", sa.String(), nullable=True),
+            sa.Column("subtotal", sa.Float(), nullable=False),
+            sa.Column("total_discount", sa.Float(), nullable=False),
+            sa.Column("taxes", sa.Float(), nullable=False),
+            sa.Column("total", sa.Float(), nullable=False),
+            sa.Column("currency", sa.String(3), nullable=False),
+            sa.Column("status", sa.Enum(*SALE_STATUSES, name="salestatusdb"), nullable=False),
+            sa.Column("notes", sa.String(), nullable=True),
+            sa.Column("sold_by", sa.Uuid(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("sold_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        )
+    if "products_sold" not in tables:
+        op.create_table(
+            "products_sold",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("sale_id", sa.Uuid(), sa.ForeignKey("sales.id"), nullable=False),
+            sa.Column("product_id", sa.Uuid(), sa.ForeignKey("products.id"), nullable=False),
+            sa.Column("product_name", sa.String(), nullable=False),
+            sa.Column("quantity_sold", sa.Integer(), nullable=False),
+            sa.Column("selling_price", sa.Float(), nullable=False),
+            sa.Column("cost_price", sa.Float(), nullable=True),
+            sa.Column("discount", sa.Float(), nullable=False),
+        )
+    if "locations" not in tables:
+        op.create_table(
+            "locations",
+            sa.Column("id", sa.Uuid(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("address", sa.String(), nullable=False),
+            sa.Column("manager_id", sa.Uuid(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("is_active", sa.Boolean(), nullable=False),
+        )
+    if "suppliers" not in tables:
+        op.create_table(
+            "suppliers",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("contact_person", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False, unique=True),
+            sa.Column("phone", sa.String(), nullable=False),
+            sa.Column("address", sa.String(), nullable=False),
+            sa.Column("company_website", sa.String(), nullable=True),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_suppliers_id", "suppliers", ["id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ("suppliers", "locations", "products_sold", "sales", "products", "users"):
+        op.drop_table(table)
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("DROP TYPE IF EXISTS salestatusdb")
+        op.execute("DROP TYPE IF EXISTS paymentmethoddb")
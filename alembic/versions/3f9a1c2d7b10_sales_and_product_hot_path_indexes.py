@@ -0,0 +1,63 @@
+"""sales and product hot path indexes
+
+Revision ID: 3f9a1c2d7b10
+Revises: 1c7e9b3a5d20
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a1c2d7b10'
+down_revision: Union[str, Sequence[str], None] = '1c7e9b3a5d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LOW_STOCK = sa.text("quantity <= low_stock_alert")
+
+INDEXES = [
+    # listing and report ranges, keyset order of GET /sales/
+    ("ix_sales_sold_at", "sales", ["sold_at", "id"], {}),
+    # get_sales_by_seller, search_sales by seller and period
+    ("ix_sales_sold_by", "sales", ["sold_by", "sold_at"], {}),
+    ("ix_sales_status", "sales", ["status", "sold_at"], {}),
+    # sale detail / selectinload of line items
+    ("ix_products_sold_sale_id", "products_sold", ["sale_id"], {}),
+    ("ix_products_sold_product_id", "products_sold", ["product_id", "sale_id"], {}),
+    ("ix_products_category", "products", ["category", "id"], {}),
+    # only products at or below their alert level, MySQL has no partial indexes and skips it
+    ("ix_products_low_stock", "products", ["category", "id"], {"sqlite_where": LOW_STOCK, "postgresql_where": LOW_STOCK}),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+
+    # Keyset pagination on (sold_at, id) needs every sale to have a timestamp
+    op.execute("UPDATE sales SET sold_at = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE sold_at IS NULL")
+    # SQLite can't change nullability in place, batch mode rebuilds the table there
+    if next(c for c in sa.inspect(bind).get_columns("sales") if c["name"] == "sold_at")["nullable"]:
+        with op.batch_alter_table("sales") as batch_op:
+            batch_op.alter_column("sold_at", existing_type=sa.DateTime(timezone=True), nullable=False)
+
+    for name, table, columns, kwargs in INDEXES:
+        if name == "ix_products_low_stock" and bind.dialect.name == "mysql":
+            continue
+        op.create_index(name, table, columns, if_not_exists=True, **kwargs)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    for name, table, columns, kwargs in reversed(INDEXES):
+        if name == "ix_products_low_stock" and bind.dialect.name == "mysql":
+            continue
+        op.drop_index(name, table_name=table, if_exists=True)
+
+    with op.batch_alter_table("sales") as batch_op:
+        batch_op.alter_column("sold_at", existing_type=sa.DateTime(timezone=True), nullable=True)
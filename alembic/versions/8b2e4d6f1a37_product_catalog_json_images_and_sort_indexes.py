@@ -0,0 +1,51 @@
+"""product catalog json images and sort indexes
+
+Revision ID: 8b2e4d6f1a37
+Revises: 3f9a1c2d7b10
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2e4d6f1a37'
+down_revision: Union[str, Sequence[str], None] = '3f9a1c2d7b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+
+    # back_image held a JSON encoded string; rows that never parsed were served as []
+    if dialect == "sqlite":
+        # SQLite stores JSON as text already, only broken values need fixing
+        op.execute("UPDATE products SET back_image = '[]' WHERE json_valid(back_image) = 0")
+    elif dialect == "postgresql":
+        op.execute(
+            "ALTER TABLE products ALTER COLUMN back_image TYPE JSON "
+            "USING CASE WHEN back_image ~ '^\\s*\\[' THEN back_image::json ELSE '[]'::json END"
+        )
+    else:
+        op.execute("UPDATE products SET back_image = '[]' WHERE JSON_VALID(back_image) = 0")
+        op.alter_column("products", "back_image", type_=sa.JSON(), existing_type=sa.String(), existing_nullable=False)
+
+    op.create_index("ix_products_created_at", "products", ["created_at", "id"], if_not_exists=True)
+    op.create_index("ix_products_selling_price", "products", ["selling_price", "id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    op.drop_index("ix_products_selling_price", table_name="products", if_exists=True)
+    op.drop_index("ix_products_created_at", table_name="products", if_exists=True)
+
+    if dialect == "postgresql":
+        op.execute("ALTER TABLE products ALTER COLUMN back_image TYPE VARCHAR USING back_image::text")
+    elif dialect != "sqlite":
+        op.alter_column("products", "back_image", type_=sa.String(), existing_type=sa.JSON(), existing_nullable=False)
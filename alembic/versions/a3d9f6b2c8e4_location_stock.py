@@ -0,0 +1,70 @@
+"""location stock
+
+Revision ID: a3d9f6b2c8e4
+Revises: f2c8e1a4b7d9
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d9f6b2c8e4'
+down_revision: Union[str, Sequence[str], None] = 'f2c8e1a4b7d9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MOVEMENT_KINDS = ("sale", "refund", "receipt", "adjustment")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    dialect = bind.dialect.name
+
+    if dialect == "postgresql":
+        op.execute("ALTER TYPE movementkinddb ADD VALUE IF NOT EXISTS 'transfer'")
+    elif dialect == "mysql":
+        op.alter_column(
+            "inventory_movements", "kind",
+            type_=sa.Enum(*MOVEMENT_KINDS, "transfer", name="movementkinddb"), existing_nullable=False
+        )
+
+    if "location_id" not in {c["name"] for c in inspector.get_columns("sales")}:
+        # SQLite can't add a constraint to an existing table, batch mode rebuilds it there
+        with op.batch_alter_table("sales") as batch_op:
+            batch_op.add_column(sa.Column("location_id", sa.Uuid(), nullable=True))
+            batch_op.create_foreign_key("fk_sales_location_id", "locations", ["location_id"], ["id"])
+    op.create_index("ix_sales_location_id", "sales", ["location_id", "sold_at", "id"], if_not_exists=True)
+
+    if "location_id" not in {c["name"] for c in inspector.get_columns("inventory_movements")}:
+        op.add_column("inventory_movements", sa.Column("location_id", sa.Uuid(), nullable=True))
+
+    if "location_stock" not in inspector.get_table_names():
+        op.create_table(
+            "location_stock",
+            sa.Column("location_id", sa.Uuid(), sa.ForeignKey("locations.id"), primary_key=True),
+            sa.Column("product_id", sa.Uuid(), sa.ForeignKey("products.id"), primary_key=True),
+            sa.Column("quantity", sa.Integer(), nullable=False),
+        )
+    op.create_index("ix_location_stock_product_id", "location_stock", ["product_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_location_stock_product_id", table_name="location_stock", if_exists=True)
+    op.drop_table("location_stock")
+    with op.batch_alter_table("inventory_movements") as batch_op:
+        batch_op.drop_column("location_id")
+    op.drop_index("ix_sales_location_id", table_name="sales", if_exists=True)
+    # Databases bootstrapped by create_all have the key unnamed, dropping the column takes it along
+    named = "fk_sales_location_id" in {fk["name"] for fk in sa.inspect(op.get_bind()).get_foreign_keys("sales")}
+    with op.batch_alter_table("sales") as batch_op:
+        if named:
+            batch_op.drop_constraint("fk_sales_location_id", type_="foreignkey")
+        batch_op.drop_column("location_id")
+    # PostgreSQL can't drop a value from an enum type, 'transfer' stays unused
@@ -0,0 +1,46 @@
+"""product change feed
+
+Revision ID: a91f3c5e7d20
+Revises: e7a3b5c9d1f2
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a91f3c5e7d20'
+down_revision: Union[str, Sequence[str], None] = 'e7a3b5c9d1f2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if "product_changes" not in sa.inspect(bind).get_table_names():
+        op.create_table(
+            "product_changes",
+            sa.Column("seq", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("product_id", sa.Uuid(), nullable=False),
+            sa.Column("changed_at", sa.DateTime(timezone=True), nullable=False),
+            sqlite_autoincrement=True,
+        )
+    op.create_index("ix_product_changes_product_id", "product_changes", ["product_id"], if_not_exists=True)
+
+    # Seed the feed with the current catalog so a full sync (no cursor) sees every product
+    op.execute(
+        "INSERT INTO product_changes (product_id, changed_at) "
+        "SELECT id, COALESCE(last_modified, created_at, CURRENT_TIMESTAMP) FROM products "
+        "WHERE id NOT IN (SELECT product_id FROM product_changes) "
+        "ORDER BY created_at, id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_product_changes_product_id", table_name="product_changes", if_exists=True)
+    op.drop_table("product_changes")
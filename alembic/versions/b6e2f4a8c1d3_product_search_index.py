@@ -0,0 +1,75 @@
+"""product search index
+
+Revision ID: b6e2f4a8c1d3
+Revises: a91f3c5e7d20
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6e2f4a8c1d3'
+down_revision: Union[str, Sequence[str], None] = 'a91f3c5e7d20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', product_name || ' ' || sku), 'A') || "
+    "setweight(to_tsvector('simple', brand), 'B') || "
+    "setweight(to_tsvector('simple', category), 'C') || "
+    "setweight(to_tsvector('simple', description), 'D')"
+)
+FTS_COLUMNS = "(product_id, product_name, brand, category, sku, description)"
+FTS_ROW = "(new.id, new.product_name, new.brand, new.category, new.sku, new.description)"
+FTS_DELETE = "DELETE FROM products_fts WHERE products_fts MATCH 'product_id:\"' || old.id || '\"'"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        created = "products_fts" not in sa.inspect(bind).get_table_names()
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+            "product_id, product_name, brand, category, sku, description, "
+            "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN "
+            f"INSERT INTO products_fts {FTS_COLUMNS} VALUES {FTS_ROW}; END"
+        )
+        op.execute(
+            f"CREATE TRIGGER IF NOT EXISTS products_fts_update "
+            f"AFTER UPDATE OF product_name, brand, category, sku, description ON products BEGIN "
+            f"{FTS_DELETE}; INSERT INTO products_fts {FTS_COLUMNS} VALUES {FTS_ROW}; END"
+        )
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN {FTS_DELETE}; END")
+        if created:
+            # Index the products that existed before the triggers
+            op.execute(
+                f"INSERT INTO products_fts {FTS_COLUMNS} "
+                "SELECT id, product_name, brand, category, sku, description FROM products"
+            )
+    elif dialect == "postgresql":
+        op.execute(f"CREATE INDEX IF NOT EXISTS ix_products_search ON products USING gin (({SEARCH_VECTOR}))")
+    elif dialect == "mysql":
+        if "ft_products_search" not in {i["name"] for i in sa.inspect(bind).get_indexes("products")}:
+            op.execute("CREATE FULLTEXT INDEX ft_products_search ON products (product_name, brand, category, sku, description)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in ("products_fts_insert", "products_fts_update", "products_fts_delete"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS products_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_products_search")
+    elif dialect == "mysql":
+        op.execute("DROP INDEX ft_products_search ON products")
@@ -0,0 +1,62 @@
+"""supplier products and replenishment
+
+Revision ID: b8e4c1f7d2a6
+Revises: a3d9f6b2c8e4
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e4c1f7d2a6'
+down_revision: Union[str, Sequence[str], None] = 'a3d9f6b2c8e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if "supplier_products" not in tables:
+        op.create_table(
+            "supplier_products",
+            sa.Column("supplier_id", sa.Integer(), sa.ForeignKey("suppliers.id"), primary_key=True),
+            sa.Column("product_id", sa.Uuid(), sa.ForeignKey("products.id"), primary_key=True),
+            sa.Column("lead_time_days", sa.Integer(), nullable=False),
+            sa.Column("pack_size", sa.Integer(), nullable=False),
+            sa.Column("unit_cost", sa.Float(), nullable=False),
+            sa.Column("preferred", sa.Boolean(), nullable=False),
+            sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        )
+    op.create_index("ix_supplier_products_product_id", "supplier_products", ["product_id"], if_not_exists=True)
+
+    # Filled by the first run of utils/replenishment.py
+    if "replenishment_suggestions" not in tables:
+        op.create_table(
+            "replenishment_suggestions",
+            sa.Column("product_id", sa.Uuid(), primary_key=True),
+            sa.Column("supplier_id", sa.Integer(), nullable=False),
+            sa.Column("demand_per_day", sa.Float(), nullable=False),
+            sa.Column("on_hand", sa.Integer(), nullable=False),
+            sa.Column("safety_stock", sa.Integer(), nullable=False),
+            sa.Column("reorder_point", sa.Integer(), nullable=False),
+            sa.Column("order_quantity", sa.Integer(), nullable=False),
+            sa.Column("unit_cost", sa.Float(), nullable=False),
+            sa.Column("computed_at", sa.DateTime(timezone=True), nullable=False),
+        )
+    op.create_index(
+        "ix_replenishment_suggestions_supplier_id", "replenishment_suggestions", ["supplier_id", "product_id"],
+        if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_replenishment_suggestions_supplier_id", table_name="replenishment_suggestions", if_exists=True)
+    op.drop_table("replenishment_suggestions")
+    op.drop_index("ix_supplier_products_product_id", table_name="supplier_products", if_exists=True)
+    op.drop_table("supplier_products")
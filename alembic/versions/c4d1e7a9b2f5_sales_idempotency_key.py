@@ -0,0 +1,35 @@
+"""sales idempotency key
+
+Revision ID: c4d1e7a9b2f5
+Revises: 8b2e4d6f1a37
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d1e7a9b2f5'
+down_revision: Union[str, Sequence[str], None] = '8b2e4d6f1a37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases bootstrapped by the app's create_all may already have the column
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("sales")}
+    if "idempotency_key" not in columns:
+        op.add_column("sales", sa.Column("idempotency_key", sa.String(length=64), nullable=True))
+    # Existing sales keep NULL, which every backend allows more than once in a unique index
+    op.create_index("ux_sales_idempotency_key", "sales", ["idempotency_key"], unique=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ux_sales_idempotency_key", table_name="sales", if_exists=True)
+    with op.batch_alter_table("sales") as batch_op:
+        batch_op.drop_column("idempotency_key")
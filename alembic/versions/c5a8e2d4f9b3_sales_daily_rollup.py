@@ -0,0 +1,116 @@
+"""sales daily rollup
+
+Revision ID: c5a8e2d4f9b3
+Revises: b8e4c1f7d2a6
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a8e2d4f9b3'
+down_revision: Union[str, Sequence[str], None] = 'b8e4c1f7d2a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SALE_STATUSES = ("completed", "pending", "refunded", "partially_refunded")
+# models.SALE_TOTALS_PRODUCT_ID, the rows holding sale level totals
+SALE_TOTALS_PRODUCT_ID = uuid.UUID("ffffffff-ffff-ffff-ffff-ffffffffffff")
+
+sales = sa.table(
+    "sales",
+    sa.column("id", sa.Uuid()), sa.column("status", sa.String()), sa.column("sold_by", sa.Uuid()),
+    sa.column("sold_at", sa.DateTime(timezone=True)), sa.column("total", sa.Float()), sa.column("taxes", sa.Float()),
+)
+lines = sa.table(
+    "products_sold",
+    sa.column("sale_id", sa.Uuid()), sa.column("product_id", sa.Uuid()), sa.column("product_name", sa.String()),
+    sa.column("quantity_sold", sa.Integer()), sa.column("selling_price", sa.Float()),
+    sa.column("cost_price", sa.Float()), sa.column("discount", sa.Float()),
+)
+
+
+def sale_day(dialect: str):
+    """The UTC calendar day of a sale, as utils.rollup.sale_day computes it."""
+    if dialect == "postgresql":
+        return sa.cast(sa.func.timezone("UTC", sales.c.sold_at), sa.Date)
+    return sa.func.date(sales.c.sold_at)
+
+
+def backfill(rollup: sa.Table, dialect: str) -> None:
+    """utils.rollup.rebuild in two INSERT ... SELECTs: the sale totals rows, then the product rows."""
+    if dialect != "postgresql":
+        # Same as rollup.normalize_legacy_enums, sales from before enum values were stored
+        op.execute("UPDATE sales SET status = LOWER(status) WHERE status <> LOWER(status)")
+        op.execute("UPDATE sales SET payment_method = LOWER(payment_method) WHERE payment_method <> LOWER(payment_method)")
+
+    day = sale_day(dialect).label("day")
+    columns = ["day", "status", "sold_by", "product_id", "product_name",
+               "sales_count", "units_sold", "revenue", "cost", "taxes"]
+    totals = (
+        sa.select(
+            day, sales.c.status, sales.c.sold_by,
+            sa.literal(SALE_TOTALS_PRODUCT_ID, sa.Uuid()), sa.null(),
+            sa.func.count(), sa.literal(0), sa.func.sum(sales.c.total), sa.literal(0.0), sa.func.sum(sales.c.taxes),
+        )
+        .group_by(day, sales.c.status, sales.c.sold_by)
+    )
+    op.execute(rollup.insert().from_select(columns, totals))
+
+    products = (
+        sa.select(
+            day, sales.c.status, sales.c.sold_by, lines.c.product_id, sa.func.max(lines.c.product_name),
+            sa.func.count(sa.distinct(sales.c.id)),
+            sa.func.sum(lines.c.quantity_sold),
+            sa.func.sum(lines.c.selling_price * lines.c.quantity_sold - lines.c.discount),
+            sa.func.sum(sa.func.coalesce(lines.c.cost_price, 0.0) * lines.c.quantity_sold),
+            sa.literal(0.0),
+        )
+        .join(lines, lines.c.sale_id == sales.c.id)
+        .group_by(day, sales.c.status, sales.c.sold_by, lines.c.product_id)
+    )
+    op.execute(rollup.insert().from_select(columns, products))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+
+    if "sales_daily_rollup" not in sa.inspect(bind).get_table_names():
+        # PostgreSQL already has the type, from sales.status
+        status = (
+            postgresql.ENUM(*SALE_STATUSES, name="salestatusdb", create_type=False) if dialect == "postgresql"
+            else sa.Enum(*SALE_STATUSES, name="salestatusdb")
+        )
+        rollup = op.create_table(
+            "sales_daily_rollup",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("day", sa.Date(), nullable=False),
+            sa.Column("status", status, nullable=False),
+            sa.Column("sold_by", sa.Uuid(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("product_id", sa.Uuid(), nullable=False),
+            sa.Column("product_name", sa.String(), nullable=True),
+            sa.Column("sales_count", sa.Integer(), nullable=False),
+            sa.Column("units_sold", sa.Integer(), nullable=False),
+            sa.Column("revenue", sa.Float(), nullable=False),
+            sa.Column("cost", sa.Float(), nullable=False),
+            sa.Column("taxes", sa.Float(), nullable=False),
+        )
+        backfill(rollup, dialect)
+    op.create_index(
+        "ux_sales_daily_rollup_key", "sales_daily_rollup", ["day", "status", "sold_by", "product_id"],
+        unique=True, if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ux_sales_daily_rollup_key", table_name="sales_daily_rollup", if_exists=True)
+    op.drop_table("sales_daily_rollup")
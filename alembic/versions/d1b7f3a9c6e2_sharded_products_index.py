@@ -0,0 +1,36 @@
+"""sharded products index
+
+Revision ID: d1b7f3a9c6e2
+Revises: c5a8e2d4f9b3
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1b7f3a9c6e2'
+down_revision: Union[str, Sequence[str], None] = 'c5a8e2d4f9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SHARDED = sa.text("stock_slots > 0")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Low stock reads the sharded products by their live stock, MySQL has no partial indexes and skips it
+    if op.get_bind().dialect.name != "mysql":
+        op.create_index(
+            "ix_products_sharded", "products", ["category", "id"],
+            sqlite_where=SHARDED, postgresql_where=SHARDED, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != "mysql":
+        op.drop_index("ix_products_sharded", table_name="products", if_exists=True)
@@ -0,0 +1,64 @@
+"""supplier search and status index
+
+Revision ID: d4f7a2c6e8b1
+Revises: b6e2f4a8c1d3
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f7a2c6e8b1'
+down_revision: Union[str, Sequence[str], None] = 'b6e2f4a8c1d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FTS_DELETE = (
+    "INSERT INTO suppliers_fts (suppliers_fts, rowid, name, contact_person) "
+    "VALUES ('delete', old.id, old.name, old.contact_person)"
+)
+FTS_INSERT = "INSERT INTO suppliers_fts (rowid, name, contact_person) VALUES (new.id, new.name, new.contact_person)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_suppliers_status", "suppliers", ["status", "id"], if_not_exists=True)
+
+    bind = op.get_bind()
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        created = "suppliers_fts" not in sa.inspect(bind).get_table_names()
+        op.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS suppliers_fts USING fts5("
+            "name, contact_person, content = 'suppliers', content_rowid = 'id', tokenize = 'trigram')"
+        )
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS suppliers_fts_insert AFTER INSERT ON suppliers BEGIN {FTS_INSERT}; END")
+        op.execute(
+            "CREATE TRIGGER IF NOT EXISTS suppliers_fts_update AFTER UPDATE OF name, contact_person ON suppliers "
+            f"BEGIN {FTS_DELETE}; {FTS_INSERT}; END"
+        )
+        op.execute(f"CREATE TRIGGER IF NOT EXISTS suppliers_fts_delete AFTER DELETE ON suppliers BEGIN {FTS_DELETE}; END")
+        if created:
+            # Index the suppliers that existed before the triggers
+            op.execute("INSERT INTO suppliers_fts (suppliers_fts) VALUES ('rebuild')")
+    elif dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_suppliers_name_trgm ON suppliers USING gin (name gin_trgm_ops)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_suppliers_contact_person_trgm ON suppliers USING gin (contact_person gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in ("suppliers_fts_insert", "suppliers_fts_update", "suppliers_fts_delete"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS suppliers_fts")
+    elif dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_suppliers_contact_person_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_suppliers_name_trgm")
+    op.drop_index("ix_suppliers_status", table_name="suppliers", if_exists=True)
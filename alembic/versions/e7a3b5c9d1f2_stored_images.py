@@ -0,0 +1,37 @@
+"""stored images
+
+Revision ID: e7a3b5c9d1f2
+Revises: c4d1e7a9b2f5
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a3b5c9d1f2'
+down_revision: Union[str, Sequence[str], None] = 'c4d1e7a9b2f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Images stored before this keep their random names and are never reference counted
+    if "stored_images" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "stored_images",
+        sa.Column("filename", sa.String(length=80), primary_key=True),
+        sa.Column("size", sa.Integer(), nullable=True),
+        sa.Column("ref_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("stored_images")
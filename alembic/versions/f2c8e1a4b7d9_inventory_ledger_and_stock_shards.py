@@ -0,0 +1,78 @@
+"""inventory ledger and stock shards
+
+Revision ID: f2c8e1a4b7d9
+Revises: d4f7a2c6e8b1
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8e1a4b7d9'
+down_revision: Union[str, Sequence[str], None] = 'd4f7a2c6e8b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MOVEMENT_KINDS = ("sale", "refund", "receipt", "adjustment")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = sa.inspect(op.get_bind())
+    tables = inspector.get_table_names()
+
+    if "stock_slots" not in {c["name"] for c in inspector.get_columns("products")}:
+        op.add_column("products", sa.Column("stock_slots", sa.Integer(), nullable=False, server_default="0"))
+
+    if "stock_shards" not in tables:
+        op.create_table(
+            "stock_shards",
+            sa.Column("product_id", sa.Uuid(), sa.ForeignKey("products.id"), primary_key=True),
+            sa.Column("slot", sa.Integer(), primary_key=True),
+            sa.Column("quantity", sa.Integer(), nullable=False),
+        )
+
+    if "inventory_movements" not in tables:
+        op.create_table(
+            "inventory_movements",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("product_id", sa.Uuid(), nullable=False),
+            sa.Column("kind", sa.Enum(*MOVEMENT_KINDS, name="movementkinddb"), nullable=False),
+            sa.Column("quantity", sa.Integer(), nullable=False),
+            sa.Column("sale_id", sa.Uuid(), nullable=True),
+            sa.Column("created_by", sa.Uuid(), nullable=True),
+            sa.Column("note", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+            sqlite_autoincrement=True,
+        )
+    # The stock that predates the ledger, so every product's movements sum to its quantity. Also
+    # for databases where create_all made the table already, hence per product without movements
+    op.execute(
+        "INSERT INTO inventory_movements (product_id, kind, quantity, created_by, note, created_at) "
+        "SELECT id, 'adjustment', quantity, created_by, 'Opening balance', CURRENT_TIMESTAMP FROM products "
+        "WHERE quantity <> 0 AND NOT EXISTS "
+        "(SELECT 1 FROM inventory_movements m WHERE m.product_id = products.id) ORDER BY id"
+    )
+    op.create_index("ix_inventory_movements_product_id", "inventory_movements", ["product_id", "id"], if_not_exists=True)
+    op.create_index("ix_inventory_movements_sale_id", "inventory_movements", ["sale_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Fold sharded stock back into the product rows before the shards go
+    op.execute(
+        "UPDATE products SET quantity = "
+        "(SELECT COALESCE(SUM(quantity), 0) FROM stock_shards WHERE stock_shards.product_id = products.id) "
+        "WHERE stock_slots > 0"
+    )
+    op.drop_index("ix_inventory_movements_sale_id", table_name="inventory_movements", if_exists=True)
+    op.drop_index("ix_inventory_movements_product_id", table_name="inventory_movements", if_exists=True)
+    op.drop_table("inventory_movements")
+    op.drop_table("stock_shards")
+    with op.batch_alter_table("products") as batch_op:
+        batch_op.drop_column("stock_slots")
+    sa.Enum(name="movementkinddb").drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,62 @@
+"""
+Auth overhead per request with and without the verified-token cache.
+
+    python -m benchmarks.auth_cache [iterations]
+
+Times get_current_user on its own (signature check and user lookup when
+uncached) and a full GET /api/v1/ping through the app.
+"""
+import os, sys, tempfile, time
+from uuid import uuid4
+
+# A file, so the app's threads all see the one user below
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'auth.db')}")
+os.environ.setdefault("SECRETE_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from fastapi.testclient import TestClient
+
+from auth.auth import get_current_user
+from main import app
+from database import models
+from database.database import SessionLocal
+from utils import auth_cache
+from utils.functions import generate_access_token
+
+
+def per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def run(iterations: int = 20000) -> dict:
+    db = SessionLocal()
+    user = models.User(id=uuid4(), names="Benchmark", email=f"{uuid4().hex[:8]}@example.com",
+                       phone=uuid4().int % 10**9, password="-", role="user")
+    db.add(user)
+    db.commit()
+    token = generate_access_token({"sub": str(user.id)})
+    client = TestClient(app)
+    headers = {"Authorization": f"Bearer {token}"}
+    results = {}
+
+    for label, ttl in (("uncached", 0), ("cached", auth_cache.AUTH_CACHE_TTL or 300)):
+        for cache in (auth_cache.tokens, auth_cache.users):
+            cache.clear()
+            cache.ttl = ttl
+        get_current_user(token, db)  # warm up
+        results[f"get_current_user_{label}_us"] = per_call_us(lambda: get_current_user(token, db), iterations)
+        results[f"ping_{label}_us"] = per_call_us(lambda: client.get("/api/v1/ping", headers=headers), iterations // 10)
+
+    results["auth_saving_us"] = results["get_current_user_uncached_us"] - results["get_current_user_cached_us"]
+    results["token_cache"] = auth_cache.tokens.stats()
+    db.close()
+    return results
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for name, value in run(iterations).items():
+        print(f"{name:32} {value:.2f}" if isinstance(value, float) else f"{name:32} {value}")
@@ -0,0 +1,226 @@
+"""
+Throughput and latency of the main endpoints against a seeded database.
+
+    python -m benchmarks.seed --scale medium
+    python -m benchmarks.load [--requests 500] [--concurrency 16] [--out baseline.json] [--compare old.json]
+
+Drives the real app in process through httpx's ASGI transport, one scenario
+after the other, each with `concurrency` workers sharing `requests` requests.
+Queries and DB time per request come from the app's X-DB-Queries and
+X-DB-Time-Ms headers. The results are printed and, with --out, written as a
+JSON baseline that a later run can be compared against with --compare.
+"""
+import argparse, json, math, os, platform, random, statistics, subprocess, sys, time
+from datetime import timedelta
+
+os.environ.setdefault("SECRETE_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+from benchmarks import seed  # sets the default DATABASE_URL before the app reads it
+
+import asyncio
+import httpx
+from sqlalchemy import func, select
+
+from database import models
+from database.database import SessionLocal, engine
+from main import app
+from utils import cache
+from utils.functions import BCRYPT_ROUNDS
+
+SCENARIOS = ["login", "get_products", "sell_product", "report_summary", "get_all_sales"]
+# Compared between runs, in this order; True when higher is better
+HEADLINE = {"rps": True, "p50_ms": False, "p95_ms": False, "p99_ms": False, "queries_per_request": False}
+
+
+class Shop:
+    """What the scenarios need to know about the seeded data."""
+
+    def __init__(self):
+        with SessionLocal() as db:
+            self.emails = db.scalars(select(models.User.email).order_by(models.User.email)).all()
+            # In stock with room to spare, so selling one unit never fails for lack of stock
+            self.products = db.execute(
+                select(models.Product.id, models.Product.selling_price)
+                .where(models.Product.quantity > 1000).order_by(models.Product.sku).limit(2000)
+            ).all()
+            self.categories = db.scalars(select(models.Product.category).distinct()).all()
+            first, last = db.execute(select(func.min(models.Sale.sold_at), func.max(models.Sale.sold_at))).one()
+        if not (self.emails and self.products and first):
+            raise SystemExit("Nothing to benchmark, seed the database first: python -m benchmarks.seed")
+        self.first_day, self.last_day = first.date(), last.date()
+
+
+def scenario(name: str, shop: Shop, headers: dict, worker: int):
+    """The request function of one worker. Each worker has its own paging position and random stream."""
+    rng = random.Random(f"{name}-{worker}")
+    state = {"cursor": None, "category": None}
+
+    async def login(client):
+        form = {"username": rng.choice(shop.emails), "password": seed.PASSWORD}
+        return await client.post("/api/v1/login", data=form)
+
+    async def get_products(client):
+        # Walk a category page by page, then start over with another one
+        if state["cursor"] is None:
+            state["category"] = rng.choice(shop.categories)
+        params = {"limit": 50, "category": state["category"]}
+        if state["cursor"]:
+            params["cursor"] = state["cursor"]
+        response = await client.get("/api/v1/get_products", params=params, headers=headers)
+        state["cursor"] = response.json().get("next_cursor") if response.status_code == 200 else None
+        return response
+
+    async def sell_product(client):
+        product_id, price = rng.choice(shop.products)
+        sale = {
+            "buyer_name": "Load test", "buyer_phone": "0700000000", "payment_method": "cash",
+            "products": [{"product_id": str(product_id), "quantity_sold": 1, "selling_price": price}],
+        }
+        return await client.post("/api/v1/sales/sell_product", json=sale, headers=headers)
+
+    async def report_summary(client):
+        # A random 30 day window of the seeded history
+        span = max((shop.last_day - shop.first_day).days - 30, 0)
+        start = shop.first_day + timedelta(days=rng.randint(0, span))
+        params = {"date_from": start.isoformat(), "date_to": (start + timedelta(days=30)).isoformat()}
+        return await client.get("/api/v1/sales/report/summary", params=params, headers=headers)
+
+    async def get_all_sales(client):
+        params = {"limit": 50}
+        if state["cursor"]:
+            params["cursor"] = state["cursor"]
+        response = await client.get("/api/v1/sales/", params=params, headers=headers)
+        state["cursor"] = response.json().get("next_cursor") if response.status_code == 200 else None
+        return response
+
+    return {
+        "login": login, "get_products": get_products, "sell_product": sell_product,
+        "report_summary": report_summary, "get_all_sales": get_all_sales,
+    }[name]
+
+
+def percentile(samples: list[float], p: float) -> float:
+    """Nearest rank percentile of sorted samples."""
+    return samples[max(math.ceil(p * len(samples)) - 1, 0)]
+
+
+def summarize(latencies: list[float], statuses: list[int], queries: list[int], db_ms: list[float], elapsed: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": sum(1 for code in statuses if code >= 400),
+        "statuses": {str(code): statuses.count(code) for code in sorted(set(statuses))},
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "queries_per_request": round(statistics.mean(queries), 2),
+        "max_queries": max(queries),
+        "db_ms_per_request": round(statistics.mean(db_ms), 2),
+    }
+
+
+async def run_scenario(client, name: str, shop: Shop, headers: dict, requests: int, concurrency: int, warmup: int) -> dict:
+    # Every scenario starts with a cold response cache
+    cache.backend.clear()
+    call = scenario(name, shop, headers, -1)
+    for _ in range(warmup):
+        await call(client)
+
+    latencies, statuses, queries, db_ms = [], [], [], []
+    remaining = requests
+
+    async def worker(number: int):
+        nonlocal remaining
+        call = scenario(name, shop, headers, number)
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            response = await call(client)
+            latencies.append(time.perf_counter() - started)
+            statuses.append(response.status_code)
+            queries.append(int(response.headers.get("x-db-queries", 0)))
+            db_ms.append(float(response.headers.get("x-db-time-ms", 0)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return summarize(latencies, statuses, queries, db_ms, time.perf_counter() - started)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(requests: int = 500, concurrency: int = 16, warmup: int = 20, scenarios=SCENARIOS) -> dict:
+    shop = Shop()
+    with engine.connect() as conn:
+        rows = {
+            table.name: conn.scalar(select(func.count()).select_from(table))
+            for table in (models.Product.__table__, models.Sale.__table__, models.ProductSold.__table__)
+        }
+    results = {
+        "meta": {
+            "commit": _git_commit(),
+            "database": engine.dialect.name,
+            "rows": rows,
+            "requests": requests,
+            "concurrency": concurrency,
+            "bcrypt_rounds": BCRYPT_ROUNDS,
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+        },
+        "scenarios": {},
+    }
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60) as client:
+        login = await client.post("/api/v1/login", data={"username": shop.emails[0], "password": seed.PASSWORD})
+        headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        for name in scenarios:
+            results["scenarios"][name] = await run_scenario(client, name, shop, headers, requests, concurrency, warmup)
+    return results
+
+
+def compare(baseline: dict, current: dict) -> list[str]:
+    """One line per scenario and headline metric: baseline -> current (change)."""
+    lines = []
+    for key in ("database", "rows", "concurrency", "requests", "bcrypt_rounds"):
+        if baseline.get("meta", {}).get(key) != current["meta"][key]:
+            lines.append(f"note: {key} differs from the baseline ({baseline.get('meta', {}).get(key)} -> {current['meta'][key]})")
+    for name, now in current["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for metric, higher_is_better in HEADLINE.items():
+            old, new = before[metric], now[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            better = change > 0 if higher_is_better else change < 0
+            mark = "" if abs(change) < 5 else (" better" if better else " WORSE")
+            lines.append(f"{name:16} {metric:20} {old:>10} -> {new:>10} ({change:+.1f}%){mark}")
+    return lines
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20, help="unrecorded requests before each scenario")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS, help="run only these, may be repeated")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="a previous --out file to compare against")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args.requests, args.concurrency, args.warmup, args.scenario or SCENARIOS))
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(json.load(f), results)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Latency of an ordinary endpoint while a burst of logins is being verified.
+
+    python -m benchmarks.login_storm [logins] [concurrency]
+
+Logins are bcrypt bound. They run on the password hashing pool, so GET /api/v1/ping
+(a sync route on the shared threadpool) should answer about as fast during the
+storm as it does when idle.
+"""
+import os, statistics, sys, tempfile, time
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}")
+os.environ.setdefault("SECRETE_KEY", "benchmark-secret")
+os.environ.setdefault("ALGORITHM", "HS256")
+
+import asyncio
+import httpx
+
+from main import app
+from utils import passwords
+from utils.functions import BCRYPT_ROUNDS
+
+EMAIL, PASSWORD = "storm@example.com", "benchmark-password"
+
+
+def summary(samples: list[float]) -> dict:
+    samples = sorted(samples)
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(samples[int(len(samples) * 0.95) - 1] * 1000, 2),
+        "n": len(samples),
+    }
+
+
+async def ping_latencies(client, headers, stop: asyncio.Event, samples: list[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/api/v1/ping", headers=headers)
+        samples.append(time.perf_counter() - start)
+        await asyncio.sleep(0.005)
+
+
+async def run(logins: int = 200, concurrency: int = 50) -> dict:
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        await client.post("/api/v1/register", json={
+            "names": "Storm", "email": EMAIL, "phone": 700000000, "password": PASSWORD, "role": ["user"]
+        })
+        login_form = {"username": EMAIL, "password": PASSWORD}
+        token = (await client.post("/api/v1/login", data=login_form)).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+
+        idle, busy, statuses = [], [], []
+        stop = asyncio.Event()
+        pinger = asyncio.create_task(ping_latencies(client, headers, stop, idle))
+        await asyncio.sleep(1)
+        stop.set()
+        await pinger
+
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one_login():
+            async with gate:
+                statuses.append((await client.post("/api/v1/login", data=login_form)).status_code)
+
+        stop = asyncio.Event()
+        pinger = asyncio.create_task(ping_latencies(client, headers, stop, busy))
+        start = time.perf_counter()
+        await asyncio.gather(*(one_login() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await pinger
+
+    return {
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+        "hash_workers": passwords.HASH_WORKERS,
+        "logins_per_second": round(logins / elapsed, 1),
+        "login_statuses": {code: statuses.count(code) for code in sorted(set(statuses))},
+        "ping_idle": summary(idle),
+        "ping_during_storm": summary(busy),
+    }
+
+
+if __name__ == "__main__":
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    for name, value in asyncio.run(run(logins, concurrency)).items():
+        print(f"{name:20} {value}")
@@ -0,0 +1,248 @@
+"""
+Fill the database at DATABASE_URL with a synthetic shop, for the load benchmark.
+
+    python -m benchmarks.seed [--scale small|medium|large] [--products N] [--sales N] [--reset]
+
+Rows are generated from a fixed random seed and written with multi-row Core
+inserts, so the same scale always gives the same data. Sales are generated day
+by day, oldest first, and each day's rollup rows are written with them, so the
+reports agree with the sales without a rollup rebuild. Works on any dialect the
+app supports; on SQLite, syncing is turned off on the seeding connection.
+"""
+import argparse, os, random, re, sys, tempfile, time, uuid
+from datetime import datetime, timedelta, UTC
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'inv-api-bench.db')}")
+
+from sqlalchemy import bindparam, func, insert, select, text
+
+from database import models
+from database.database import engine, SQLITE_PRAGMAS
+from utils.functions import generate_hash
+
+# users, products, sales; a sale has 1-4 lines, 2.5 on average
+SCALES = {
+    "small": {"users": 5, "products": 10_000, "sales": 100_000},
+    "medium": {"users": 20, "products": 100_000, "sales": 1_000_000},
+    "large": {"users": 50, "products": 100_000, "sales": 3_000_000},
+}
+# Every seeded user logs in with their email and this password
+PASSWORD = "benchmark-password"
+# Rows per executemany
+CHUNK = 5000
+NOT_NUMERIC = re.compile("[a-df]")
+
+CATEGORIES = [
+    "Beverages", "Snacks", "Dairy", "Bakery", "Produce", "Frozen", "Household", "Personal Care",
+    "Baby", "Pet", "Stationery", "Electronics", "Kitchen", "Hardware", "Garden", "Toys",
+]
+BRANDS = [f"Brand{i:02d}" for i in range(40)]
+WORDS = ["Classic", "Premium", "Family", "Mini", "Max", "Fresh", "Organic", "Value", "Ultra", "Lite"]
+SALES_INDEXES = [
+    index for table in (models.Sale.__table__, models.ProductSold.__table__, models.SalesDailyRollup.__table__)
+    for index in sorted(table.indexes, key=lambda i: i.name)
+]
+STATUSES = [models.SaleStatusDB.COMPLETED] * 18 + [models.SaleStatusDB.PENDING, models.SaleStatusDB.REFUNDED]
+
+
+def new_id(rng: random.Random) -> uuid.UUID:
+    """
+    A reproducible uuid4. SQLite gives UUID columns numeric affinity, so hex that
+    also reads as a number (all digits, maybe one "e") would be stored as a float.
+    """
+    while True:
+        value = uuid.UUID(int=rng.getrandbits(128), version=4)
+        if NOT_NUMERIC.search(value.hex) or value.hex.count("e") > 1:
+            return value
+
+
+def _write(conn, table, rows: list[dict]) -> None:
+    """
+    executemany straight on the driver. Values go through each column's bind
+    processor (uuid -> hex on SQLite, enum -> value...) but skip the per-row
+    parameter handling of conn.execute(insert(table), rows), which costs more
+    than the insert itself at this volume.
+    """
+    if not rows:
+        return
+    names = list(rows[0])
+    compiled = insert(table).values({name: bindparam(name) for name in names}).compile(dialect=conn.dialect)
+    process = {name: table.c[name].type.bind_processor(conn.dialect) for name in names}
+    process = {name: fn for name, fn in process.items() if fn}
+    order = compiled.positiontup if compiled.positional else None
+    for start in range(0, len(rows), CHUNK):
+        chunk = rows[start:start + CHUNK]
+        if process:
+            chunk = [{**row, **{name: fn(row[name]) for name, fn in process.items()}} for row in chunk]
+        if order:
+            chunk = [tuple(row[name] for name in order) for row in chunk]
+        conn.exec_driver_sql(compiled.string, chunk)
+
+
+def users(rng: random.Random, count: int) -> list[dict]:
+    password = generate_hash(PASSWORD)  # bcrypt once, every user shares the hash
+    return [
+        {
+            "id": new_id(rng), "names": f"Bench Seller {i}", "email": f"bench{i}@example.com",
+            "phone": 700_000_000 + i, "password": password, "role": "admin" if i == 0 else "user",
+            "created_at": datetime.now(UTC),
+        }
+        for i in range(count)
+    ]
+
+
+def products(rng: random.Random, count: int, owners: list[dict]) -> list[dict]:
+    rows = []
+    for i in range(count):
+        category, brand = rng.choice(CATEGORIES), rng.choice(BRANDS)
+        buying = round(rng.uniform(0.5, 200), 2)
+        rows.append({
+            "id": new_id(rng), "created_by": rng.choice(owners)["id"],
+            "product_name": f"{rng.choice(WORDS)} {brand} {category} {i}",
+            "selling_price": round(buying * rng.uniform(1.1, 1.6), 2), "buying_price": buying,
+            # ~2% of the catalog sits at or below its alert level
+            "quantity": rng.randint(0, 10) if rng.random() < 0.02 else rng.randint(11, 5000),
+            "category": category, "brand": brand, "front_image": "front.jpg", "back_image": [],
+            "description": f"{brand} {category.lower()} item number {i}", "sku": f"BENCH-{i:07d}",
+            "unit": "pcs", "low_stock_alert": 10, "stock_slots": 0,
+            "created_at": datetime(2024, 1, 1, tzinfo=UTC) + timedelta(minutes=i),
+            "last_modified": datetime.now(UTC),
+        })
+    return rows
+
+
+def opening_balances(catalog: list[dict]) -> list[dict]:
+    """The ledger rows the upgrade migration writes, so each product's movements sum to its quantity."""
+    return [
+        {"product_id": p["id"], "kind": models.MovementKindDB.ADJUSTMENT, "quantity": p["quantity"], "sale_id": None,
+         "created_by": p["created_by"], "note": "Opening balance", "location_id": None, "created_at": p["created_at"]}
+        for p in catalog if p["quantity"]
+    ]
+
+
+def sales(conn, rng: random.Random, count: int, days: int, sellers: list[dict], catalog: list[dict]) -> None:
+    """`count` sales spread over the `days` before today, with their lines and rollup rows."""
+    first_day = datetime.now(UTC).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    per_day, extra = divmod(count, days)
+    for day in range(days):
+        start = first_day + timedelta(days=day)
+        sale_rows, line_rows, totals = [], [], {}
+        for offset in sorted(rng.random() * 86400 for _ in range(per_day + (day < extra))):
+            sale_id, seller, status = new_id(rng), rng.choice(sellers)["id"], rng.choice(STATUSES)
+            subtotal, cost = 0.0, {}
+            for _ in range(rng.randint(1, 4)):
+                # Squared uniform: the first products sell far more often than the rest
+                product = catalog[int(len(catalog) * rng.random() ** 2)]
+                quantity = rng.randint(1, 5)
+                subtotal += product["selling_price"] * quantity
+                line_rows.append({
+                    "id": new_id(rng), "sale_id": sale_id, "product_id": product["id"],
+                    "product_name": product["product_name"], "quantity_sold": quantity,
+                    "selling_price": product["selling_price"], "cost_price": product["buying_price"], "discount": 0.0,
+                })
+                row = cost.setdefault(product["id"], [product["product_name"], 0, 0.0, 0.0])
+                row[1] += quantity
+                row[2] += product["selling_price"] * quantity
+                row[3] += product["buying_price"] * quantity
+            taxes = round(subtotal * 0.05, 2)
+            sale_rows.append({
+                "id": sale_id, "buyer_name": "Walk-in customer", "buyer_phone": "0700000000",
+                "payment_method": rng.choice(list(models.PaymentMethodDB)), "subtotal": subtotal,
+                "total_discount": 0.0, "taxes": taxes, "total": subtotal + taxes, "currency": "USD",
+                "status": status, "sold_by": seller, "sold_at": start + timedelta(seconds=offset),
+            })
+            key = (start.date(), status, seller)
+            _add(totals, key + (models.SALE_TOTALS_PRODUCT_ID,), None, 1, 0, subtotal + taxes, 0.0, taxes)
+            for product_id, (name, units, revenue, line_cost) in cost.items():
+                _add(totals, key + (product_id,), name, 1, units, revenue, line_cost, 0.0)
+
+        _write(conn, models.Sale.__table__, sale_rows)
+        _write(conn, models.ProductSold.__table__, line_rows)
+        _write(conn, models.SalesDailyRollup.__table__, [
+            {"day": d, "status": s, "sold_by": by, "product_id": p, "product_name": v[0], "sales_count": v[1],
+             "units_sold": v[2], "revenue": v[3], "cost": v[4], "taxes": v[5]}
+            for (d, s, by, p), v in totals.items()
+        ])
+
+
+def _add(totals: dict, key: tuple, name, sales_count, units, revenue, cost, taxes) -> None:
+    row = totals.setdefault(key, [name, 0, 0, 0.0, 0.0, 0.0])
+    row[1] += sales_count
+    row[2] += units
+    row[3] += revenue
+    row[4] += cost
+    row[5] += taxes
+
+
+def seed(users_count: int, products_count: int, sales_count: int, days: int = 365,
+         reset: bool = False, random_seed: int = 42) -> dict:
+    """Create the schema and the synthetic data; returns row counts and timings."""
+    if reset:
+        models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        if conn.scalar(select(func.count()).select_from(models.Product.__table__)):
+            raise SystemExit("The database already has products, pass --reset to replace them")
+
+    rng = random.Random(random_seed)
+    timings = {}
+    with engine.connect() as conn:
+        sqlite = conn.dialect.name == "sqlite"
+        if sqlite:
+            # Only for this connection, and it has to be set outside a transaction
+            conn.execute(text("PRAGMA synchronous=OFF"))
+            conn.commit()
+        with conn.begin():
+            started = time.perf_counter()
+            sellers = users(rng, users_count)
+            _write(conn, models.User.__table__, sellers)
+            catalog = products(rng, products_count, sellers)
+            _write(conn, models.Product.__table__, catalog)
+            _write(conn, models.ProductChange.__table__, [{"product_id": p["id"], "changed_at": p["created_at"]} for p in catalog])
+            _write(conn, models.InventoryMovement.__table__, opening_balances(catalog))
+            timings["catalog_seconds"] = round(time.perf_counter() - started, 2)
+
+            # Secondary indexes are cheaper built once at the end than kept up row by row
+            started = time.perf_counter()
+            for index in SALES_INDEXES:
+                index.drop(conn)
+            sales(conn, rng, sales_count, days, sellers, catalog)
+            timings["sales_seconds"] = round(time.perf_counter() - started, 2)
+
+            started = time.perf_counter()
+            for index in SALES_INDEXES:
+                index.create(conn)
+            timings["index_seconds"] = round(time.perf_counter() - started, 2)
+        if sqlite:
+            conn.execute(text(f"PRAGMA synchronous={SQLITE_PRAGMAS['synchronous']}"))
+            conn.commit()
+
+    with engine.connect() as conn:
+        counts = {
+            table.name: conn.scalar(select(func.count()).select_from(table))
+            for table in (models.User.__table__, models.Product.__table__, models.Sale.__table__,
+                          models.ProductSold.__table__, models.SalesDailyRollup.__table__,
+                          models.InventoryMovement.__table__)
+        }
+    return {**counts, **timings}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--sales", type=int)
+    parser.add_argument("--days", type=int, default=365, help="sales are spread over this many days before today")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args(argv)
+
+    size = {**SCALES[args.scale], **{k: v for k, v in vars(args).items() if k in SCALES["small"] and v is not None}}
+    print(f"Seeding {engine.url.render_as_string(hide_password=True)}: {size}", file=sys.stderr)
+    for name, value in seed(size["users"], size["products"], size["sales"], args.days, args.reset, args.seed).items():
+        print(f"{name:20} {value}")
+
+
+if __name__ == "__main__":
+    main()
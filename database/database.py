@@ -1,16 +1,177 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import NullPool, QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
-import os
+import os, threading, time
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+# Async driver used for each backend when ASYNC_DATABASE_URL isn't set explicitly
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "postgresql": "asyncpg",
+    "mysql": "aiomysql",
+}
+
+# Pool defaults per backend, each one can be overridden with the DB_POOL_* variables.
+# MySQL drops idle connections after wait_timeout, so they are recycled well before that.
+POOL_DEFAULTS = {
+    "postgresql": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 30, "pool_recycle": 1800, "pool_pre_ping": True},
+    "mysql": {"pool_size": 10, "max_overflow": 20, "pool_timeout": 30, "pool_recycle": 280, "pool_pre_ping": True},
+    "sqlite": {"pool_size": 5, "max_overflow": 10, "pool_timeout": 30, "pool_recycle": -1, "pool_pre_ping": False},
+}
+
+POOL_ENV = {
+    "pool_size": "DB_POOL_SIZE",
+    "max_overflow": "DB_MAX_OVERFLOW",
+    "pool_timeout": "DB_POOL_TIMEOUT",
+    "pool_recycle": "DB_POOL_RECYCLE",
+    "pool_pre_ping": "DB_POOL_PRE_PING",
+}
+
+# Applied to every new SQLite connection. WAL lets readers run alongside the writer.
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", 64000)),  # negative means KiB, not pages
+}
+
+
+def to_async_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        return url
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}")
+
+
+def async_database_url():
+    return os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+
+def pool_settings(url) -> dict:
+    backend = make_url(url).get_backend_name()
+    settings = dict(POOL_DEFAULTS.get(backend, POOL_DEFAULTS["postgresql"]))
+    for option, env_name in POOL_ENV.items():
+        value = os.getenv(env_name)
+        if value is None:
+            continue
+        if option == "pool_pre_ping":
+            settings[option] = value.lower() in ("1", "true", "yes", "on")
+        else:
+            settings[option] = int(value)
+    return settings
+
+
+class _WaitTimingMixin:
+    """Records how long checkouts wait for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._wait_lock = threading.Lock()
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            with self._wait_lock:
+                self.wait_count += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def recreate(self):
+        # Keep the counters when the pool is rebuilt (e.g. after engine.dispose())
+        new_pool = super().recreate()
+        new_pool.wait_count = self.wait_count
+        new_pool.wait_seconds_total = self.wait_seconds_total
+        new_pool.wait_seconds_max = self.wait_seconds_max
+        return new_pool
+
+
+class InstrumentedQueuePool(_WaitTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_WaitTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _is_memory_sqlite(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(url, is_async: bool = False) -> dict:
+    url = make_url(url)
+    backend = url.get_backend_name()
+    options = {}
+    if backend == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+    if _is_memory_sqlite(url):
+        # SQLAlchemy picks a single connection pool for in-memory databases
+        return options
+    if backend == "sqlite" and is_async:
+        # aiosqlite connections are tied to the event loop that opened them and are
+        # cheap to open, so SQLite gets a fresh one per session instead of a pool.
+        options["poolclass"] = NullPool
+        return options
+    options["poolclass"] = InstrumentedAsyncQueuePool if is_async else InstrumentedQueuePool
+    options.update(pool_settings(url))
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+ASYNC_DATABASE_URL = async_database_url()
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-Base = declarative_base()
+# Used by the async def routes so DB round trips don't block the event loop.
+# Scripts like j.py keep using the sync engine above.
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+for _engine in (engine, async_engine.sync_engine):
+    if _engine.dialect.name == "sqlite":
+        event.listen(_engine, "connect", _set_sqlite_pragmas)
 
-#============
+
+def pool_stats() -> dict:
+    """Connection pool usage of both engines, for sizing pools and workers."""
+    stats = {}
+    for name, pool in (("sync", engine.pool), ("async", async_engine.sync_engine.pool)):
+        entry = {"pool": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=pool.overflow(),
+            )
+        if isinstance(pool, _WaitTimingMixin):
+            entry.update(
+                checkouts=pool.wait_count,
+                wait_seconds_total=round(pool.wait_seconds_total, 6),
+                wait_seconds_max=round(pool.wait_seconds_max, 6),
+            )
+        stats[name] = entry
+    return stats
+
+
+Base = declarative_base()
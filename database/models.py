@@ -1,7 +1,9 @@
-from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, UniqueConstraint, Float, Enum as SQLAlchemyEnum
+from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, Date, UniqueConstraint, Index, Float, JSON, Enum as SQLAlchemyEnum
+from sqlalchemy import DDL, event
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID, ENUM
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 import uuid
 from uuid import uuid4
 from datetime import datetime, timedelta, UTC
@@ -23,6 +25,13 @@ class SaleStatusDB(PyEnum):
     REFUNDED = "refunded"
     PARTIALLY_REFUNDED = "partially_refunded"
 
+class MovementKindDB(PyEnum):
+    SALE = "sale"
+    REFUND = "refund"
+    RECEIPT = "receipt"
+    ADJUSTMENT = "adjustment"
+    TRANSFER = "transfer"
+
 class User(Base):
     __tablename__ = "users"
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -48,18 +57,75 @@ class Product(Base):
     category = Column(String, nullable=False)
     brand = Column(String, nullable=False)
     front_image = Column(String, nullable=False)
-    back_image = Column(String, nullable=False)
+    back_image = Column(JSON, nullable=False, default=list)
     description = Column(String, nullable=False)
     sku = Column(String, nullable=False, unique=True)
     unit = Column(String, nullable=False)
     low_stock_alert = Column(Integer, nullable=False, default=10)
+    # 0: quantity is the live stock. Otherwise the live stock is spread over this many
+    # stock_shards rows and quantity is the total as of the last fold, see utils/stock.py
+    stock_slots = Column(Integer, nullable=False, default=0, server_default="0")
     created_at = Column(DateTime, default=lambda: datetime.now(UTC))
     last_modified = Column(DateTime, default=datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
 
     __table_args__ = (
         UniqueConstraint("sku", name="unique_product_sku"),
+        Index("ix_products_category", "category", "id"),
+        Index("ix_products_created_at", "created_at", "id"),
+        Index("ix_products_selling_price", "selling_price", "id"),
+        # Partial index holding only the products at or below their alert level
+        Index(
+            "ix_products_low_stock", "category", "id",
+            sqlite_where=text("quantity <= low_stock_alert"),
+            postgresql_where=text("quantity <= low_stock_alert")
+        ),
+        # and the few sharded ones, whose quantity column lags until the next fold
+        Index(
+            "ix_products_sharded", "category", "id",
+            sqlite_where=text("stock_slots > 0"),
+            postgresql_where=text("stock_slots > 0")
+        ),
     )
 
+# Full-text search over the catalog, see utils/search.py. None of it fits a plain
+# Index, so each dialect gets its own DDL, run right after the products table is created.
+PRODUCT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', product_name || ' ' || sku), 'A') || "
+    "setweight(to_tsvector('simple', brand), 'B') || "
+    "setweight(to_tsvector('simple', category), 'C') || "
+    "setweight(to_tsvector('simple', description), 'D')"
+)
+
+_FTS_ROW = "(new.id, new.product_name, new.brand, new.category, new.sku, new.description)"
+_FTS_COLUMNS = "(product_id, product_name, brand, category, sku, description)"
+_FTS_DELETE = "DELETE FROM products_fts WHERE products_fts MATCH 'product_id:\"' || old.id || '\"'"
+
+PRODUCT_SEARCH_DDL = {
+    # FTS5 table kept in step by triggers, so ORM writes and bulk imports are indexed alike
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+        "product_id, product_name, brand, category, sku, description, "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+        f"CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN "
+        f"INSERT INTO products_fts {_FTS_COLUMNS} VALUES {_FTS_ROW}; END",
+        f"CREATE TRIGGER IF NOT EXISTS products_fts_update "
+        f"AFTER UPDATE OF product_name, brand, category, sku, description ON products BEGIN "
+        f"{_FTS_DELETE}; INSERT INTO products_fts {_FTS_COLUMNS} VALUES {_FTS_ROW}; END",
+        f"CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN {_FTS_DELETE}; END",
+    ],
+    "postgresql": [
+        f"CREATE INDEX IF NOT EXISTS ix_products_search ON products USING gin (({PRODUCT_SEARCH_VECTOR}))",
+    ],
+    "mysql": [
+        "CREATE FULLTEXT INDEX ft_products_search ON products (product_name, brand, category, sku, description)",
+    ],
+}
+
+for _dialect, _statements in PRODUCT_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Product.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+event.listen(Product.__table__, "after_drop", DDL("DROP TABLE IF EXISTS products_fts").execute_if(dialect="sqlite"))
+
 class Sale(Base):
     __tablename__ = "sales"
 
@@ -89,8 +155,22 @@ class Sale(Base):
     notes = Column(String, nullable=True)
 
     sold_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
-    sold_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
+    sold_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(UTC))
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # Set by tills replaying offline sales, so a retried upload can't record a sale twice
+    idempotency_key = Column(String(64), nullable=True)
+    # The shop or warehouse the sale was made at; legacy tills send none
+    location_id = Column(UUID(as_uuid=True), ForeignKey("locations.id"), nullable=True)
+
+    products = relationship("ProductSold", back_populates="sale", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        Index("ix_sales_sold_at", "sold_at", "id"),
+        Index("ix_sales_sold_by", "sold_by", "sold_at"),
+        Index("ix_sales_status", "status", "sold_at"),
+        Index("ux_sales_idempotency_key", "idempotency_key", unique=True),
+        Index("ix_sales_location_id", "location_id", "sold_at", "id"),
+    )
 
 
 class ProductSold(Base):
@@ -106,6 +186,143 @@ class ProductSold(Base):
     cost_price = Column(Float, nullable=True)  # Backend-filled
     discount = Column(Float, default=0.0, nullable=False)
 
+    sale = relationship("Sale", back_populates="products")
+
+    __table_args__ = (
+        Index("ix_products_sold_sale_id", "sale_id"),
+        Index("ix_products_sold_product_id", "product_id", "sale_id"),
+    )
+
+
+# product_id of the rollup rows that hold sale level totals rather than one product's lines.
+# All-f rather than all-zero: SQLite gives UUID columns numeric affinity and would turn "000..." into 0
+SALE_TOTALS_PRODUCT_ID = uuid.UUID("ffffffff-ffff-ffff-ffff-ffffffffffff")
+
+
+class SalesDailyRollup(Base):
+    """
+    Pre-aggregated sales per day x status x seller x product, kept up to date by
+    the sale write paths. Rows with product_id SALE_TOTALS_PRODUCT_ID carry the
+    sale level totals (sales count, sale totals, taxes); product rows carry line
+    level figures. Everything is additive, so reports just SUM matching rows.
+    """
+    __tablename__ = "sales_daily_rollup"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    day = Column(Date, nullable=False)
+    status = Column(
+    SQLAlchemyEnum(SaleStatusDB, values_callable=lambda obj: [e.value for e in obj]),
+    nullable=False
+)
+    sold_by = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    product_id = Column(UUID(as_uuid=True), nullable=False)
+    product_name = Column(String, nullable=True)
+
+    sales_count = Column(Integer, default=0, nullable=False)
+    units_sold = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0.0, nullable=False)
+    cost = Column(Float, default=0.0, nullable=False)
+    taxes = Column(Float, default=0.0, nullable=False)
+
+    __table_args__ = (
+        Index("ux_sales_daily_rollup_key", "day", "status", "sold_by", "product_id", unique=True),
+    )
+
+
+class ProductChange(Base):
+    """
+    Change feed of the catalog. Every product write takes a new, higher seq and
+    drops the product's previous row, so the table holds one row per product.
+    A row whose product no longer exists is a deletion.
+    """
+    __tablename__ = "product_changes"
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    # No foreign key, the row has to outlive a deleted product
+    product_id = Column(UUID(as_uuid=True), nullable=False)
+    changed_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(UTC))
+
+    __table_args__ = (
+        Index("ix_product_changes_product_id", "product_id"),
+        # Never hand out a seq again after its row was dropped, clients may already be past it
+        {"sqlite_autoincrement": True},
+    )
+
+
+class InventoryMovement(Base):
+    """
+    Append-only ledger of stock changes: sales, refunds, receipts and manual
+    adjustments. quantity is signed, so a product's rows sum to its stock and
+    replaying them in id order rebuilds its history. Rows are never updated.
+    """
+    __tablename__ = "inventory_movements"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # No foreign keys, the ledger has to outlive deleted products and sales
+    product_id = Column(UUID(as_uuid=True), nullable=False)
+    kind = Column(
+    SQLAlchemyEnum(MovementKindDB, values_callable=lambda obj: [e.value for e in obj]),
+    nullable=False
+)
+    quantity = Column(Integer, nullable=False)
+    sale_id = Column(UUID(as_uuid=True), nullable=True)
+    created_by = Column(UUID(as_uuid=True), nullable=True)
+    note = Column(String, nullable=True)
+    # Set when the units moved in or out of one location's stock
+    location_id = Column(UUID(as_uuid=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(UTC))
+
+    __table_args__ = (
+        Index("ix_inventory_movements_product_id", "product_id", "id"),
+        Index("ix_inventory_movements_sale_id", "sale_id"),
+        {"sqlite_autoincrement": True},
+    )
+
+
+class StockShard(Base):
+    """
+    One slot of a sharded product's stock. Checkouts take units from a single
+    slot, so concurrent sales of a hot SKU lock different rows instead of
+    queueing on the product row.
+    """
+    __tablename__ = "stock_shards"
+
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), primary_key=True)
+    slot = Column(Integer, primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+
+
+class LocationStock(Base):
+    """
+    Units of a product held at one location. products.quantity stays the
+    company-wide figure and moves with these rows; stock received without a
+    location is held centrally, in neither. The primary key leads with the
+    location, so a shop's reads only ever touch its own rows.
+    """
+    __tablename__ = "location_stock"
+
+    location_id = Column(UUID(as_uuid=True), ForeignKey("locations.id"), primary_key=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), primary_key=True)
+    quantity = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_location_stock_product_id", "product_id"),
+    )
+
+
+class StoredImage(Base):
+    """
+    One row per image file under static/images. Files are named after the
+    sha256 of their content, so identical uploads share a file and ref_count
+    tracks how many product image slots point at it.
+    """
+    __tablename__ = "stored_images"
+
+    filename = Column(String(80), primary_key=True)
+    size = Column(Integer, nullable=True)
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
+
 
 class Location(Base):
     __tablename__ = "locations"
@@ -128,5 +345,77 @@ class Supplier(Base):
     address = Column(String, nullable=False)
     company_website = Column(String, nullable=True)
     status = Column(String, default="active")
-    created_at = Column(DateTime, default=datetime.now(UTC))
-    updated_at = Column(DateTime, default=datetime.now(UTC), onupdate=datetime.now(UTC))
\ No newline at end of file
+    created_at = Column(DateTime, default=lambda: datetime.now(UTC))
+    updated_at = Column(DateTime, default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+    __table_args__ = (
+        Index("ix_suppliers_status", "status", "id"),
+    )
+
+# Substring search over supplier names and contact people, see utils/search.py.
+# Supplier ids are integers, so SQLite's FTS table can use them as its rowid.
+SUPPLIER_SEARCH_DDL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS suppliers_fts USING fts5("
+        "name, contact_person, content = 'suppliers', content_rowid = 'id', tokenize = 'trigram')",
+        "CREATE TRIGGER IF NOT EXISTS suppliers_fts_insert AFTER INSERT ON suppliers BEGIN "
+        "INSERT INTO suppliers_fts (rowid, name, contact_person) VALUES (new.id, new.name, new.contact_person); END",
+        "CREATE TRIGGER IF NOT EXISTS suppliers_fts_update AFTER UPDATE OF name, contact_person ON suppliers BEGIN "
+        "INSERT INTO suppliers_fts (suppliers_fts, rowid, name, contact_person) VALUES ('delete', old.id, old.name, old.contact_person); "
+        "INSERT INTO suppliers_fts (rowid, name, contact_person) VALUES (new.id, new.name, new.contact_person); END",
+        "CREATE TRIGGER IF NOT EXISTS suppliers_fts_delete AFTER DELETE ON suppliers BEGIN "
+        "INSERT INTO suppliers_fts (suppliers_fts, rowid, name, contact_person) VALUES ('delete', old.id, old.name, old.contact_person); END",
+    ],
+    "postgresql": [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_suppliers_name_trgm ON suppliers USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_suppliers_contact_person_trgm ON suppliers USING gin (contact_person gin_trgm_ops)",
+    ],
+}
+
+for _dialect, _statements in SUPPLIER_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Supplier.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+event.listen(Supplier.__table__, "after_drop", DDL("DROP TABLE IF EXISTS suppliers_fts").execute_if(dialect="sqlite"))
+
+
+class SupplierProduct(Base):
+    """A product a supplier can deliver, with the terms replenishment plans with."""
+    __tablename__ = "supplier_products"
+
+    supplier_id = Column(Integer, ForeignKey("suppliers.id"), primary_key=True)
+    product_id = Column(UUID(as_uuid=True), ForeignKey("products.id"), primary_key=True)
+    # Days from placing an order to the units being on the shelf
+    lead_time_days = Column(Integer, nullable=False, default=7)
+    # Orders go out in whole packs
+    pack_size = Column(Integer, nullable=False, default=1)
+    unit_cost = Column(Float, nullable=False)
+    # Ordered from ahead of the product's other suppliers
+    preferred = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
+
+    __table_args__ = (
+        Index("ix_supplier_products_product_id", "product_id"),
+    )
+
+
+class ReplenishmentSuggestion(Base):
+    """
+    What to reorder, one row per product that has reached its reorder point.
+    Rebuilt as a whole by every run of utils/replenishment.py, so it carries
+    no foreign keys and rows of deleted products simply drop out on the next run.
+    """
+    __tablename__ = "replenishment_suggestions"
+
+    product_id = Column(UUID(as_uuid=True), primary_key=True)
+    supplier_id = Column(Integer, nullable=False)
+    demand_per_day = Column(Float, nullable=False)
+    on_hand = Column(Integer, nullable=False)
+    safety_stock = Column(Integer, nullable=False)
+    reorder_point = Column(Integer, nullable=False)
+    order_quantity = Column(Integer, nullable=False)
+    unit_cost = Column(Float, nullable=False)
+    computed_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        Index("ix_replenishment_suggestions_supplier_id", "supplier_id", "product_id"),
+    )
@@ -1,24 +1,45 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, Depends, Request, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from database.database import Base, engine, SessionLocal
-from database.database import Base, engine
+from database.database import Base, engine, async_engine, pool_stats
+from utils.auth_cache import cache_stats
 from database import  models
-from routers import supplier, sales, product, login
-import os
+from auth.auth import get_current_user
+from routers import supplier, sales, product, login, events, location, analytics
+from utils import images, passwords, metrics, stock, replenishment
+import asyncio, os
 
 models.Base.metadata.create_all(bind=engine)
+metrics.instrument(engine, async_engine.sync_engine)
 load_dotenv()
-app = FastAPI(title="Inventory Managment System API")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Folds sharded stock back into products.quantity in the background
+    folding = asyncio.create_task(stock.fold_periodically())
+    # Rebuilds the replenishment suggestions behind /suppliers/purchase_orders
+    replenishing = asyncio.create_task(replenishment.replenish_periodically())
+    yield
+    folding.cancel()
+    replenishing.cancel()
+    images.shutdown()
+    passwords.hasher.shutdown()
+
+app = FastAPI(title="Inventory Managment System API", lifespan=lifespan)
 
 #Routers
 app.include_router(login.router)
 app.include_router(supplier.router)
 app.include_router(sales.router)
 app.include_router(product.router)
+app.include_router(events.router)
+app.include_router(location.router)
+app.include_router(analytics.router)
 
-app.mount("/static", StaticFiles(directory="static"), name="static") # Loding static images
+app.mount("/static", images.CachedStaticFiles(directory="static"), name="static") # Loding static images
 
 # Managing cors
 app.add_middleware(
@@ -27,9 +48,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],  
+    expose_headers=["X-DB-Queries", "X-DB-Time-Ms", "X-DB-Slow-Queries"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Config
 @app.get("/api/v1/")
 def index():
     return {"message":"Home page"}
+
+@app.get("/api/v1/pool_stats", dependencies=[Depends(get_current_user)])
+def get_pool_stats():
+    return pool_stats()
+
+@app.get("/api/v1/auth_cache_stats", dependencies=[Depends(get_current_user)])
+def get_auth_cache_stats():
+    return cache_stats()
+
+# Prometheus scrape target, protected by METRICS_TOKEN when it is set
+@app.get("/metrics", include_in_schema=False)
+def get_metrics(request: Request):
+    if metrics.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {metrics.METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(metrics.render(pool_stats()), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.orm import Session
+from database.get_db import get_db
+from schemas.analytics_schema import ProductAnalytics, AbcClass
+from auth.auth import get_current_user
+from utils.analytics import product_analytics
+from utils.pagination import encode_cursor, decode_cursor
+from datetime import date, timedelta
+from typing import Optional
+
+router = APIRouter(prefix="/api/v1/analytics", tags=["Analytics"])
+
+#Endpoint for per product figures over a date range: margin, turnover, cover and ABC class
+
+@router.get("/products", response_model=ProductAnalytics, dependencies=[Depends(get_current_user)])
+def get_product_analytics(
+    date_from: Optional[date] = Query(None, description="First day (YYYY-MM-DD), 90 days before date_to by default"),
+    date_to: Optional[date] = Query(None, description="Last day (YYYY-MM-DD), today by default"),
+    category: Optional[str] = None,
+    abc: Optional[AbcClass] = Query(None, description="Only products of this class"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=89)
+    if date_from > date_to:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="date_from is after date_to")
+    after = 0
+    if cursor:
+        (value,) = decode_cursor(cursor, 1)
+        if not value.isdigit():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        after = int(value)
+
+    # The whole catalog is computed once per range and cached, pages and filters are cut from it
+    report = product_analytics(db, date_from, date_to)
+    items = []
+    for row in report["products"][after:]:
+        if (category is None or row.category == category) and (abc is None or row.abc == abc.value):
+            items.append(row._asdict())
+            if len(items) > limit:
+                break
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1]["rank"])
+    summary = {key: value for key, value in report.items() if key != "products"}
+    return {**summary, "items": items, "next_cursor": next_cursor}
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from auth.auth import get_current_user
+from utils.events import bus, Subscriber
+import json, os
+
+router = APIRouter(prefix="/api/v1/events", tags=["Events"])
+
+# A comment line at least this often keeps proxies from closing an idle stream
+HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", 15))
+
+
+def format_event(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(jsonable_encoder(event))}\n\n"
+
+
+async def event_stream(request: Request, subscriber: Subscriber):
+    """
+    Send the subscriber's events as they arrive. Everything that piled up while
+    the client was slow to read goes out together, already coalesced per product.
+    """
+    try:
+        yield "retry: 5000\n\n"
+        while not await request.is_disconnected():
+            batch = await subscriber.next_batch(HEARTBEAT_SECONDS)
+            yield "".join(map(format_event, batch)) if batch else ": keepalive\n\n"
+    finally:
+        bus.unsubscribe(subscriber)
+
+
+#Endpoint to stream stock and sales updates
+@router.get("/stream", dependencies=[Depends(get_current_user)])
+async def stream_events(request: Request):
+    # Subscribe before responding so nothing committed after this point is missed
+    subscriber = bus.subscribe()
+    return StreamingResponse(
+        event_stream(request, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
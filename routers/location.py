@@ -0,0 +1,126 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from database import models
+from database.get_db import get_db
+from schemas.location_schema import LocationCreate, LocationOut, LocationUpdate, LocationStockPage, LocationStockTotals, TransferInput
+from schemas.product_schema import StockMovementOut
+from typing import List, Optional
+from uuid import UUID
+from auth.auth import get_current_user
+from utils import cache, stock
+from utils.pagination import encode_cursor, decode_cursor
+
+router = APIRouter(prefix="/api/v1/locations", tags=["Locations"])
+
+
+def _check_manager(db: Session, manager_id: UUID) -> None:
+    if not db.get(models.User, manager_id):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"User with ID {manager_id} not found")
+
+#Endpoint to add a shop or warehouse
+
+@router.post("/", response_model=LocationOut, dependencies=[Depends(get_current_user)])
+def create_location(location: LocationCreate, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
+    manager_id = location.manager_id or UUID(current_user)
+    _check_manager(db, manager_id)
+    db_location = models.Location(**location.model_dump(exclude={"manager_id"}), manager_id=manager_id)
+    db.add(db_location)
+    db.commit()
+    cache.bump(cache.LOCATIONS)
+    db.refresh(db_location)
+    return db_location
+
+@router.get("/", response_model=List[LocationOut], dependencies=[Depends(get_current_user)])
+def list_locations(request: Request, db: Session = Depends(get_db)):
+    return cache.cached_response(
+        request, (cache.LOCATIONS,), List[LocationOut],
+        lambda: db.query(models.Location).order_by(models.Location.name, models.Location.id).all()
+    )
+
+@router.put("/{location_id}", response_model=LocationOut, dependencies=[Depends(get_current_user)])
+def update_location(location_id: UUID, updates: LocationUpdate, db: Session = Depends(get_db)):
+    location = db.get(models.Location, location_id)
+    if not location:
+        raise HTTPException(status_code=404, detail="Location not found")
+    changes = updates.model_dump(exclude_unset=True)
+    if changes.get("manager_id"):
+        _check_manager(db, changes["manager_id"])
+    for field, value in changes.items():
+        setattr(location, field, value)
+    db.commit()
+    cache.bump(cache.LOCATIONS)
+    db.refresh(location)
+    return location
+
+#Endpoint for the stock totals of every location, one row each
+
+@router.get("/stock", response_model=List[LocationStockTotals], dependencies=[Depends(get_current_user)])
+def location_stock_totals(request: Request, db: Session = Depends(get_db)):
+    def build():
+        held = stock.location_stock
+        return [
+            {"location_id": location_id, "name": name, "is_active": is_active, "products": products, "units": units}
+            for location_id, name, is_active, products, units in db.execute(
+                select(
+                    models.Location.id, models.Location.name, models.Location.is_active,
+                    func.count(held.c.product_id), func.coalesce(func.sum(held.c.quantity), 0)
+                )
+                .outerjoin(held, held.c.location_id == models.Location.id)
+                .group_by(models.Location.id, models.Location.name, models.Location.is_active)
+                .order_by(models.Location.name, models.Location.id)
+            )
+        ]
+
+    # Every sale moves stock, so this follows the products version too
+    return cache.cached_response(request, (cache.LOCATIONS, cache.PRODUCTS), List[LocationStockTotals], build)
+
+#Endpoint to list what one location holds, a keyset page at a time
+
+@router.get("/{location_id}/stock", response_model=LocationStockPage, dependencies=[Depends(get_current_user)])
+def location_stock(
+    location_id: UUID,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    held = stock.location_stock
+    # A range scan of the (location_id, product_id) primary key
+    query = (
+        select(held.c.product_id, models.Product.product_name, models.Product.sku, held.c.quantity)
+        .join(models.Product, models.Product.id == held.c.product_id)
+        .where(held.c.location_id == location_id)
+    )
+    if cursor:
+        (product_id,) = decode_cursor(cursor, 1)
+        try:
+            query = query.where(held.c.product_id > UUID(product_id))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    rows = db.execute(query.order_by(held.c.product_id).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].product_id)
+    return {"items": [row._asdict() for row in rows], "next_cursor": next_cursor}
+
+#Endpoint to move stock between two locations in one transaction
+
+@router.post("/transfers", response_model=List[StockMovementOut], dependencies=[Depends(get_current_user)])
+def transfer_stock(transfer: TransferInput, db: Session = Depends(get_db), current_user: str = Depends(get_current_user)):
+    if transfer.from_location_id == transfer.to_location_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Stock can't be transferred to the location it is at")
+    locations = stock.load_locations(db, [transfer.from_location_id, transfer.to_location_id])
+    source = stock.require_location(locations, transfer.from_location_id)
+    destination = stock.require_location(locations, transfer.to_location_id)
+
+    quantities = {}
+    for line in transfer.products:
+        quantities[line.product_id] = quantities.get(line.product_id, 0) + line.quantity
+    rows = stock.transfer(db, source, destination, quantities, UUID(current_user), transfer.note)
+    db.commit()
+    cache.bump(cache.PRODUCTS)
+    for row in rows:
+        db.refresh(row)
+    return rows
@@ -2,15 +2,19 @@ from fastapi import Depends, HTTPException, APIRouter
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 from database import models
-from database.get_db import get_db
-from schemas.user_schema import LoginInput, RegisterInput
+from database.get_db import get_db, get_async_db
+from schemas.user_schema import LoginInput, RegisterInput, UpdateInput
 
-from auth.auth import get_current_user
+from auth.auth import get_current_user, get_current_user_record, require_role
 
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, exists, or_
 
-from utils.functions import verify_password, generate_access_token, generate_hash
-from uuid import uuid4
+from utils.functions import generate_access_token
+from utils import passwords, auth_cache
+from utils.auth_cache import CurrentUser
+from uuid import UUID, uuid4
 
 router = APIRouter(prefix="/api/v1", tags=["Authentication"])
 
@@ -20,28 +24,35 @@ def ping(user_id: int = Depends(get_current_user)):
     return {"status": "alive"}
 
 @router.post("/login")
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if user and verify_password(form_data.password, user.password):
-        data: dict = {
-            "user_id": user.id,
-            "names": user.names,
-            "email": user.email,
-            "phone": user.phone,
-            "role": user.role
-        }
-        access_token = generate_access_token(data={"sub": str(user.id)})
-        return {
-            "message": "User logged in successfully",
-            "user_data": data,
-            "access_token": access_token,
-            "token_type": "bearer"
-        }
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == form_data.username))
+    if user:
+        # bcrypt runs on the password hashing pool, not on the event loop or the shared threadpool
+        verified, new_hash = await passwords.hasher.verify(form_data.password, user.password)
+        if verified:
+            if new_hash:
+                # Stored with an older cost factor, upgrade it now that we have the password
+                user.password = new_hash
+                await db.commit()
+            data: dict = {
+                "user_id": user.id,
+                "names": user.names,
+                "email": user.email,
+                "phone": user.phone,
+                "role": user.role
+            }
+            access_token = generate_access_token(data={"sub": str(user.id)})
+            return {
+                "message": "User logged in successfully",
+                "user_data": data,
+                "access_token": access_token,
+                "token_type": "bearer"
+            }
     raise HTTPException(status_code=401, detail="Invalid email or password")
 
 @router.post("/register")
-def register_user(u: RegisterInput, db: Session = Depends(get_db)):
-    existing_user = db.query(models.User).filter(models.User.email == u.email).first()
+async def register_user(u: RegisterInput, db: AsyncSession = Depends(get_async_db)):
+    existing_user = await db.scalar(select(models.User).where(models.User.email == u.email))
     if existing_user and (u.phone == existing_user.phone):
         raise HTTPException(status_code=401, detail="User Already Exists. Try Another Email")
     
@@ -50,7 +61,7 @@ def register_user(u: RegisterInput, db: Session = Depends(get_db)):
         names=str(u.names),
         email=str(u.email),
         phone=int(u.phone),
-        password=generate_hash(str(u.password)),
+        password=await passwords.hasher.hash(str(u.password)),
         role=",".join([r.value for r in u.role])
     )
     user_data: dict = {
@@ -61,7 +72,57 @@ def register_user(u: RegisterInput, db: Session = Depends(get_db)):
         "role": u.role
     }
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     return {"message": "User Registered Well", "user_data": user_data}
 
+@router.put("/users/{user_id}")
+async def update_user(
+    user_id: UUID,
+    changes: UpdateInput,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user_record),
+):
+    is_admin = "admin" in current_user.roles
+    if current_user.id != user_id and not is_admin:
+        raise HTTPException(status_code=403, detail="You can only change your own account")
+    if changes.role is not None and not is_admin:
+        raise HTTPException(status_code=403, detail="Only admins can change roles")
+
+    user = await db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    fields = changes.model_dump(exclude_unset=True, exclude_none=True, exclude={"password", "role"})
+    taken = [getattr(models.User, field) == value for field, value in fields.items() if field in ("email", "phone")]
+    if taken and await db.scalar(select(exists().where(or_(*taken), models.User.id != user_id))):
+        raise HTTPException(status_code=400, detail="Email or phone already in use")
+    for field, value in fields.items():
+        setattr(user, field, value)
+    if changes.role is not None:
+        user.role = ",".join([r.value for r in changes.role])
+    if changes.password:
+        user.password = await passwords.hasher.hash(changes.password)
+    await db.commit()
+    # Cached tokens and role of the user are stale now
+    auth_cache.revoke_user(user_id)
+    return {
+        "message": "User Updated Well",
+        "user_data": {"user_id": user.id, "names": user.names, "email": user.email, "phone": user.phone, "role": user.role},
+    }
+
+@router.delete("/users/{user_id}", dependencies=[Depends(require_role("admin"))])
+async def delete_user(user_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    user = await db.get(models.User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    # Their products and sales keep pointing at them
+    if await db.scalar(select(or_(
+        exists().where(models.Product.created_by == user_id),
+        exists().where(models.Sale.sold_by == user_id),
+        exists().where(models.Location.manager_id == user_id),
+    ))):
+        raise HTTPException(status_code=409, detail="User has products, sales or locations. Change their role instead")
+    await db.delete(user)
+    await db.commit()
+    # Their tokens stop working on the next request
+    auth_cache.revoke_user(user_id)
+    return {"message": "User Deleted Well"}
@@ -1,18 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, Form, UploadFile, File, Query, Request
 
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, delete, tuple_, union_all
 
 from database.models import Supplier
 
-from schemas.product_schema import ProductInput, ProductImage, ProductOut,ProductUpdate
+from schemas.product_schema import ProductInput, ProductImage, ProductOut,ProductUpdate, ProductPage, ProductSort, SortOrder
+from schemas.product_schema import ImportConflict, ImportFormat, ImportReport, ProductChanges
+from schemas.product_schema import StockLevel, StockMovementInput, StockMovementOut, StockMovementPage, StockSharding, ManualMovementKind
 
-from database.get_db import get_db
+from database.get_db import get_db, get_async_db
 from database import models
 from datetime import datetime, UTC
-from typing import List
+from typing import List, Optional
+from collections import Counter
 from uuid import *
 from auth.auth import get_current_user
-import os, shutil, json, uuid
+from utils.pagination import encode_cursor, decode_cursor
+from utils.product_import import import_products as run_import, detect_format
+from utils.changes import record_changes, changes_since
+from utils.search import search_products
+from starlette.concurrency import run_in_threadpool
+from utils import images, cache, events, stock
 
 router = APIRouter(prefix="/api/v1", tags=["Product"])
 
@@ -30,34 +40,20 @@ async def register_product(
     sku: str = Form(...),
     unit: str = Form(...),
     low_stock_alert: int = Form(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: int = Depends(get_current_user)
 ):
     # Check if SKU already exists
-    check_sku = db.query(models.Product).filter(models.Product.sku == sku).first()
+    check_sku = await db.scalar(select(models.Product.id).where(models.Product.sku == sku))
     if check_sku:
         raise HTTPException(status_code=400, detail=f"Product with sku {sku} already registered")
 
-    # Create uploads folder
-    folder_path = "static/images"
-    os.makedirs(folder_path, exist_ok=True)
-
-    # Save front image
-    front_ext = os.path.splitext(front_image.filename)[1]
-    front_filename = f"{uuid.uuid4().hex}{front_ext}"
-    front_path = os.path.join(folder_path, front_filename)
-    with open(front_path, "wb") as f:
-        shutil.copyfileobj(front_image.file, f)
-
-    # Save back images
-    back_filenames = []
+    # Stream the uploads to disk off the event loop, named after their content
+    staged = [await images.stage_upload(front_image)]
     for image in back_images:
-        ext = os.path.splitext(image.filename)[1]
-        filename = f"{uuid.uuid4().hex}{ext}"
-        path = os.path.join(folder_path, filename)
-        with open(path, "wb") as f:
-            shutil.copyfileobj(image.file, f)
-        back_filenames.append(filename)
+        staged.append(await images.stage_upload(image))
+    front_filename = staged[0].filename
+    back_filenames = [image.filename for image in staged[1:]]
 
     # Save product
     new_product = models.Product(
@@ -70,16 +66,29 @@ async def register_product(
         category=category,
         brand=brand,
         front_image=front_filename,
-        back_image=json.dumps(back_filenames),
+        back_image=back_filenames,
         description=description,
         sku=sku,
         unit=unit,
         low_stock_alert=low_stock_alert
     )
 
-    db.add(new_product)
-    db.commit()
-    db.refresh(new_product)
+    try:
+        # Reference the files before they're moved in place, see images.release
+        await db.run_sync(images.acquire, [i.filename for i in staged], {i.filename: i.size for i in staged})
+        new_files = await run_in_threadpool(images.publish, staged)
+        db.add(new_product)
+        if quantity:
+            db.add(models.InventoryMovement(
+                product_id=new_product.id, kind=models.MovementKindDB.RECEIPT, quantity=quantity,
+                created_by=new_product.created_by, note="Opening stock"
+            ))
+        await db.run_sync(record_changes, [new_product.id])
+        await db.commit()
+        cache.bump(cache.PRODUCTS)
+    finally:
+        await run_in_threadpool(images.discard, staged)
+    images.schedule_variants(new_files)
 
     return {
         "status": "success",
@@ -89,62 +98,347 @@ async def register_product(
             "sku": sku
         }
     }
+#Endpoint to import many products at once from a CSV or JSONL file
+
+# Plain def: parsing and validation are CPU bound, so this runs in the threadpool
+@router.post("/products/import", response_model=ImportReport, dependencies=[Depends(get_current_user)])
+def import_products(
+    file: UploadFile = File(...),
+    format: Optional[ImportFormat] = Query(None, description="Guessed from the file name when omitted"),
+    on_conflict: ImportConflict = Query(ImportConflict.skip, description="What to do with SKUs that already exist"),
+    batch_size: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    fmt = format or detect_format(file.filename, file.content_type)
+    try:
+        return run_import(db, file.file, fmt, UUID(current_user), on_conflict, batch_size)
+    finally:
+        # Batches commit as they go, so even a failed import may have changed the catalog
+        cache.bump(cache.PRODUCTS)
+
+#Endpoint for tills to pick up catalog changes since their last sync
+
+@router.get("/products/changes", response_model=ProductChanges, dependencies=[Depends(get_current_user)])
+def product_changes(
+    since: Optional[str] = Query(None, description="next_cursor from the previous call, omit for a full sync"),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db)
+):
+    since_seq = 0
+    if since:
+        (value,) = decode_cursor(since, 1)
+        if not value.isdigit():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        since_seq = int(value)
+    products, deleted, next_seq, has_more = changes_since(db, since_seq, limit)
+    return {"items": products, "deleted": deleted, "next_cursor": encode_cursor(next_seq), "has_more": has_more}
+
+#Endpoint to list products at or below their low stock alert, for restock lists
+
+@router.get("/products/low_stock", response_model=ProductPage, dependencies=[Depends(get_current_user)])
+def low_stock_products(
+    request: Request,
+    category: Optional[List[str]] = Query(None, description="Repeat to include several categories"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    def build():
+        P = models.Product
+        filters = []
+        if category:
+            filters.append(P.category.in_(category))
+        if cursor:
+            last_category, product_id = decode_cursor(cursor, 2)
+            try:
+                filters.append(tuple_(P.category, P.id) > (last_category, UUID(product_id)))
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+        def first_ids(*predicate):
+            page = select(P.id).where(*predicate, *filters).order_by(P.category, P.id).limit(limit + 1).subquery()
+            return select(page.c.id)
+
+        # A page from each of the partial indexes ix_products_low_stock and ix_products_sharded,
+        # so only low-stock and sharded rows are ever read. Sharded products go by their live stock.
+        ids = union_all(
+            first_ids(P.quantity <= P.low_stock_alert, P.stock_slots == 0),
+            first_ids(P.stock_slots > 0, stock.on_hand() <= P.low_stock_alert),
+        ).subquery()
+        products = db.query(P).filter(P.id.in_(select(ids.c.id))).order_by(P.category, P.id).limit(limit + 1).all()
+
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            next_cursor = encode_cursor(products[-1].category, products[-1].id)
+        return {"items": products, "next_cursor": next_cursor}
+
+    # Sales and edits bump the products version, so the list is never stale
+    return cache.cached_response(request, (cache.PRODUCTS,), ProductPage, build)
+
+#Endpoint to search the catalog, every word is matched as a prefix
+
+@router.get("/products/search", response_model=ProductPage, dependencies=[Depends(get_current_user)])
+def search_catalog(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    def build():
+        after = None
+        if cursor:
+            score, product_id = decode_cursor(cursor, 2)
+            try:
+                after = (float(score), UUID(product_id))
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        products, last = search_products(db, q, limit, after)
+        return {"items": products, "next_cursor": encode_cursor(last.score, last.id) if last else None}
+
+    # Typeahead repeats the same prefixes, so most keystrokes are cache hits
+    return cache.cached_response(request, (cache.PRODUCTS,), ProductPage, build)
+
 # getting a certian product info
 
 @router.get("/api/v1/product/{product_id}", response_model=ProductOut, dependencies=[Depends(get_current_user)])
-def view_product(product_id: UUID, db: Session = Depends(get_db)):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    product_dict = product.__dict__
-    product_dict["back_image"] = json.loads(product.back_image)
-    return product
-
-#Listing All products
-
-@router.get("/get_products", response_model=list[ProductOut], dependencies=[Depends(get_current_user)])
-def get_all_products(db: Session = Depends(get_db)):
-    products = db.query(models.Product).all()
-    product_list = []
-    for p in products:
-        try:
-            p.back_image = json.loads(p.back_image)  # Convert from JSON string to list
-        except Exception:
-            p.back_image = []
-        product_list.append(p)
-    return product_list    
+def view_product(product_id: UUID, request: Request, db: Session = Depends(get_db)):
+    def build():
+        product = db.query(models.Product).filter(models.Product.id == product_id).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return product
+    return cache.cached_response(request, (cache.PRODUCTS,), ProductOut, build)
+
+#Listing products, one keyset page at a time
+
+# How a cursor value is turned back into the sort column's type
+SORT_VALUE_PARSERS = {
+    ProductSort.created_at: datetime.fromisoformat,
+    ProductSort.product_name: str,
+    ProductSort.selling_price: float,
+    ProductSort.quantity: int,
+}
+
+@router.get("/get_products", response_model=ProductPage, dependencies=[Depends(get_current_user)])
+def get_all_products(
+    request: Request,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: Optional[bool] = None,
+    sort: ProductSort = ProductSort.created_at,
+    order: SortOrder = SortOrder.desc,
+    db: Session = Depends(get_db)
+):
+    def build():
+        query = db.query(models.Product)
+        if category:
+            query = query.filter(models.Product.category == category)
+        if brand:
+            query = query.filter(models.Product.brand == brand)
+        if min_price is not None:
+            query = query.filter(models.Product.selling_price >= min_price)
+        if max_price is not None:
+            query = query.filter(models.Product.selling_price <= max_price)
+        if in_stock is not None:
+            query = query.filter(stock.on_hand() > 0 if in_stock else stock.on_hand() <= 0)
+
+        sort_column = getattr(models.Product, sort.value)
+        key = tuple_(sort_column, models.Product.id)
+        if cursor:
+            # The cursor remembers its sort so it can't be replayed against another ordering
+            cursor_sort, cursor_order, value, product_id = decode_cursor(cursor, 4)
+            if (cursor_sort, cursor_order) != (sort.value, order.value):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursor belongs to a different sort order")
+            try:
+                last_key = (SORT_VALUE_PARSERS[sort](value), UUID(product_id))
+            except ValueError:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+            query = query.filter(key < last_key if order == SortOrder.desc else key > last_key)
+
+        if order == SortOrder.desc:
+            query = query.order_by(sort_column.desc(), models.Product.id.desc())
+        else:
+            query = query.order_by(sort_column.asc(), models.Product.id.asc())
+        products = query.limit(limit + 1).all()
+
+        next_cursor = None
+        if len(products) > limit:
+            products = products[:limit]
+            last = products[-1]
+            value = getattr(last, sort.value)
+            next_cursor = encode_cursor(sort.value, order.value, value.isoformat() if isinstance(value, datetime) else value, last.id)
+        return {"items": products, "next_cursor": next_cursor}
+
+    # Served from the response cache until a product write bumps the version
+    return cache.cached_response(request, (cache.PRODUCTS,), ProductPage, build)
 
 @router.put("/edit_product/{product_id}", response_model=ProductUpdate, dependencies=[Depends(get_current_user)])
 def edit_product(
     product_id: UUID,
     updated_data: ProductUpdate,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
 ):
-    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    # Locked, so the stock adjustment below is measured against what's really on hand
+    product = db.query(models.Product).filter(models.Product.id == product_id).with_for_update().first()
 
     if not product:
         raise HTTPException(status_code=404, detail=f"Product with id: {product_id} was not found")
 
+    old_images = [product.front_image, *product.back_image]
+    old_quantity = stock.available_stock(db, {product.id: product})[product.id]
+
     # Update fields only if provided in the request
-    for field, value in updated_data.model_dump(exclude_unset=True).items():
-        if field == "back_image" and value is not None:
-            setattr(product, field, json.dumps(value))  # convert list to JSON string
-        else:
-            setattr(product, field, value)
+    changes = updated_data.model_dump(exclude_unset=True)
+    new_quantity = changes.pop("quantity", None)
+    for field, value in changes.items():
+        setattr(product, field, value)
+    if new_quantity is not None:
+        delta = stock.set_level(db, product, new_quantity)
+        stock.record_movements(db, stock.movements(
+            models.MovementKindDB.ADJUSTMENT, {product.id: delta}, created_by=UUID(current_user), note="Edited product"
+        ))
+
+    # Keep the image reference counts in step with the product's image slots
+    new_images = [product.front_image, *product.back_image]
+    images.acquire(db, list((Counter(new_images) - Counter(old_images)).elements()))
+    unused = images.release(db, list((Counter(old_images) - Counter(new_images)).elements()))
+    record_changes(db, [product.id])
+    if new_quantity is not None and new_quantity != old_quantity:
+        events.queue(db, *events.stock_change(product, old_quantity, new_quantity))
 
     # Update last_modified automatically
     product.last_modified = datetime.now(UTC)
     
 
+    db.commit()
+    cache.bump(cache.PRODUCTS)
+    # Files go only once nothing references them any more, see images.reclaim
+    images.remove_files(images.reclaim(db, unused))
     db.commit()
     db.refresh(product)
     return updated_data
 @router.delete("/delete_product/{product_id}",  dependencies=[Depends(get_current_user)])
-async def delete_product(product_id: UUID, db: Session = Depends(get_db),):
+async def delete_product(product_id: UUID, db: AsyncSession = Depends(get_async_db),):
+    product = await db.get(models.Product, product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    await db.execute(delete(models.StockShard).where(models.StockShard.product_id == product_id))
+    await db.execute(delete(models.LocationStock).where(models.LocationStock.product_id == product_id))
+    await db.execute(delete(models.SupplierProduct).where(models.SupplierProduct.product_id == product_id))
+    await db.delete(product)
+    unused = await db.run_sync(images.release, [product.front_image, *product.back_image])
+    await db.run_sync(record_changes, [product.id])
+    await db.commit()
+    cache.bump(cache.PRODUCTS)
+    # Files go only once nothing references them any more, see images.reclaim
+    unused = await db.run_sync(images.reclaim, unused)
+    await run_in_threadpool(images.remove_files, unused)
+    await db.commit()
+    return {"message":"Product deleted well"}
+
+#Endpoint to see a product's stock: on hand, its shards and what the ledger adds up to
+
+@router.get("/products/{product_id}/stock", response_model=StockLevel, dependencies=[Depends(get_current_user)])
+def product_stock(product_id: UUID, db: Session = Depends(get_db)):
     product = db.get(models.Product, product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    db.delete(product)
+    return stock.stock_level(db, product)
+
+#Endpoint to record a delivery or a stock count correction
+
+@router.post("/products/{product_id}/stock/movements", response_model=StockMovementOut, dependencies=[Depends(get_current_user)])
+def add_stock_movement(
+    product_id: UUID,
+    movement: StockMovementInput,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user)
+):
+    products = stock.lock_products(db, [product_id])
+    if product_id not in products:
+        raise HTTPException(status_code=404, detail="Product not found")
+    product = products[product_id]
+    if movement.kind == ManualMovementKind.receipt and movement.quantity <= 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A receipt must add at least one unit")
+    if movement.quantity == 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="An adjustment can't be zero")
+
+    on_hand = available = stock.available_stock(db, products)[product_id]
+    location_id = movement.location_id
+    if location_id:
+        stock.require_location(stock.load_locations(db, [location_id]), location_id)
+        # Units can only leave a location that holds them
+        available = stock.location_levels(db, [(location_id, product_id)], lock=True)[(location_id, product_id)]
+    if available + movement.quantity < 0:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Not enough stock for product '{product.product_name}'. Available: {available}"
+        )
+    if movement.quantity > 0:
+        stock.restock(db, {product_id: movement.quantity}, products)
+    elif product.stock_slots:
+        stock.reserve_shards(db, {product_id: -movement.quantity}, products)
+    else:
+        stock.reserve_stock(db, {product_id: -movement.quantity})
+    if location_id and movement.quantity > 0:
+        stock.add_to_location(db, location_id, {product_id: movement.quantity})
+    elif location_id:
+        stock.take_from_location(db, location_id, {product_id: -movement.quantity})
+
+    db_movement = models.InventoryMovement(
+        product_id=product_id, kind=models.MovementKindDB(movement.kind.value), quantity=movement.quantity,
+        created_by=UUID(current_user), note=movement.note, location_id=location_id
+    )
+    db.add(db_movement)
+    if not product.stock_slots:
+        record_changes(db, [product_id])
+    events.queue(db, *events.stock_change(product, on_hand, on_hand + movement.quantity))
     db.commit()
-    return {"message":"Product deleted well"}
+    cache.bump(cache.PRODUCTS)
+    db.refresh(db_movement)
+    return db_movement
 
+#Endpoint to page through a product's stock movements, newest first
+
+@router.get("/products/{product_id}/stock/movements", response_model=StockMovementPage, dependencies=[Depends(get_current_user)])
+def stock_movements(
+    product_id: UUID,
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    query = db.query(models.InventoryMovement).filter(models.InventoryMovement.product_id == product_id)
+    if cursor:
+        (value,) = decode_cursor(cursor, 1)
+        if not value.isdigit():
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        query = query.filter(models.InventoryMovement.id < int(value))
+    items = query.order_by(models.InventoryMovement.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor(items[-1].id)
+    return {"items": items, "next_cursor": next_cursor}
+
+#Endpoint to spread a hot product's stock over several counters, or back onto one with slots=0
+
+@router.put("/products/{product_id}/stock/shards", response_model=StockLevel, dependencies=[Depends(get_current_user)])
+def shard_product_stock(product_id: UUID, sharding: StockSharding, db: Session = Depends(get_db)):
+    product = db.query(models.Product).filter(models.Product.id == product_id).with_for_update().first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    stock.shard(db, product, stock.STOCK_SHARDS if sharding.slots is None else sharding.slots)
+    # products.quantity is brought up to date either way
+    record_changes(db, [product_id])
+    db.commit()
+    cache.bump(cache.PRODUCTS)
+    return stock.stock_level(db, product)
@@ -1,148 +1,406 @@
 from fastapi import HTTPException, Depends, APIRouter, status, Query
 from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, cast, Date
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy import func, desc, tuple_, case, and_, select, literal, union_all
 from database import models
 
 from auth.auth import get_current_user
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.encoders import jsonable_encoder
-from schemas.sales_schema import SaleInput, SaleOut, SaleUpdateStatus
+from schemas.sales_schema import SaleInput, SaleOut, SaleUpdateStatus, SalePage
+from schemas.sales_schema import BatchSaleInput, BatchSaleStatus, SaleBatch, SaleBatchResult, ExportFormat
 from uuid import UUID, uuid4
-from database.get_db import get_db
+from database.get_db import get_db, get_async_db
+from utils.pagination import encode_cursor, decode_cursor
+from utils.stock import lock_products, reserve_stock, reserve_shards, split_sharded, available_stock, current_stock
+from utils import stock
+from utils.changes import record_changes
+from utils.sales_export import export_sales as run_export
+from utils import rollup, cache, events
 
-from datetime import datetime, UTC, date
+from datetime import datetime, UTC, date, time, timedelta
+import asyncio, os
 
 
 router = APIRouter(prefix="/api/v1/sales", tags=["Sales"])
 
-@router.get("/{sale_id}", response_model=SaleOut, dependencies=[Depends(get_current_user)])
-def get_sale(sale_id: UUID, db: Session = Depends(get_db)):
-    sale = db.query(models.Sale).filter(models.Sale.id == sale_id).first()
-    if not sale:
-        raise HTTPException(status_code=404, detail="Sale not found")
+def build_sale(sale_data: SaleInput, db_products: dict, available: dict, seller_id: UUID) -> tuple[models.Sale, dict]:
+    """
+    Validate a basket against already loaded products and the units still
+    `available` ({product_id: units}), and build the Sale with its line items.
+    Returns the sale and the units it takes per product; nothing is written.
+    """
+    # Units per product, so a SKU listed twice in the basket is reserved once
+    wanted = {}
+    for product in sale_data.products:
+        wanted[product.product_id] = wanted.get(product.product_id, 0) + product.quantity_sold
+
+    for product_id, quantity in wanted.items():
+        db_product = db_products.get(product_id)
+        if not db_product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with ID {product_id} not found"
+            )
+        if available[product_id] < quantity:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Not enough stock for product '{db_product.product_name}'. Available: {available[product_id]}"
+            )
+
+    # Validate and calculate
+    subtotal = 0.0
+    products_sold = []
+
+    for product in sale_data.products:
+        db_product = db_products[product.product_id]
+        product_total = product.selling_price * product.quantity_sold
+        subtotal += product_total - product.discount
+
+        products_sold.append(models.ProductSold(
+            product_id=product.product_id,
+            product_name=db_product.product_name,
+            quantity_sold=product.quantity_sold,
+            selling_price=product.selling_price,
+            cost_price=db_product.buying_price,
+            discount=product.discount
+        ))
+
+    # Final totals
+    total_discount = sale_data.total_discount or 0.0
+    taxes = sale_data.taxes or 0.0
+    total = subtotal - total_discount + taxes
+
+    # Create sale DB model, line items are inserted with it in one batch
+    db_sale = models.Sale(
+        id=uuid4(),
+        buyer_name=sale_data.buyer_name,
+        buyer_phone=sale_data.buyer_phone,
+        buyer_email=sale_data.buyer_email,
+        payment_method=models.PaymentMethodDB(sale_data.payment_method.value),
+        payment_reference=sale_data.payment_reference,
+        subtotal=subtotal,
+        total_discount=total_discount,
+        taxes=taxes,
+        total=total,
+        currency=sale_data.currency,
+        sold_by=seller_id,
+        notes=sale_data.notes,
+        status=models.SaleStatusDB.COMPLETED,
+        sold_at=sale_data.sold_at or datetime.now(UTC),
+        idempotency_key=sale_data.idempotency_key,
+        location_id=sale_data.location_id,
+        products=products_sold
+    )
+    return db_sale, wanted
+
 
-    products = db.query(models.ProductSold).filter(models.ProductSold.sale_id == sale_id).all()
-    return SaleOut(
-        **sale.__dict__,
-        products=products
+def record_sale(db: Session, sale_data: SaleInput, seller_id: UUID) -> models.Sale:
+    """
+    Validate the basket, write the sale with its line items and take the units
+    out of stock, without committing. Works on a plain Session so async routes
+    can run it through AsyncSession.run_sync.
+    """
+    # Whole basket in one query, rows locked until commit
+    db_products = lock_products(db, {p.product_id for p in sale_data.products})
+    available = available_stock(db, db_products)
+    # A shop can only sell what is on its own shelves
+    on_shelf = available
+    if sale_data.location_id:
+        stock.require_location(stock.load_locations(db, [sale_data.location_id]), sale_data.location_id)
+        on_shelf = shelf_stock(stock.location_levels(db, location_pairs(sale_data)), sale_data)
+
+    db_sale, wanted = build_sale(sale_data, db_products, on_shelf, seller_id)
+    db.add(db_sale)
+    db.flush()
+
+    # Guarded decrement, a till that sold the last units first makes this one fail
+    plain, sharded = split_sharded(wanted, db_products)
+    reserve_stock(db, plain)
+    reserve_shards(db, sharded, db_products)
+    if sale_data.location_id:
+        stock.take_from_location(db, sale_data.location_id, wanted)
+    rollup.apply_sale(db, db_sale)
+    # Sharded products' rows only change when their shards are folded
+    record_changes(db, plain)
+    stock.record_movements(db, sale_movements(db_sale, wanted))
+    for product_id, units in wanted.items():
+        events.queue(db, *events.stock_change(db_products[product_id], available[product_id], available[product_id] - units))
+    events.queue(db, events.sale_event(db_sale))
+
+    return db_sale
+
+
+def sale_movements(db_sale: models.Sale, wanted: dict) -> list[dict]:
+    units_out = {product_id: -units for product_id, units in wanted.items()}
+    return stock.movements(
+        models.MovementKindDB.SALE, units_out,
+        sale_id=db_sale.id, created_by=db_sale.sold_by, location_id=db_sale.location_id
     )
 
+
+def location_pairs(sale_data: SaleInput) -> set:
+    return {(sale_data.location_id, p.product_id) for p in sale_data.products}
+
+
+def shelf_stock(levels: dict, sale_data: SaleInput) -> dict:
+    """{product_id: units} the sale's location holds, out of location_levels."""
+    return {p.product_id: levels[(sale_data.location_id, p.product_id)] for p in sale_data.products}
+
+
+def _existing_sales(db: Session, keys) -> dict:
+    rows = db.execute(
+        select(models.Sale.idempotency_key, models.Sale.id, models.Sale.total)
+        .where(models.Sale.idempotency_key.in_(list(keys)))
+    ).all()
+    return {key: (sale_id, total) for key, sale_id, total in rows}
+
+
+def record_sales_batch(db: Session, sales: List[BatchSaleInput], seller_id: UUID, chunk_size: int = 100) -> list[dict]:
+    """
+    Record a till's queued sales, committing `chunk_size` sales per transaction.
+    Sales whose idempotency key is already stored are reported as duplicates.
+    All products are loaded in one query and stock is checked against a running
+    total, so every chunk needs one guarded UPDATE and one rollup upsert. A chunk
+    that loses a race with another checkout is replayed sale by sale.
+    """
+    results: list[Optional[dict]] = [None] * len(sales)
+
+    def created(i, db_sale):
+        results[i] = {"status": BatchSaleStatus.created, "sale_id": db_sale.id, "total": db_sale.total}
+
+    def duplicate(i, existing):
+        results[i] = {"status": BatchSaleStatus.duplicate, "sale_id": existing[0], "total": existing[1]}
+
+    def failed(i, error):
+        results[i] = {"status": BatchSaleStatus.failed, "error": error}
+
+    # Keys repeated inside the batch are resolved from their first occurrence at the end
+    first_seen, repeats, todo = {}, [], []
+    for i, sale_data in enumerate(sales):
+        if sale_data.idempotency_key in first_seen:
+            repeats.append((i, first_seen[sale_data.idempotency_key]))
+        else:
+            first_seen[sale_data.idempotency_key] = i
+            todo.append(i)
+
+    existing = _existing_sales(db, first_seen)
+    db_products = lock_products(db, {p.product_id for i in todo for p in sales[i].products})
+    available = available_stock(db, db_products)
+    # Stock as committed so far, for the events each chunk publishes
+    level = dict(available)
+    located = [i for i in todo if sales[i].location_id]
+    locations = stock.load_locations(db, {sales[i].location_id for i in located})
+    shelves = stock.location_levels(db, {pair for i in located for pair in location_pairs(sales[i])})
+
+    prepared = []
+    for i in todo:
+        key = sales[i].idempotency_key
+        if key in existing:
+            duplicate(i, existing[key])
+            continue
+        location_id = sales[i].location_id
+        try:
+            on_shelf = available
+            if location_id:
+                stock.require_location(locations, location_id)
+                on_shelf = shelf_stock(shelves, sales[i])
+            db_sale, wanted = build_sale(sales[i], db_products, on_shelf, seller_id)
+        except HTTPException as e:
+            failed(i, e.detail)
+            continue
+        for product_id, units in wanted.items():
+            available[product_id] -= units
+            if location_id:
+                shelves[(location_id, product_id)] -= units
+        prepared.append((i, db_sale, wanted))
+
+    for start in range(0, len(prepared), chunk_size):
+        chunk = prepared[start:start + chunk_size]
+        reserved, by_location = {}, {}
+        for _, db_sale, wanted in chunk:
+            for product_id, units in wanted.items():
+                reserved[product_id] = reserved.get(product_id, 0) + units
+                if db_sale.location_id:
+                    shelf = by_location.setdefault(db_sale.location_id, {})
+                    shelf[product_id] = shelf.get(product_id, 0) + units
+        try:
+            db.add_all([db_sale for _, db_sale, _ in chunk])
+            db.flush()
+            plain, sharded = split_sharded(reserved, db_products)
+            reserve_stock(db, plain)
+            reserve_shards(db, sharded, db_products)
+            for location_id in sorted(by_location):
+                stock.take_from_location(db, location_id, by_location[location_id])
+            rollup.apply_sales(db, [db_sale for _, db_sale, _ in chunk])
+            record_changes(db, plain)
+            stock.record_movements(db, [row for _, db_sale, wanted in chunk for row in sale_movements(db_sale, wanted)])
+            for product_id, units in reserved.items():
+                events.queue(db, *events.stock_change(db_products[product_id], level[product_id], level[product_id] - units))
+            events.queue(db, *(events.sale_event(db_sale) for _, db_sale, _ in chunk))
+            db.commit()
+        except (HTTPException, IntegrityError):
+            # Stock or a key was taken by a concurrent request since we read it
+            db.rollback()
+            for i, _, _ in chunk:
+                try:
+                    db_sale = record_sale(db, sales[i], seller_id)
+                    db.commit()
+                except HTTPException as e:
+                    db.rollback()
+                    failed(i, e.detail)
+                except IntegrityError:
+                    db.rollback()
+                    duplicate(i, _existing_sales(db, [sales[i].idempotency_key])[sales[i].idempotency_key])
+                else:
+                    created(i, db_sale)
+            level.update(current_stock(db, reserved))
+            shelves.update(stock.location_levels(db, {(l, p) for l, units in by_location.items() for p in units}))
+            continue
+        for product_id, units in reserved.items():
+            level[product_id] -= units
+        for i, db_sale, _ in chunk:
+            created(i, db_sale)
+
+    for i, first in repeats:
+        result = results[first]
+        results[i] = result if result["status"] == BatchSaleStatus.failed else {**result, "status": BatchSaleStatus.duplicate}
+
+    return [{"idempotency_key": sale_data.idempotency_key, **result} for sale_data, result in zip(sales, results)]
+
+
 @router.post("/sell_product", dependencies=[Depends(get_current_user)])
 async def sell_product(
     sale_data: SaleInput,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UUID = Depends(get_current_user)  # Return UUID only from get_current_user
 ):
     """
     Process a sale transaction with multiple products.
     """
     try:
-        # Validate and calculate
-        subtotal = 0.0
-        products_to_sell = []
-
-        for product in sale_data.products:
-            db_product = db.query(models.Product).filter(models.Product.id == product.product_id).first()
-            if not db_product:
-                raise HTTPException(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    detail=f"Product with ID {product.product_id} not found"
-                )
-            if db_product.quantity < product.quantity_sold:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Not enough stock for product '{db_product.product_name}'. Available: {db_product.quantity}"
-                )
-            
-            product_total = product.selling_price * product.quantity_sold
-            subtotal += product_total - product.discount
-
-            products_to_sell.append({
-                "product_id": product.product_id,
-                "product_name": db_product.product_name,
-                "quantity_sold": product.quantity_sold,
-                "selling_price": product.selling_price,
-                "cost_price": db_product.buying_price,
-                "discount": product.discount
-            })
-
-        # Final totals
-        total_discount = sale_data.total_discount or 0.0
-        taxes = sale_data.taxes or 0.0
-        total = subtotal - total_discount + taxes
-
-        # Create sale DB model
-        db_sale = models.Sale(
-            id=uuid4(),
-            buyer_name=sale_data.buyer_name,
-            buyer_phone=sale_data.buyer_phone,
-            buyer_email=sale_data.buyer_email,
-            payment_method=sale_data.payment_method.name.upper(),
-            payment_reference=sale_data.payment_reference,
-            subtotal=subtotal,
-            total_discount=total_discount,
-            taxes=taxes,
-            total=total,
-            currency=sale_data.currency,
-            sold_by=UUID(current_user),
-            notes=sale_data.notes,
-            status="completed".upper(),
-            sold_at=sale_data.sold_at or datetime.now(UTC)
-        )
-
-        db.add(db_sale)
-        db.flush()  # To get sale ID
-
-        # Insert sold products and update stock
-        for p in products_to_sell:
-            db_product_sold = models.ProductSold(
-                sale_id=db_sale.id,
-                product_id=p["product_id"],
-                product_name=p["product_name"],
-                quantity_sold=p["quantity_sold"],
-                selling_price=p["selling_price"],
-                cost_price=p["cost_price"],
-                discount=p["discount"]
-            )
-            db.add(db_product_sold)
-
-            db_product = db.query(models.Product).filter(models.Product.id == p["product_id"]).first()
-            db_product.quantity -= p["quantity_sold"]
-            db.add(db_product)
-
-        db.commit()
+        db_sale = await db.run_sync(record_sale, sale_data, UUID(current_user))
+        await db.commit()
+        # Stock levels are part of the cached catalog
+        cache.bump(cache.PRODUCTS)
 
         return {
             "message": "Sale completed successfully",
             "sale_id": str(db_sale.id),
-            "total": total
+            "total": db_sale.total
         }
 
+    except HTTPException:
+        await db.rollback()
+        raise
+    except IntegrityError as e:
+        await db.rollback()
+        # A retried request whose sale already went through gets that sale back
+        existing = None
+        if sale_data.idempotency_key:
+            existing = (await db.run_sync(_existing_sales, [sale_data.idempotency_key])).get(sale_data.idempotency_key)
+        if not existing:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error processing sale: {str(e)}"
+            )
+        return {
+            "message": "Sale already recorded",
+            "sale_id": str(existing[0]),
+            "total": existing[1]
+        }
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error processing sale: {str(e)}"
         )
 
 
+# Batch syncs allowed to run at once. When every till reconnects after an outage the
+# rest wait briefly and are then told to retry, instead of all queueing on the DB pool.
+BATCH_CONCURRENCY = int(os.getenv("SALES_BATCH_CONCURRENCY", 4))
+BATCH_QUEUE_TIMEOUT = float(os.getenv("SALES_BATCH_QUEUE_TIMEOUT", 10))
+BATCH_RETRY_AFTER = os.getenv("SALES_BATCH_RETRY_AFTER", "5")
+_batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
 
-#Endpoint to display all sales
 
-@router.get("/", response_model=List[SaleOut], dependencies=[Depends(get_current_user)])
-def get_all_sales(db: Session = Depends(get_db)):
-    sales = db.query(models.Sale).all()
+#Endpoint for tills to upload the sales they queued while offline
 
-    result = []
-    for sale in sales:
-        sold_products = db.query(models.ProductSold).filter(models.ProductSold.sale_id == sale.id).all()
-        sale_out = SaleOut(
-            **sale.__dict__,
-            products=sold_products
+@router.post("/batch", response_model=SaleBatchResult, dependencies=[Depends(get_current_user)])
+async def sell_products_batch(
+    batch: SaleBatch,
+    chunk_size: int = Query(100, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UUID = Depends(get_current_user)
+):
+    """
+    Record up to 500 sales in one request. Every sale carries an idempotency key,
+    so re-sending a batch after a timeout reports the sales already stored as
+    duplicates instead of recording them twice.
+    """
+    try:
+        await asyncio.wait_for(_batch_slots.acquire(), timeout=BATCH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many sales batches in progress, retry later",
+            headers={"Retry-After": BATCH_RETRY_AFTER}
+        )
+    try:
+        results = await db.run_sync(record_sales_batch, batch.sales, UUID(current_user), chunk_size)
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error processing sales batch: {str(e)}"
         )
-        result.append(sale_out)
-    return result
+    finally:
+        _batch_slots.release()
+        # Chunks commit as they go, so stock may have moved even when the batch failed
+        cache.bump(cache.PRODUCTS)
+
+    counts = {s: sum(1 for r in results if r["status"] == s) for s in BatchSaleStatus}
+    return {
+        "created": counts[BatchSaleStatus.created],
+        "duplicates": counts[BatchSaleStatus.duplicate],
+        "failed": counts[BatchSaleStatus.failed],
+        "results": results
+    }
+
+
+
+#Endpoint to display all sales
+
+@router.get("/", response_model=SalePage, dependencies=[Depends(get_current_user)])
+def get_all_sales(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    location_id: Optional[UUID] = Query(None, description="Only sales made at this location"),
+    db: Session = Depends(get_db)
+):
+    # Newest first, keyset on (sold_at, id) so deep pages cost the same as the first one
+    query = db.query(models.Sale).options(selectinload(models.Sale.products))
+    if location_id:
+        # Walks ix_sales_location_id, a shop's page never reads other shops' sales
+        query = query.filter(models.Sale.location_id == location_id)
+    if cursor:
+        sold_at, sale_id = decode_cursor(cursor, 2)
+        try:
+            last_key = (datetime.fromisoformat(sold_at), UUID(sale_id))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+        query = query.filter(tuple_(models.Sale.sold_at, models.Sale.id) < last_key)
+
+    sales = query.order_by(models.Sale.sold_at.desc(), models.Sale.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(sales) > limit:
+        sales = sales[:limit]
+        next_cursor = encode_cursor(sales[-1].sold_at.isoformat(), sales[-1].id)
+    return {"items": sales, "next_cursor": next_cursor}
 
 #Endpoint to delete the sale by it ID
 
@@ -151,22 +409,23 @@ def delete_sale(sale_id: UUID, db: Session = Depends(get_db)):
     """
     Deleting the sale by its id
     """
-    sale = db.query(models.Sale).filter(models.Sale.id == sale_id).first()
+    sale = db.query(models.Sale).options(selectinload(models.Sale.products)).filter(models.Sale.id == sale_id).first()
     if not sale:
         raise HTTPException(status_code=404, detail="Sale not found")
+    rollup.apply_sale(db, sale, sign=-1)
     db.delete(sale)
     db.commit()
     return {"message": "Sale deleted successfully"}
 
 #Endpoint to  create sales order document, but here will return just json,forn end will deal with wich document to export
 @router.get("/{sale_id}/document", dependencies=[Depends(get_current_user)])
-async def generate_sales_document(sale_id: UUID, db: Session = Depends(get_db)):
-    sale = db.query(models.Sale).filter(models.Sale.id == sale_id).first()
+async def generate_sales_document(sale_id: UUID, db: AsyncSession = Depends(get_async_db)):
+    sale = await db.get(models.Sale, sale_id)
     if not sale:
         raise HTTPException(status_code=404, detail="Invalid sale ID")
 
     # Optionally include sold products
-    sold_products = db.query(models.ProductSold).filter(models.ProductSold.sale_id == sale_id).all()
+    sold_products = (await db.scalars(select(models.ProductSold).where(models.ProductSold.sale_id == sale_id))).all()
 
     response = {
         "sale": jsonable_encoder(sale),
@@ -183,13 +442,66 @@ def update_sale_status(
     update_data: SaleUpdateStatus,
     db: Session = Depends(get_db)
 ):
-    sale = db.query(models.Sale).filter(models.Sale.id == sale_id).first()
+    sale = db.query(models.Sale).options(selectinload(models.Sale.products)).filter(models.Sale.id == sale_id).first()
     if not sale:
         raise HTTPException(status_code=404, detail="Sale not found")
-    
-    sale.status = update_data.status.value.lower()
+
+    new_status = models.SaleStatusDB(update_data.status.value.lower())
+    old_status = models.SaleStatusDB(sale.status)
+    if old_status != new_status:
+        # Move the sale's figures from its old status bucket to the new one
+        rollup.apply_sale(db, sale, sign=-1)
+        rollup.apply_sale(db, sale, status=new_status)
+    restocked = models.SaleStatusDB.REFUNDED in (old_status, new_status) and old_status != new_status
+    if restocked:
+        # A full refund puts the units back on the shelf, undoing it takes them again
+        move_refunded_stock(db, sale, back_in=new_status == models.SaleStatusDB.REFUNDED)
+    sale.status = new_status
+    events.queue(db, events.sale_event(sale))
     db.commit()
-    return {"message": f"Sale status updated to {sale.status}"}
+    if restocked:
+        cache.bump(cache.PRODUCTS)
+    return {"message": f"Sale status updated to {new_status.value}"}
+
+
+def move_refunded_stock(db: Session, sale: models.Sale, back_in: bool) -> None:
+    units = {}
+    for line in sale.products:
+        units[line.product_id] = units.get(line.product_id, 0) + line.quantity_sold
+    db_products = lock_products(db, units)
+    # Lines of products deleted since the sale have no stock to move
+    units = {product_id: n for product_id, n in units.items() if product_id in db_products}
+    available = available_stock(db, db_products)
+    plain, sharded = split_sharded(units, db_products)
+    # Refunded units go back to the shop that sold them
+    location_id = sale.location_id
+    if back_in:
+        stock.restock(db, units, db_products)
+        if location_id:
+            stock.add_to_location(db, location_id, units)
+        kind, sign = models.MovementKindDB.REFUND, 1
+    else:
+        on_shelf = available
+        if location_id:
+            levels = stock.location_levels(db, [(location_id, product_id) for product_id in units])
+            on_shelf = {product_id: levels[(location_id, product_id)] for product_id in units}
+        for product_id, n in units.items():
+            if on_shelf[product_id] < n:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Not enough stock for product '{db_products[product_id].product_name}'. Available: {on_shelf[product_id]}"
+                )
+        reserve_stock(db, plain)
+        reserve_shards(db, sharded, db_products)
+        if location_id:
+            stock.take_from_location(db, location_id, units)
+        kind, sign = models.MovementKindDB.SALE, -1
+    record_changes(db, plain)
+    stock.record_movements(db, stock.movements(
+        kind, {p: sign * n for p, n in units.items()}, sale_id=sale.id, location_id=location_id
+    ))
+    for product_id, n in units.items():
+        events.queue(db, *events.stock_change(db_products[product_id], available[product_id], available[product_id] + sign * n))
 
 
 # filter sales by seller
@@ -208,68 +520,75 @@ def get_sales_summary(
     date_from: date = Query(None, description="Filter sales from this date (YYYY-MM-DD)"),
     date_to: date = Query(None, description="Filter sales up to this date (YYYY-MM-DD)")
 ):
-    # Build base query
-    sales_query = db.query(models.Sale)
-    products_query = db.query(models.ProductSold)
-
+    # Everything comes from the daily rollup, filtered on its indexed day column
+    R = models.SalesDailyRollup
+    filters = []
     if date_from:
-        sales_query = sales_query.filter(cast(models.Sale.sold_at, Date) >= date_from)
-        products_query = products_query.join(models.Sale).filter(cast(models.Sale.sold_at, Date) >= date_from)
-
-    if date_to:
-        sales_query = sales_query.filter(cast(models.Sale.sold_at, Date) <= date_to)
-        products_query = products_query.join(models.Sale).filter(cast(models.Sale.sold_at, Date) <= date_to)
-
-    # Metrics
-    total_sales = sales_query.count()
-    total_revenue = sales_query.with_entities(func.sum(models.Sale.total)).scalar() or 0.0
-    total_taxes = sales_query.with_entities(func.sum(models.Sale.taxes)).scalar() or 0.0
-    total_profit = products_query.with_entities(func.sum(models.ProductSold.selling_price - models.ProductSold.cost_price)).scalar() or 0.0
-
-    pending_sales = sales_query.filter(models.Sale.status == "pending").count()
-    completed_sales = sales_query.filter(models.Sale.status == "completed").count()
-    refunded_sales = sales_query.filter(models.Sale.status == "refunded").count()
-    partial_refunded_sales = sales_query.filter(models.Sale.status == "partially_refunded").count()
-
-    # Most sold product
-    top_product = products_query.with_entities(
-        models.ProductSold.product_name,
-        func.sum(models.ProductSold.quantity_sold).label("total_sold")
-    ).group_by(models.ProductSold.product_name).order_by(desc("total_sold")).first()
-
-    # Top seller
-    top_seller = db.query(
-        models.User.names,
-        func.count(models.Sale.id).label("sales_count")
-    ).join(models.Sale, models.Sale.sold_by == models.User.id)
-
-    if date_from:
-        top_seller = top_seller.filter(cast(models.Sale.sold_at, Date) >= date_from)
+        filters.append(R.day >= date_from)
     if date_to:
-        top_seller = top_seller.filter(cast(models.Sale.sold_at, Date) <= date_to)
-
-    top_seller = top_seller.group_by(models.User.names).order_by(desc("sales_count")).first()
+        filters.append(R.day <= date_to)
+
+    sale_rows = R.product_id == models.SALE_TOTALS_PRODUCT_ID
+
+    def total(measure, *conditions):
+        return func.coalesce(func.sum(case((and_(*conditions), measure), else_=0)), 0)
+
+    # Metrics, one pass with conditional aggregation
+    metrics = db.query(
+        total(R.sales_count, sale_rows).label("total_sales"),
+        total(R.revenue, sale_rows).label("total_revenue"),
+        total(R.taxes, sale_rows).label("total_taxes"),
+        total(R.revenue - R.cost, R.product_id != models.SALE_TOTALS_PRODUCT_ID).label("total_profit"),
+        total(R.sales_count, sale_rows, R.status == models.SaleStatusDB.PENDING).label("pending_sales"),
+        total(R.sales_count, sale_rows, R.status == models.SaleStatusDB.COMPLETED).label("completed_sales"),
+        total(R.sales_count, sale_rows, R.status == models.SaleStatusDB.REFUNDED).label("refunded_sales"),
+        total(R.sales_count, sale_rows, R.status == models.SaleStatusDB.PARTIALLY_REFUNDED).label("partial_refunded_sales")
+    ).filter(*filters).one()
+
+    # Most sold product and top seller, fetched together
+    top_product = (
+        select(literal("product").label("kind"), func.max(R.product_name).label("name"), func.sum(R.units_sold).label("amount"))
+        .where(R.product_id != models.SALE_TOTALS_PRODUCT_ID, *filters)
+        .group_by(R.product_id)
+        .order_by(desc("amount"))
+        .limit(1)
+    )
+    top_seller = (
+        select(literal("seller").label("kind"), models.User.names.label("name"), func.sum(R.sales_count).label("amount"))
+        .join(models.User, models.User.id == R.sold_by)
+        .where(sale_rows, *filters)
+        .group_by(models.User.id, models.User.names)
+        .order_by(desc("amount"))
+        .limit(1)
+    )
+    leaders = {
+        row.kind: row for row in db.execute(
+            union_all(select(top_product.subquery()), select(top_seller.subquery()))
+        )
+    }
+    top_product = leaders.get("product")
+    top_seller = leaders.get("seller")
 
     return {
         "filters": {
             "date_from": date_from,
             "date_to": date_to
         },
-        "total_sales": total_sales,
-        "total_revenue": total_revenue,
-        "total_taxes": total_taxes,
-        "total_profit": total_profit,
-        "pending_sales": pending_sales,
-        "completed_sales": completed_sales,
-        "refunded_sales": refunded_sales,
-        "partial_refunded_sales": partial_refunded_sales,
+        "total_sales": metrics.total_sales,
+        "total_revenue": metrics.total_revenue,
+        "total_taxes": metrics.total_taxes,
+        "total_profit": metrics.total_profit,
+        "pending_sales": metrics.pending_sales,
+        "completed_sales": metrics.completed_sales,
+        "refunded_sales": metrics.refunded_sales,
+        "partial_refunded_sales": metrics.partial_refunded_sales,
         "most_sold_product": {
-            "name": top_product[0] if top_product else None,
-            "quantity_sold": top_product[1] if top_product else 0
+            "name": top_product.name if top_product else None,
+            "quantity_sold": top_product.amount if top_product else 0
         },
         "top_seller": {
-            "name": top_seller[0] if top_seller else None,
-            "sales_count": top_seller[1] if top_seller else 0
+            "name": top_seller.name if top_seller else None,
+            "sales_count": top_seller.amount if top_seller else 0
         }
     }
 
@@ -280,7 +599,7 @@ def search_sales(
     sold_by: Optional[UUID] = None,
     db: Session = Depends(get_db)
 ):
-    query = db.query(models.Sale)
+    query = db.query(models.Sale).options(selectinload(models.Sale.products))
     if start_date:
         query = query.filter(models.Sale.sold_at >= start_date)
     if end_date:
@@ -292,12 +611,48 @@ def search_sales(
 
 @router.get("/summary", dependencies=[Depends(get_current_user)])
 def sales_summary(db: Session = Depends(get_db)):
-    total_sales = db.query(func.sum(models.Sale.total)).scalar() or 0
-    total_products = db.query(func.sum(models.ProductSold.quantity_sold)).scalar() or 0
-    total_tax = db.query(func.sum(models.Sale.taxes)).scalar() or 0
+    R = models.SalesDailyRollup
+    totals = db.query(
+        func.coalesce(func.sum(case((R.product_id == models.SALE_TOTALS_PRODUCT_ID, R.revenue), else_=0)), 0).label("total_sales"),
+        func.coalesce(func.sum(R.units_sold), 0).label("total_products"),
+        func.coalesce(func.sum(R.taxes), 0).label("total_tax")
+    ).one()
 
     return {
-        "total_sales": total_sales,
-        "total_products_sold": total_products,
-        "total_tax_collected": total_tax
-    }
\ No newline at end of file
+        "total_sales": totals.total_sales,
+        "total_products_sold": totals.total_products,
+        "total_tax_collected": totals.total_tax
+    }
+
+
+#Endpoint to export every sold line of a period, streamed as it is read
+
+@router.get("/export", dependencies=[Depends(get_current_user)])
+def export_sales(
+    date_from: Optional[date] = Query(None, alias="from", description="First day included (YYYY-MM-DD, UTC)"),
+    date_to: Optional[date] = Query(None, alias="to", description="Last day included (YYYY-MM-DD, UTC)"),
+    format: ExportFormat = ExportFormat.csv,
+    gzip: bool = False
+):
+    if date_from and date_to and date_to < date_from:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="'to' is before 'from'")
+    start = datetime.combine(date_from, time.min, tzinfo=UTC) if date_from else None
+    end = datetime.combine(date_to + timedelta(days=1), time.min, tzinfo=UTC) if date_to else None
+
+    filename = f"sales_{date_from or 'start'}_{date_to or 'now'}.{format.value}" + (".gz" if gzip else "")
+    media_type = "application/gzip" if gzip else ("text/csv" if format == ExportFormat.csv else "application/x-ndjson")
+    return StreamingResponse(
+        run_export(start, end, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+# Declared last so it doesn't capture /search, /summary, /export and the other fixed GET paths
+
+@router.get("/{sale_id}", response_model=SaleOut, dependencies=[Depends(get_current_user)])
+def get_sale(sale_id: UUID, db: Session = Depends(get_db)):
+    sale = db.query(models.Sale).options(selectinload(models.Sale.products)).filter(models.Sale.id == sale_id).first()
+    if not sale:
+        raise HTTPException(status_code=404, detail="Sale not found")
+    return sale
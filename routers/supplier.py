@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
 from sqlalchemy.orm import Session
+from sqlalchemy import select, delete
 from database.models import Supplier
-from schemas.suppliers_schema import SupplierCreate, SupplierOut, SupplierUpdate
+from database import models
+from schemas.suppliers_schema import SupplierCreate, SupplierOut, SupplierUpdate, SupplierPage
+from schemas.suppliers_schema import SupplierProductInput, SupplierProductOut, PurchaseOrders
 from database.get_db import get_db
-from typing import List
+from typing import List, Optional
 from pydantic import EmailStr
 from auth.auth import get_current_user
+from utils import cache, replenishment
+from uuid import UUID
+from utils.pagination import encode_cursor, decode_cursor
+from utils.search import search_suppliers as run_search
 router = APIRouter(prefix="/api/v1/suppliers", tags=["Suppliers"])
 
 @router.post("/", response_model=SupplierOut, dependencies=[Depends(get_current_user)])
@@ -13,12 +20,13 @@ def create_supplier(supplier: SupplierCreate, db: Session = Depends(get_db)):
     db_supplier = Supplier(**supplier.model_dump())
     db.add(db_supplier)
     db.commit()
+    cache.bump(cache.SUPPLIERS)
     db.refresh(db_supplier)
     return db_supplier
 
 @router.get("/", response_model=List[SupplierOut], dependencies=[Depends(get_current_user)])
-def list_suppliers(db: Session = Depends(get_db)):
-    return db.query(Supplier).all()
+def list_suppliers(request: Request, db: Session = Depends(get_db)):
+    return cache.cached_response(request, (cache.SUPPLIERS,), List[SupplierOut], lambda: db.query(Supplier).all())
 
 @router.delete("/{supplier_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(get_current_user)])
 def delete_supplier(supplier_id: int, db: Session = Depends(get_db)):
@@ -26,8 +34,10 @@ def delete_supplier(supplier_id: int, db: Session = Depends(get_db)):
     if not supplier:
         raise HTTPException(status_code=404, detail="Supplier not found")
 
+    db.execute(delete(models.SupplierProduct).where(models.SupplierProduct.supplier_id == supplier_id))
     db.delete(supplier)
     db.commit()
+    cache.bump(cache.SUPPLIERS)
     return {"detail": "Supplier deleted successfully"}
 
 @router.put("/{supplier_id}", response_model=SupplierOut, dependencies=[Depends(get_current_user)])
@@ -40,6 +50,7 @@ def update_supplier(supplier_id: int, updates: SupplierUpdate, db: Session = Dep
         setattr(supplier, field, value)
 
     db.commit()
+    cache.bump(cache.SUPPLIERS)
     db.refresh(supplier)
     return supplier
 
@@ -57,13 +68,107 @@ def get_suppliers(skip: int = 0, limit: int = 10, db: Session = Depends(get_db))
 
 @router.get("/filter", response_model=List[SupplierOut], dependencies=[Depends(get_current_user)])
 def filter_suppliers(status: str, db: Session = Depends(get_db)):
-    results = db.query(Supplier).filter(Supplier.status == status.lower()).all()
+    # Read in ix_suppliers_status order
+    results = db.query(Supplier).filter(Supplier.status == status.lower()).order_by(Supplier.id).all()
     return results
 
-@router.get("/search", response_model=List[SupplierOut], dependencies=[Depends(get_current_user)])
-def search_suppliers(query: str, db: Session = Depends(get_db)):
-    results = db.query(Supplier).filter(
-        Supplier.name.ilike(f"%{query}%") |
-        Supplier.contact_person.ilike(f"%{query}%")
-    ).all()
-    return results
+# Name or contact person containing `query`, best match first
+@router.get("/search", response_model=SupplierPage, dependencies=[Depends(get_current_user)])
+def search_suppliers(
+    request: Request,
+    query: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    def build():
+        after = None
+        if cursor:
+            score, supplier_id = decode_cursor(cursor, 2)
+            try:
+                after = (float(score), int(supplier_id))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        suppliers, last = run_search(db, query, limit, after)
+        return {"items": suppliers, "next_cursor": encode_cursor(last.score, last.id) if last else None}
+
+    return cache.cached_response(request, (cache.SUPPLIERS,), SupplierPage, build)
+
+#Endpoint to set what a supplier charges for a product and how long it takes to deliver
+
+@router.put("/{supplier_id}/products/{product_id}", response_model=SupplierProductOut, dependencies=[Depends(get_current_user)])
+def link_product(supplier_id: int, product_id: UUID, terms: SupplierProductInput, db: Session = Depends(get_db)):
+    if not db.get(Supplier, supplier_id):
+        raise HTTPException(status_code=404, detail="Supplier not found")
+    if not db.get(models.Product, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    link = db.get(models.SupplierProduct, (supplier_id, product_id))
+    if not link:
+        link = models.SupplierProduct(supplier_id=supplier_id, product_id=product_id)
+        db.add(link)
+    for field, value in terms.model_dump().items():
+        setattr(link, field, value)
+    db.commit()
+    cache.bump(cache.SUPPLIERS)
+    db.refresh(link)
+    return link
+
+@router.get("/{supplier_id}/products", response_model=List[SupplierProductOut], dependencies=[Depends(get_current_user)])
+def supplier_products(supplier_id: int, db: Session = Depends(get_db)):
+    return (
+        db.query(models.SupplierProduct)
+        .filter(models.SupplierProduct.supplier_id == supplier_id)
+        .order_by(models.SupplierProduct.product_id)
+        .all()
+    )
+
+@router.delete("/{supplier_id}/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(get_current_user)])
+def unlink_product(supplier_id: int, product_id: UUID, db: Session = Depends(get_db)):
+    link = db.get(models.SupplierProduct, (supplier_id, product_id))
+    if not link:
+        raise HTTPException(status_code=404, detail="Supplier doesn't deliver this product")
+    db.delete(link)
+    db.commit()
+    cache.bump(cache.SUPPLIERS)
+
+#Endpoint for draft purchase orders, one per supplier, from the latest replenishment run
+
+@router.get("/purchase_orders", response_model=PurchaseOrders, dependencies=[Depends(get_current_user)])
+def purchase_orders(request: Request, supplier_id: Optional[int] = None, db: Session = Depends(get_db)):
+    def build():
+        R, P = models.ReplenishmentSuggestion, models.Product
+        query = (
+            select(R, P.sku, P.product_name, Supplier.name, Supplier.email)
+            .join(P, P.id == R.product_id)
+            .join(Supplier, Supplier.id == R.supplier_id)
+            .order_by(R.supplier_id, P.sku)
+        )
+        if supplier_id is not None:
+            query = query.where(R.supplier_id == supplier_id)
+        orders, computed_at = {}, None
+        for suggestion, sku, product_name, supplier_name, supplier_email in db.execute(query):
+            computed_at = suggestion.computed_at
+            order = orders.setdefault(suggestion.supplier_id, {
+                "supplier_id": suggestion.supplier_id, "supplier_name": supplier_name, "supplier_email": supplier_email,
+                "lines": [], "total_units": 0, "total_cost": 0.0,
+            })
+            line_total = round(suggestion.order_quantity * suggestion.unit_cost, 2)
+            order["lines"].append({
+                "product_id": suggestion.product_id, "sku": sku, "product_name": product_name,
+                "quantity": suggestion.order_quantity, "unit_cost": suggestion.unit_cost, "line_total": line_total,
+                "on_hand": suggestion.on_hand, "reorder_point": suggestion.reorder_point,
+                "safety_stock": suggestion.safety_stock, "demand_per_day": suggestion.demand_per_day,
+            })
+            order["total_units"] += suggestion.order_quantity
+            order["total_cost"] = round(order["total_cost"] + line_total, 2)
+        return {"computed_at": computed_at, "orders": list(orders.values())}
+
+    # Every rebuild bumps the suppliers version
+    return cache.cached_response(request, (cache.SUPPLIERS,), PurchaseOrders, build)
+
+#Endpoint to rebuild the replenishment suggestions now instead of waiting for the next run
+
+@router.post("/purchase_orders/refresh", dependencies=[Depends(get_current_user)])
+def refresh_purchase_orders(db: Session = Depends(get_db)):
+    return {"suggestions": replenishment.rebuild(db)}
+
@@ -0,0 +1,57 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from uuid import UUID
+from datetime import date
+from enum import Enum
+
+
+class AbcClass(str, Enum):
+    A = "A"
+    B = "B"
+    C = "C"
+
+
+class ProductAnalyticsRow(BaseModel):
+    # Position by revenue over the range, 1 is the best seller
+    rank: int
+    product_id: UUID
+    sku: str
+    product_name: str
+    category: str
+    units: int
+    revenue: float
+    cost: float
+    gross_margin: float
+    margin_pct: Optional[float] = None
+    on_hand: int
+    sell_through: Optional[float] = None
+    stock_turnover: Optional[float] = None
+    days_of_cover: Optional[float] = None
+    abc: AbcClass
+    category_abc: AbcClass
+
+
+class CategoryAnalyticsRow(BaseModel):
+    category: str
+    products: int
+    units: int
+    revenue: float
+    gross_margin: float
+    margin_pct: Optional[float] = None
+    on_hand: int
+    sell_through: Optional[float] = None
+    stock_turnover: Optional[float] = None
+    days_of_cover: Optional[float] = None
+    abc: AbcClass
+
+
+class ProductAnalytics(BaseModel):
+    date_from: date
+    date_to: date
+    days: int
+    revenue: float
+    gross_margin: float
+    units: int
+    categories: List[CategoryAnalyticsRow]
+    items: List[ProductAnalyticsRow]
+    next_cursor: Optional[str] = None
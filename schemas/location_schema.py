@@ -0,0 +1,64 @@
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from uuid import UUID
+from datetime import datetime
+
+
+class LocationCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    address: str = Field(..., min_length=1)
+    # Defaults to the user creating the location
+    manager_id: Optional[UUID] = None
+    is_active: bool = True
+
+
+class LocationOut(BaseModel):
+    id: UUID
+    name: str
+    address: str
+    manager_id: UUID
+    is_active: bool
+    created_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
+class LocationUpdate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=100)
+    address: Optional[str] = Field(None, min_length=1)
+    manager_id: Optional[UUID] = None
+    is_active: Optional[bool] = None
+
+
+class LocationStockItem(BaseModel):
+    product_id: UUID
+    product_name: str
+    sku: str
+    quantity: int
+
+
+class LocationStockPage(BaseModel):
+    items: List[LocationStockItem]
+    next_cursor: Optional[str] = None
+
+
+class LocationStockTotals(BaseModel):
+    location_id: UUID
+    name: str
+    is_active: bool
+    # Products with a row at the location, and the units they add up to
+    products: int
+    units: int
+
+
+class TransferLine(BaseModel):
+    product_id: UUID
+    quantity: int = Field(..., gt=0)
+
+
+class TransferInput(BaseModel):
+    from_location_id: UUID
+    to_location_id: UUID
+    products: List[TransferLine] = Field(..., min_length=1, max_length=500)
+    note: Optional[str] = Field(None, max_length=500)
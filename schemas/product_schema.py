@@ -1,4 +1,4 @@
-from pydantic import EmailStr, BaseModel, Field
+from pydantic import EmailStr, BaseModel, Field, field_validator
 from typing import Optional, List
 from uuid import UUID, uuid4
 from datetime import datetime, UTC
@@ -51,6 +51,78 @@ class ProductOut(BaseModel):
     class Config:
         from_attributes = True
 
+class ProductPage(BaseModel):
+    items: List[ProductOut]
+    next_cursor: Optional[str] = None
+
+
+class ProductChanges(BaseModel):
+    items: List[ProductOut]
+    deleted: List[UUID]
+    next_cursor: str
+    has_more: bool
+
+
+class ProductSort(str, Enum):
+    created_at = "created_at"
+    product_name = "product_name"
+    selling_price = "selling_price"
+    quantity = "quantity"
+
+
+class SortOrder(str, Enum):
+    asc = "asc"
+    desc = "desc"
+
+
+class ProductImportRow(BaseModel):
+    """One row of a CSV/JSONL product import. In CSV, back_image is a `|` separated list."""
+    sku: str = Field(min_length=1)
+    product_name: str = Field(min_length=1)
+    selling_price: float = Field(ge=0)
+    buying_price: float = Field(ge=0)
+    quantity: int = Field(ge=0)
+    category: str = Field(min_length=1)
+    brand: str = ""
+    front_image: str = ""
+    back_image: List[str] = []
+    description: str = ""
+    unit: str = "pcs"
+    low_stock_alert: int = Field(10, ge=0)
+
+    @field_validator("back_image", mode="before")
+    @classmethod
+    def split_images(cls, value):
+        if isinstance(value, str):
+            return [name.strip() for name in value.split("|") if name.strip()]
+        return value
+
+
+class ImportConflict(str, Enum):
+    skip = "skip"
+    update = "update"
+
+
+class ImportFormat(str, Enum):
+    csv = "csv"
+    jsonl = "jsonl"
+
+
+class ImportRowError(BaseModel):
+    row: int
+    sku: Optional[str] = None
+    error: str
+
+
+class ImportReport(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: List[ImportRowError] = []
+    errors_truncated: bool = False
+
+
 class ProductUpdate(BaseModel):
     product_name: Optional[str] = None
     selling_price: Optional[float] = None
@@ -67,4 +139,74 @@ class ProductUpdate(BaseModel):
     last_modified: Optional[datetime] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class MovementKind(str, Enum):
+    sale = "sale"
+    refund = "refund"
+    receipt = "receipt"
+    adjustment = "adjustment"
+    transfer = "transfer"
+
+
+class ManualMovementKind(str, Enum):
+    # Sales and refunds are recorded by the sales endpoints
+    receipt = "receipt"
+    adjustment = "adjustment"
+
+
+class StockMovementInput(BaseModel):
+    kind: ManualMovementKind
+    # Signed: receipts add units, adjustments add or (negative) take them out
+    quantity: int
+    note: Optional[str] = Field(None, max_length=500)
+    # The shop or warehouse the units arrive at or leave, omitted for central stock
+    location_id: Optional[UUID] = None
+
+
+class StockMovementOut(BaseModel):
+    id: int
+    product_id: UUID
+    kind: MovementKind
+    quantity: int
+    sale_id: Optional[UUID] = None
+    created_by: Optional[UUID] = None
+    note: Optional[str] = None
+    location_id: Optional[UUID] = None
+    created_at: datetime
+
+    @field_validator("kind", mode="before")
+    @classmethod
+    def enum_value(cls, value):
+        # The ORM hands back MovementKindDB members
+        return getattr(value, "value", value)
+
+    class Config:
+        from_attributes = True
+
+
+class StockMovementPage(BaseModel):
+    items: List[StockMovementOut]
+    next_cursor: Optional[str] = None
+
+
+class LocationQuantity(BaseModel):
+    location_id: UUID
+    quantity: int
+
+
+class StockLevel(BaseModel):
+    product_id: UUID
+    on_hand: int
+    # products.quantity; behind on_hand for a sharded product until its next fold
+    quantity: int
+    slots: List[int]
+    ledger_total: int
+    # What each location holds of on_hand, the rest is central stock
+    locations: List[LocationQuantity] = []
+
+
+class StockSharding(BaseModel):
+    # Omitted: STOCK_SHARDS. 0 folds the stock back onto the product row
+    slots: Optional[int] = Field(None, ge=0, le=64)
@@ -42,6 +42,39 @@ class SaleInput(BaseModel):
     total_discount: float = Field(0.0, ge=0)
     currency: str = Field(default="USD", min_length=3, max_length=3)
     sold_at: Optional[datetime] = None
+    idempotency_key: Optional[str] = Field(None, min_length=1, max_length=64)
+    # Where the sale is made; its stock is then checked and taken at that location
+    location_id: Optional[UUID] = None
+
+
+class BatchSaleInput(SaleInput):
+    # Required here: a till replaying its queue must be able to retry the whole batch safely
+    idempotency_key: str = Field(..., min_length=1, max_length=64)
+
+
+class SaleBatch(BaseModel):
+    sales: List[BatchSaleInput] = Field(..., min_length=1, max_length=500)
+
+
+class BatchSaleStatus(str, Enum):
+    created = "created"
+    duplicate = "duplicate"
+    failed = "failed"
+
+
+class BatchSaleResult(BaseModel):
+    idempotency_key: str
+    status: BatchSaleStatus
+    sale_id: Optional[UUID] = None
+    total: Optional[float] = None
+    error: Optional[str] = None
+
+
+class SaleBatchResult(BaseModel):
+    created: int
+    duplicates: int
+    failed: int
+    results: List[BatchSaleResult]
 
 
 # SaleOut scheme
@@ -79,6 +112,7 @@ class SaleOut(BaseModel):
     sold_by: UUID4
     sold_at: datetime
     updated_at: Optional[datetime] = None
+    location_id: Optional[UUID] = None
 
     products: List[ProductSoldOut]
 
@@ -94,3 +128,13 @@ class SaleStatusEnum(CaseInsensitiveEnum):
 
 class SaleUpdateStatus(BaseModel):
     status: SaleStatusEnum
+
+
+class SalePage(BaseModel):
+    items: List[SaleOut]
+    next_cursor: Optional[str] = None
+
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    ndjson = "ndjson"
@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import List, Optional
 from datetime import datetime
+from uuid import UUID
 
 class SupplierCreate(BaseModel):
     name: str
@@ -19,14 +20,63 @@ class SupplierOut(SupplierCreate):
     class Config:
         from_attributes = True
 
+class SupplierPage(BaseModel):
+    items: List[SupplierOut]
+    next_cursor: Optional[str] = None
+
 class SupplierUpdate(BaseModel):
-    name: Optional[str]
-    contact_person: Optional[str]
-    email: Optional[EmailStr]
-    phone: Optional[str]
-    address: Optional[str]
-    company_website: Optional[str]
-    status: Optional[str]
+    name: Optional[str] = None
+    contact_person: Optional[str] = None
+    email: Optional[EmailStr] = None
+    phone: Optional[str] = None
+    address: Optional[str] = None
+    company_website: Optional[str] = None
+    status: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class SupplierProductInput(BaseModel):
+    lead_time_days: int = Field(7, ge=0, le=365)
+    pack_size: int = Field(1, ge=1)
+    unit_cost: float = Field(..., ge=0)
+    preferred: bool = False
+
+
+class SupplierProductOut(SupplierProductInput):
+    supplier_id: int
+    product_id: UUID
+    updated_at: Optional[datetime] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class PurchaseOrderLine(BaseModel):
+    product_id: UUID
+    sku: str
+    product_name: str
+    quantity: int
+    unit_cost: float
+    line_total: float
+    on_hand: int
+    reorder_point: int
+    safety_stock: int
+    demand_per_day: float
+
+
+class PurchaseOrder(BaseModel):
+    supplier_id: int
+    supplier_name: str
+    supplier_email: str
+    lines: List[PurchaseOrderLine]
+    total_units: int
+    total_cost: float
+
+
+class PurchaseOrders(BaseModel):
+    # When the suggestions were last rebuilt, None before the first run
+    computed_at: Optional[datetime] = None
+    orders: List[PurchaseOrder]
+
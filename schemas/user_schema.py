@@ -22,10 +22,12 @@ class RegisterInput(BaseModel):
     role: List[Roles]
 
 class UpdateInput(BaseModel):
-    names: Optional[str]
-    email: Optional[EmailStr]
-    phone: Optional[int]
-    password: Optional[str]
+    names: Optional[str] = None
+    email: Optional[EmailStr] = None
+    phone: Optional[int] = None
+    password: Optional[str] = None
+    # Only admins can change roles
+    role: Optional[List[Roles]] = None
 
 
 class Users(BaseModel):
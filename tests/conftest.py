@@ -0,0 +1,109 @@
+import os
+import sys
+import tempfile
+from uuid import uuid4
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+# Point the app at a throwaway SQLite file before anything imports database.database
+TEST_DB_DIR = tempfile.mkdtemp(prefix="inv-api-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DB_DIR, 'test.db')}"
+os.makedirs(os.path.join(ROOT, "static"), exist_ok=True)
+# Cheapest bcrypt cost, the tests only care that hashing goes through the right path
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from main import app
+from database import models
+from database.database import SessionLocal, engine, async_engine
+from auth.auth import get_current_user
+from utils import cache, analytics
+
+
+@pytest.fixture(autouse=True)
+def clean_tables():
+    yield
+    with engine.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    # Rows went away behind the routes' back, so cached responses would be stale
+    cache.backend.clear()
+    analytics.results.clear()
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def user(db):
+    u = models.User(
+        id=uuid4(),
+        names="Test Seller",
+        email=f"{uuid4().hex[:8]}@example.com",
+        phone=int(uuid4().int % 10**9),
+        password="not-a-real-hash",
+        role="admin"
+    )
+    db.add(u)
+    db.commit()
+    return u
+
+
+@pytest.fixture
+def client(user):
+    user_id = str(user.id)
+    app.dependency_overrides[get_current_user] = lambda: user_id
+    with TestClient(app) as c:
+        yield c
+    app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def count_queries():
+    statements = []
+
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # async routes run on async_engine, everything else on the sync engine
+    engines = (engine, async_engine.sync_engine)
+    for e in engines:
+        event.listen(e, "before_cursor_execute", before_execute)
+    yield statements
+    for e in engines:
+        event.remove(e, "before_cursor_execute", before_execute)
+
+
+def make_product(db, owner, **overrides):
+    values = dict(
+        id=uuid4(),
+        created_by=owner.id,
+        product_name="Widget",
+        selling_price=10.0,
+        buying_price=6.0,
+        quantity=100,
+        category="General",
+        brand="Acme",
+        front_image="front.jpg",
+        back_image=[],
+        description="A widget",
+        sku=f"SKU-{uuid4().hex[:10]}",
+        unit="pcs",
+        low_stock_alert=10
+    )
+    values.update(overrides)
+    product = models.Product(**values)
+    db.add(product)
+    db.commit()
+    return product
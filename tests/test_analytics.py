@@ -0,0 +1,83 @@
+from datetime import date
+
+import pytest
+
+from conftest import make_product
+from test_sales import sale_payload
+from utils.analytics import abc_classes
+
+
+def sell(client, *lines, day="2025-06-10"):
+    payload = {**sale_payload(*lines), "sold_at": f"{day}T10:00:00Z"}
+    response = client.post("/api/v1/sales/sell_product", json=payload)
+    assert response.status_code == 200
+    return response.json()["sale_id"]
+
+
+RANGE = {"date_from": "2025-06-01", "date_to": "2025-06-30"}
+
+
+def test_product_figures_are_quantity_weighted(client, db, user):
+    lamp = make_product(db, user, product_name="Lamp", category="Lighting", selling_price=50.0, buying_price=30.0, quantity=20)
+    bulb = make_product(db, user, product_name="Bulb", category="Lighting", selling_price=2.0, buying_price=1.0, quantity=100)
+    mug = make_product(db, user, product_name="Mug", category="Kitchen", selling_price=8.0, buying_price=5.0, quantity=10)
+
+    sell(client, (lamp, 4), (bulb, 10))
+    sell(client, (mug, 5), day="2025-06-20")
+    refunded = sell(client, (lamp, 6))
+    client.put(f"/api/v1/sales/sales/{refunded}", json={"status": "refunded"})
+    sell(client, (lamp, 1), day="2025-07-02")  # outside the range
+
+    report = client.get("/api/v1/analytics/products", params=RANGE).json()
+    assert report["days"] == 30
+    assert (report["revenue"], report["gross_margin"], report["units"]) == (260.0, 105.0, 19)
+
+    rows = {row["product_name"]: row for row in report["items"]}
+    assert [row["product_name"] for row in report["items"]] == ["Lamp", "Mug", "Bulb"]
+    assert rows["Lamp"]["units"] == 4 and rows["Lamp"]["gross_margin"] == 80.0
+    assert rows["Lamp"]["margin_pct"] == pytest.approx(0.4)
+    # 4 sold, 15 left after the sale outside the range
+    assert rows["Lamp"]["sell_through"] == pytest.approx(4 / 19)
+    assert rows["Lamp"]["days_of_cover"] == pytest.approx(15 / (4 / 30))
+    assert rows["Mug"]["stock_turnover"] == pytest.approx(25 / (5 * 5.0))
+    # Lamp and Mug start under 80% of the revenue, Bulb at 92%
+    assert [rows[name]["abc"] for name in ("Lamp", "Mug", "Bulb")] == ["A", "A", "B"]
+    assert [rows[name]["category_abc"] for name in ("Lamp", "Bulb", "Mug")] == ["A", "B", "A"]
+
+    categories = {row["category"]: row for row in report["categories"]}
+    assert categories["Lighting"]["revenue"] == 220.0 and categories["Lighting"]["abc"] == "A"
+    assert categories["Kitchen"]["products"] == 1 and categories["Kitchen"]["abc"] == "B"
+
+
+def test_analytics_are_cached_per_range_and_paged(client, db, user):
+    products = [make_product(db, user, selling_price=10.0 + i) for i in range(5)]
+    for product in products:
+        sell(client, (product, 1))
+
+    first = client.get("/api/v1/analytics/products", params={**RANGE, "limit": 2}).json()
+    assert [row["rank"] for row in first["items"]] == [1, 2]
+    rest = client.get("/api/v1/analytics/products", params={**RANGE, "cursor": first["next_cursor"]}).json()
+    assert [row["rank"] for row in rest["items"]] == [3, 4, 5] and rest["next_cursor"] is None
+
+    # Served from the cache until it expires, another range is computed afresh
+    sell(client, (products[0], 3))
+    assert client.get("/api/v1/analytics/products", params=RANGE).json()["units"] == 5
+    wider = client.get("/api/v1/analytics/products", params={**RANGE, "date_from": "2025-05-01"}).json()
+    assert wider["units"] == 8
+
+    assert client.get("/api/v1/analytics/products", params={"date_from": "2025-07-01", "date_to": "2025-06-01"}).status_code == 400
+
+
+def test_sharded_products_count_their_live_stock(client, db, user):
+    lamp = make_product(db, user, quantity=10)
+    client.put(f"/api/v1/products/{lamp.id}/stock/shards", json={"slots": 2})
+    sell(client, (lamp, 4))
+
+    # The product row still says 10 until the shards are folded
+    row = client.get("/api/v1/analytics/products", params=RANGE).json()["items"][0]
+    assert row["on_hand"] == 6 and row["sell_through"] == pytest.approx(0.4)
+
+
+def test_abc_classes_follow_cumulative_revenue():
+    assert abc_classes([10, 70, 0, 15, 5]) == ["B", "A", "C", "A", "C"]
+    assert abc_classes([0, 0]) == ["C", "C"]
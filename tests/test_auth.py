@@ -0,0 +1,117 @@
+from datetime import timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from auth import auth
+from utils import auth_cache, functions
+from utils.auth_cache import TTLCache
+
+
+@pytest.fixture
+def signing(monkeypatch):
+    monkeypatch.setattr(functions, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(functions, "ALGORITHM", "HS256")
+    auth_cache.tokens.clear()
+    auth_cache.users.clear()
+    yield
+    auth_cache.tokens.clear()
+    auth_cache.users.clear()
+
+
+@pytest.fixture
+def decodes(monkeypatch, signing):
+    calls = []
+    real_decode = auth.decode_access_payload
+
+    def counting_decode(token):
+        calls.append(token)
+        return real_decode(token)
+
+    monkeypatch.setattr(auth, "decode_access_payload", counting_decode)
+    return calls
+
+
+def test_verified_token_is_reused(decodes, db, user, count_queries):
+    user_id = str(user.id)
+    token = functions.generate_access_token({"sub": user_id})
+    count_queries.clear()
+    assert [auth.get_current_user(token, db) for _ in range(5)] == [user_id] * 5
+    assert len(decodes) == 1
+    # the user is looked up once, with the signature check
+    assert len(count_queries) == 1
+
+    with pytest.raises(HTTPException):
+        auth.get_current_user(token + "x", db)
+    with pytest.raises(HTTPException):
+        auth.get_current_user(token + "x", db)
+    # bad tokens are never cached
+    assert len(decodes) == 3
+
+
+def test_revoking_a_user_drops_their_tokens(decodes, db, user):
+    token = functions.generate_access_token({"sub": str(user.id)})
+    auth.get_current_user(token, db)
+    auth_cache.revoke_user(user.id)
+    auth.get_current_user(token, db)
+    assert len(decodes) == 2
+
+    # A removed user's still valid token is refused once they're revoked
+    db.delete(user)
+    db.commit()
+    auth.get_current_user(token, db)
+    auth_cache.revoke_user(user.id)
+    with pytest.raises(HTTPException) as refused:
+        auth.get_current_user(token, db)
+    assert refused.value.status_code == 401
+
+
+def test_cache_honours_token_expiry():
+    now = [1000.0]
+    cache = TTLCache(maxsize=10, ttl=300, clock=lambda: now[0])
+    cache.set("a", "user-1", expires_at=1010)
+    assert cache.get("a") == "user-1"
+    now[0] = 1010
+    assert cache.get("a") is None
+
+    cache.set("b", "user-2", expires_at=5000)
+    now[0] = 1310.5
+    assert cache.get("b") is None  # capped by the cache TTL
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_is_bounded_lru():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_token_is_rejected(signing, db):
+    token = functions.generate_access_token({"sub": "user-1"}, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(HTTPException):
+        auth.get_current_user(token, db)
+
+
+def test_unknown_user_is_rejected(signing, db):
+    for sub in ("user-1", "00000000-0000-4000-8000-000000000001"):
+        with pytest.raises(HTTPException) as refused:
+            auth.get_current_user(functions.generate_access_token({"sub": sub}), db)
+        assert refused.value.status_code == 401
+
+
+def test_user_record_is_cached(signing, db, user, count_queries):
+    user_id = str(user.id)
+    count_queries.clear()
+    first = auth.get_current_user_record(user_id, db)
+    second = auth.get_current_user_record(user_id, db)
+    assert first == second
+    assert first.roles == ["admin"]
+    assert len(count_queries) == 1
+
+    auth_cache.revoke_user(user_id)
+    auth.get_current_user_record(user_id, db)
+    assert len(count_queries) == 2
@@ -0,0 +1,42 @@
+import random
+
+from benchmarks import load, seed
+
+
+def test_seeded_sales_agree_with_their_rollup(client):
+    counts = seed.seed(users_count=2, products_count=40, sales_count=300, days=10)
+    assert counts["sales"] == 300 and counts["products"] == 40
+
+    summary = client.get("/api/v1/sales/report/summary").json()
+    assert summary["total_sales"] == 300
+    assert summary["pending_sales"] + summary["completed_sales"] + summary["refunded_sales"] == 300
+
+    page = client.get("/api/v1/sales/", params={"limit": 5}).json()
+    assert len(page["items"]) == 5 and page["next_cursor"]
+
+    # Every product opens its ledger with its stock
+    product = client.get("/api/v1/get_products", params={"limit": 1}).json()["items"][0]
+    level = client.get(f"/api/v1/products/{product['id']}/stock").json()
+    assert level["ledger_total"] == level["quantity"] == product["quantity"]
+    assert counts["inventory_movements"] <= 40
+
+
+def test_seed_data_is_reproducible():
+    owners = [{"id": seed.new_id(random.Random(0))}]
+    first = seed.products(random.Random(7), 20, owners)
+    again = seed.products(random.Random(7), 20, owners)
+
+    assert [p["id"] for p in first] == [p["id"] for p in again]
+    assert [p["product_name"] for p in first] == [p["product_name"] for p in again]
+
+
+def test_compare_flags_regressions():
+    meta = {"database": "sqlite", "rows": {}, "concurrency": 4, "requests": 10, "bcrypt_rounds": 4}
+    before = {"meta": meta, "scenarios": {"login": {"rps": 100, "p50_ms": 10, "p95_ms": 20, "p99_ms": 30, "queries_per_request": 1}}}
+    after = {"meta": meta, "scenarios": {"login": {"rps": 50, "p50_ms": 10, "p95_ms": 19.5, "p99_ms": 40, "queries_per_request": 1}}}
+
+    lines = {line.split()[1]: line for line in load.compare(before, after)}
+
+    assert lines["rps"].endswith("WORSE")
+    assert lines["p95_ms"].endswith("%)")  # under 5%, not flagged
+    assert lines["p99_ms"].endswith("WORSE")
@@ -0,0 +1,61 @@
+from database import models
+from conftest import make_product
+from test_sales import sale_payload
+
+
+def supplier_payload(email):
+    return {"name": "Acme Supply", "contact_person": "Ann", "email": email, "phone": "0788000000",
+            "address": "Kigali", "status": "active"}
+
+
+def test_catalog_revalidates_without_touching_the_db(client, db, user, count_queries):
+    product = make_product(db, user, product_name="Kettle")
+    first = client.get("/api/v1/get_products")
+    etag = first.headers["etag"]
+    assert first.json()["items"][0]["product_name"] == "Kettle"
+
+    count_queries.clear()
+    again = client.get("/api/v1/get_products", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    cached = client.get("/api/v1/get_products")
+    assert cached.content == first.content
+    assert count_queries == []
+
+    # Another page or filter is its own representation
+    assert client.get("/api/v1/get_products", params={"limit": 1}).headers["etag"] != etag
+
+    assert client.put(f"/api/v1/edit_product/{product.id}", json={"product_name": "Kettle XL"}).status_code == 200
+    changed = client.get("/api/v1/get_products", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["items"][0]["product_name"] == "Kettle XL"
+
+
+def test_sales_invalidate_cached_product(client, db, user):
+    product = make_product(db, user, quantity=5)
+    url = f"/api/v1/api/v1/product/{product.id}"
+    etag = client.get(url).headers["etag"]
+
+    assert client.post("/api/v1/sales/sell_product", json=sale_payload((product, 2))).status_code == 200
+    fresh = client.get(url, headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.json()["quantity"] == 3
+    assert client.get(f"/api/v1/api/v1/product/{models.SALE_TOTALS_PRODUCT_ID}").status_code == 404
+
+
+def test_supplier_writes_bump_the_supplier_list(client, count_queries):
+    etag = client.get("/api/v1/suppliers/").headers["etag"]
+    created = client.post("/api/v1/suppliers/", json=supplier_payload("ann@acme.example")).json()
+
+    listed = client.get("/api/v1/suppliers/", headers={"If-None-Match": etag})
+    assert listed.status_code == 200
+    assert [s["email"] for s in listed.json()] == ["ann@acme.example"]
+
+    etag = listed.headers["etag"]
+    assert client.put(f"/api/v1/suppliers/{created['id']}", json={"status": "inactive"}).status_code == 200
+    updated = client.get("/api/v1/suppliers/", headers={"If-None-Match": etag})
+    assert updated.json()[0]["status"] == "inactive"
+
+    count_queries.clear()
+    assert client.get("/api/v1/suppliers/", headers={"If-None-Match": updated.headers["etag"]}).status_code == 304
+    assert count_queries == []
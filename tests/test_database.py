@@ -0,0 +1,59 @@
+import pytest
+
+from database.database import to_async_url, async_database_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("sqlite:///./inv-api.db", "sqlite+aiosqlite:///./inv-api.db"),
+    ("postgresql://inv:secret@db/inv", "postgresql+asyncpg://inv:secret@db/inv"),
+    ("postgresql+psycopg2://inv:secret@db/inv", "postgresql+asyncpg://inv:secret@db/inv"),
+    ("mysql+pymysql://inv:secret@db/inv", "mysql+aiomysql://inv:secret@db/inv"),
+])
+def test_to_async_url_picks_async_driver(url, expected):
+    assert to_async_url(url).render_as_string(hide_password=False) == expected
+
+
+def test_async_database_url_prefers_explicit_setting(monkeypatch):
+    monkeypatch.setenv("ASYNC_DATABASE_URL", "postgresql+asyncpg://other/inv")
+    assert async_database_url() == "postgresql+asyncpg://other/inv"
+
+    monkeypatch.delenv("ASYNC_DATABASE_URL")
+    assert async_database_url().drivername == "sqlite+aiosqlite"
+
+
+def test_pool_settings_have_dialect_defaults_and_env_overrides(monkeypatch):
+    from database.database import pool_settings
+
+    assert pool_settings("postgresql://db/inv")["pool_pre_ping"] is True
+    assert pool_settings("mysql+pymysql://db/inv")["pool_recycle"] < 28800
+
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    settings = pool_settings("postgresql://db/inv")
+    assert settings["pool_size"] == 3
+    assert settings["pool_pre_ping"] is False
+
+
+def test_engine_options_leave_memory_sqlite_alone():
+    from database.database import engine_options
+
+    assert "poolclass" not in engine_options("sqlite://")
+    assert "pool_size" in engine_options("sqlite:////tmp/inv.db")
+
+
+def test_sqlite_connections_get_pragmas():
+    from sqlalchemy import text
+    from database.database import engine
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -64000
+
+
+def test_pool_stats_endpoint(client):
+    stats = client.get("/api/v1/pool_stats").json()
+    assert stats["sync"]["pool"] == "InstrumentedQueuePool"
+    assert {"checked_out", "overflow", "checkouts", "wait_seconds_max"} <= set(stats["sync"])
+    assert stats["sync"]["checkouts"] > 0
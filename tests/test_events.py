@@ -0,0 +1,105 @@
+import asyncio
+from uuid import uuid4
+
+from conftest import make_product
+from test_sales import sale_payload, batch_sale
+from utils.events import EventBus, bus
+from routers.events import event_stream
+
+
+def stock(product_id, quantity, delta):
+    return {"type": "stock", "product_id": product_id, "sku": "SKU", "quantity": quantity, "delta": delta}
+
+
+def test_rapid_updates_to_one_product_are_coalesced():
+    async def scenario():
+        local = EventBus()
+        subscriber = local.subscribe(max_pending=10)
+        first, second = uuid4(), uuid4()
+        local.publish([stock(first, 9, -1), stock(second, 4, -1)])
+        local.publish([stock(first, 7, -2), {"type": "sale", "sale_id": 1, "status": "completed"}])
+        local.publish([{"type": "sale", "sale_id": 1, "status": "refunded"}])
+        return await subscriber.next_batch(1)
+
+    batch = asyncio.run(scenario())
+    assert [e["type"] for e in batch] == ["stock", "stock", "sale"]
+    assert batch[0]["quantity"] == 7 and batch[0]["delta"] == -3
+    assert batch[2]["status"] == "refunded"
+
+
+def test_a_client_that_falls_behind_is_told_to_resync():
+    async def scenario():
+        local = EventBus()
+        subscriber = local.subscribe(max_pending=3)
+        local.publish([stock(uuid4(), 1, -1) for _ in range(5)])
+        first = await subscriber.next_batch(1)
+        local.publish([stock(uuid4(), 1, -1)])
+        return first, await subscriber.next_batch(1)
+
+    first, second = asyncio.run(scenario())
+    # The backlog was dropped, only what arrived after the overflow is still sent
+    assert first[0] == {"type": "resync"}
+    assert len(first) == 2
+    assert second[0]["type"] == "stock"
+
+
+def test_committed_sales_publish_stock_low_stock_and_sale_events(client, db, user):
+    product = make_product(db, user, quantity=12, low_stock_alert=10)
+
+    async def scenario():
+        subscriber = bus.subscribe()
+        try:
+            response = await asyncio.to_thread(client.post, "/api/v1/sales/sell_product", json=sale_payload((product, 3)))
+            failed = await asyncio.to_thread(client.post, "/api/v1/sales/sell_product", json=sale_payload((product, 50)))
+            return response, failed, await subscriber.next_batch(1)
+        finally:
+            bus.unsubscribe(subscriber)
+
+    response, failed, batch = asyncio.run(scenario())
+    assert response.status_code == 200 and failed.status_code == 400
+    by_type = {e["type"]: e for e in batch}
+    assert set(by_type) == {"stock", "low_stock", "sale"}
+    assert by_type["stock"]["quantity"] == 9 and by_type["stock"]["delta"] == -3
+    assert by_type["low_stock"]["quantity"] == 9
+    assert str(by_type["sale"]["sale_id"]) == response.json()["sale_id"]
+
+
+def test_batch_and_edit_publish_stock_levels(client, db, user):
+    product = make_product(db, user, quantity=20)
+
+    async def scenario():
+        subscriber = bus.subscribe()
+        try:
+            batch = {"sales": [batch_sale(f"till-{i}", (product, 2)) for i in range(3)]}
+            await asyncio.to_thread(client.post, "/api/v1/sales/batch", json=batch)
+            sold = await subscriber.next_batch(1)
+            await asyncio.to_thread(client.put, f"/api/v1/edit_product/{product.id}", json={"quantity": 50})
+            return sold, await subscriber.next_batch(1)
+        finally:
+            bus.unsubscribe(subscriber)
+
+    sold, edited = asyncio.run(scenario())
+    assert [e["quantity"] for e in sold if e["type"] == "stock"] == [14]
+    assert len([e for e in sold if e["type"] == "sale"]) == 3
+    assert edited == [{"type": "stock", "product_id": product.id, "sku": product.sku, "quantity": 50, "delta": 36}]
+
+
+def test_stream_formats_events_and_unsubscribes():
+    class Request:
+        def __init__(self):
+            self.checks = 0
+
+        async def is_disconnected(self):
+            self.checks += 1
+            return self.checks > 2
+
+    async def scenario():
+        subscriber = bus.subscribe()
+        bus.publish([{"type": "sale", "sale_id": uuid4(), "status": "completed"}])
+        chunks = [chunk async for chunk in event_stream(Request(), subscriber)]
+        return chunks, bus.subscriber_count
+
+    chunks, remaining = asyncio.run(scenario())
+    assert chunks[0].startswith("retry:")
+    assert chunks[1].startswith("event: sale\ndata: {")
+    assert remaining == 0
@@ -0,0 +1,139 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.orm import Session
+
+from conftest import ROOT, make_product
+from database.database import engine
+from database import models
+
+
+def plan(sql, **params):
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).all()
+    return " | ".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize("sql, params, index", [
+    # GET /sales/ page
+    ("SELECT id FROM sales ORDER BY sold_at DESC, id DESC LIMIT 50", {}, "ix_sales_sold_at"),
+    # report/search date range
+    ("SELECT id FROM sales WHERE sold_at >= :start AND sold_at < :end", {"start": "2025-01-01", "end": "2025-02-01"}, "ix_sales_sold_at"),
+    # get_sales_by_seller
+    ("SELECT id FROM sales WHERE sold_by = :seller ORDER BY sold_at", {"seller": "ab"}, "ix_sales_sold_by"),
+    ("SELECT id FROM sales WHERE status = :status AND sold_at >= :start", {"status": "pending", "start": "2025-01-01"}, "ix_sales_status"),
+    # line items of a page of sales
+    ("SELECT id FROM products_sold WHERE sale_id IN (:a, :b)", {"a": "a", "b": "b"}, "ix_products_sold_sale_id"),
+    ("SELECT sale_id FROM products_sold WHERE product_id = :p", {"p": "a"}, "ix_products_sold_product_id"),
+    ("SELECT id FROM products WHERE category = :c ORDER BY id LIMIT 20", {"c": "General"}, "ix_products_category"),
+    ("SELECT id FROM products WHERE quantity <= low_stock_alert ORDER BY category, id LIMIT 20", {}, "ix_products_low_stock"),
+    ("SELECT id FROM suppliers WHERE status = :s ORDER BY id", {"s": "active"}, "ix_suppliers_status"),
+    ("SELECT id FROM products WHERE stock_slots > 0 ORDER BY category, id LIMIT 20", {}, "ix_products_sharded"),
+    # GET /products/low_stock past the first page
+    ("SELECT id FROM products WHERE quantity <= low_stock_alert AND (category, id) > (:c, :i) ORDER BY category, id LIMIT 20",
+     {"c": "A", "i": "x"}, "ix_products_low_stock"),
+])
+def test_hot_queries_use_indexes(sql, params, index):
+    assert index in plan(sql, **params)
+
+
+def test_migration_adds_indexes_to_existing_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'existing.db'}"
+    existing = create_engine(url)
+    models.Base.metadata.create_all(existing)
+    with Session(existing) as session:
+        owner = models.User(names="Owner", email="owner@example.com", phone=1, password="x", role="admin")
+        session.add(owner)
+        session.flush()
+        stocked = make_product(session, owner, quantity=7).id
+        make_product(session, owner, quantity=0)
+    # Simulate a database created before the indexes were declared
+    with existing.begin() as conn:
+        for name in ("ix_sales_sold_at", "ix_sales_sold_by", "ix_products_sold_sale_id", "ix_products_low_stock"):
+            conn.execute(text(f"DROP INDEX {name}"))
+        # and before sales had an idempotency key
+        conn.execute(text("DROP INDEX ux_sales_idempotency_key"))
+        conn.execute(text("ALTER TABLE sales DROP COLUMN idempotency_key"))
+        # and before the catalog had a search index
+        conn.execute(text("DROP TABLE products_fts"))
+        conn.execute(text("DROP TABLE suppliers_fts"))
+        conn.execute(text("DROP INDEX ix_suppliers_status"))
+
+    env = dict(os.environ, DATABASE_URL=url)
+    result = subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
+
+    # create_all made the ledger empty, the products still get their opening balance
+    with existing.connect() as conn:
+        ledger = conn.execute(select(models.InventoryMovement.product_id, models.InventoryMovement.kind,
+                                     models.InventoryMovement.quantity, models.InventoryMovement.note)).all()
+    assert ledger == [(stocked, models.MovementKindDB.ADJUSTMENT, 7, "Opening balance")]
+
+    inspector = inspect(existing)
+    assert {"ix_sales_sold_at", "ix_sales_sold_by", "ix_sales_status"} <= {i["name"] for i in inspector.get_indexes("sales")}
+    assert "ix_products_sold_sale_id" in {i["name"] for i in inspector.get_indexes("products_sold")}
+    assert "ix_products_low_stock" in {i["name"] for i in inspector.get_indexes("products")}
+    assert {"products_fts", "suppliers_fts"} <= set(inspector.get_table_names())
+    assert "ix_suppliers_status" in {i["name"] for i in inspector.get_indexes("suppliers")}
+    assert "idempotency_key" in {c["name"] for c in inspector.get_columns("sales")}
+    assert "ux_sales_idempotency_key" in {i["name"] for i in inspector.get_indexes("sales")}
+
+
+def alembic(url, *args):
+    env = dict(os.environ, DATABASE_URL=url)
+    result = subprocess.run([sys.executable, "-m", "alembic", *args], cwd=ROOT, env=env, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr + result.stdout
+
+
+def rollup_rows(conn):
+    table = models.SalesDailyRollup.__table__
+    rows = conn.execute(select(*[c for c in table.c if c.name != "id"])).all()
+    return sorted(tuple(str(value) for value in row) for row in rows)
+
+
+def test_migrations_build_the_whole_schema_from_an_empty_database(tmp_path):
+    from datetime import datetime, UTC
+    from utils import rollup
+
+    url = f"sqlite:///{tmp_path / 'empty.db'}"
+    alembic(url, "upgrade", "head")
+    # `alembic check` runs compare_metadata with env.py's hooks, nothing may be missing
+    alembic(url, "check")
+
+    # The rollup revision's backfill agrees with rollup.rebuild
+    migrated = create_engine(url)
+    with Session(migrated) as session:
+        user = models.User(names="Seller", email="seller@example.com", phone=1, password="x", role="admin")
+        session.add(user)
+        session.flush()
+        lamp, desk = make_product(session, user), make_product(session, user)
+        for status, lines, day in [
+            ("completed", [(lamp, 2, 0.0), (lamp, 1, 1.5), (desk, 1, 0.0)], 1),
+            ("completed", [(lamp, 3, 0.0)], 1),
+            ("refunded", [(desk, 4, 2.0)], 2),
+        ]:
+            session.add(models.Sale(
+                buyer_name="Buyer", buyer_phone="1", payment_method=models.PaymentMethodDB.CASH,
+                subtotal=10.0, taxes=1.0, total=11.0, status=models.SaleStatusDB(status), sold_by=user.id,
+                sold_at=datetime(2026, 3, day, 23, 30, tzinfo=UTC),
+                products=[
+                    models.ProductSold(product_id=p.id, product_name=p.product_name, quantity_sold=q,
+                                       selling_price=p.selling_price, cost_price=p.buying_price, discount=d)
+                    for p, q, d in lines
+                ],
+            ))
+        session.commit()
+        rollup.rebuild(session)
+        expected = rollup_rows(session.connection())
+    assert len(expected) == 5
+
+    alembic(url, "downgrade", "-1")
+    alembic(url, "upgrade", "head")
+    with migrated.connect() as conn:
+        assert rollup_rows(conn) == expected
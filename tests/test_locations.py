@@ -0,0 +1,122 @@
+from database import models
+from conftest import make_product
+from test_sales import sale_payload, batch_sale
+
+
+def make_location(client, name="Main Street"):
+    response = client.post("/api/v1/locations/", json={"name": name, "address": f"1 {name}"})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+def receive(client, product, location_id, quantity):
+    response = client.post(
+        f"/api/v1/products/{product.id}/stock/movements",
+        json={"kind": "receipt", "quantity": quantity, "location_id": location_id}
+    )
+    assert response.status_code == 200
+
+
+def shelf(client, location_id):
+    items = client.get(f"/api/v1/locations/{location_id}/stock").json()["items"]
+    return {item["product_id"]: item["quantity"] for item in items}
+
+
+def test_sales_at_a_location_use_its_own_stock(client, db, user):
+    product = make_product(db, user, quantity=50)
+    shop = make_location(client)
+    receive(client, product, shop, 5)
+
+    at_shop = {**sale_payload((product, 4)), "location_id": shop}
+    sale_id = client.post("/api/v1/sales/sell_product", json=at_shop).json()["sale_id"]
+    # The company has plenty, the shop doesn't
+    response = client.post("/api/v1/sales/sell_product", json=at_shop)
+    assert response.status_code == 400 and "Available: 1" in response.json()["detail"]
+
+    db.expire_all()
+    assert product.quantity == 51
+    assert shelf(client, shop) == {str(product.id): 1}
+    assert [s["id"] for s in client.get("/api/v1/sales/", params={"location_id": shop}).json()["items"]] == [sale_id]
+
+    # A refund goes back on the shop's shelf
+    client.put(f"/api/v1/sales/sales/{sale_id}", json={"status": "refunded"})
+    assert shelf(client, shop) == {str(product.id): 5}
+    level = client.get(f"/api/v1/products/{product.id}/stock").json()
+    assert level["quantity"] == 55 and level["locations"] == [{"location_id": shop, "quantity": 5}]
+
+
+def test_closed_and_unknown_locations_are_refused(client, db, user):
+    product = make_product(db, user)
+    shop = make_location(client)
+    client.put(f"/api/v1/locations/{shop}", json={"is_active": False})
+
+    response = client.post("/api/v1/sales/sell_product", json={**sale_payload((product, 1)), "location_id": shop})
+    assert response.status_code == 400
+    response = client.post("/api/v1/sales/sell_product", json={**sale_payload((product, 1)), "location_id": str(product.id)})
+    assert response.status_code == 404
+
+    batch = {"sales": [{**batch_sale("closed", (product, 1)), "location_id": shop}, batch_sale("central", (product, 1))]}
+    results = client.post("/api/v1/sales/batch", json=batch).json()["results"]
+    assert [r["status"] for r in results] == ["failed", "created"]
+
+
+def test_batch_sales_draw_on_each_location(client, db, user):
+    product = make_product(db, user, quantity=0)
+    north, south = make_location(client, "North"), make_location(client, "South")
+    receive(client, product, north, 3)
+    receive(client, product, south, 2)
+
+    sales = [
+        {**batch_sale("n1", (product, 2)), "location_id": north},
+        {**batch_sale("s1", (product, 2)), "location_id": south},
+        {**batch_sale("n2", (product, 2)), "location_id": north},
+        {**batch_sale("n3", (product, 1)), "location_id": north},
+    ]
+    results = client.post("/api/v1/sales/batch", json={"sales": sales}).json()["results"]
+    assert [r["status"] for r in results] == ["created", "created", "failed", "created"]
+    assert shelf(client, north) == {str(product.id): 0} and shelf(client, south) == {str(product.id): 0}
+    db.expire_all()
+    assert product.quantity == 0
+
+
+def test_transfers_move_every_line_or_none(client, db, user):
+    first, second = make_product(db, user, quantity=0), make_product(db, user, quantity=0)
+    warehouse, shop = make_location(client, "Warehouse"), make_location(client, "Shop")
+    receive(client, first, warehouse, 10)
+    receive(client, second, warehouse, 1)
+
+    transfer = {"from_location_id": warehouse, "to_location_id": shop, "note": "Weekly run"}
+    too_many = {**transfer, "products": [{"product_id": str(first.id), "quantity": 4}, {"product_id": str(second.id), "quantity": 2}]}
+    assert client.post("/api/v1/locations/transfers", json=too_many).status_code == 400
+    assert shelf(client, shop) == {}
+
+    ok = {**transfer, "products": [{"product_id": str(first.id), "quantity": 4}, {"product_id": str(second.id), "quantity": 1}]}
+    moved = client.post("/api/v1/locations/transfers", json=ok).json()
+    assert sorted((m["location_id"] == shop, m["quantity"]) for m in moved) == [(False, -4), (False, -1), (True, 1), (True, 4)]
+    assert {m["kind"] for m in moved} == {"transfer"}
+
+    assert shelf(client, warehouse) == {str(first.id): 6, str(second.id): 0}
+    assert shelf(client, shop) == {str(first.id): 4, str(second.id): 1}
+    totals = {t["name"]: (t["products"], t["units"]) for t in client.get("/api/v1/locations/stock").json()}
+    assert totals == {"Warehouse": (2, 6), "Shop": (2, 5)}
+
+    # Company-wide stock and the ledger total don't move
+    db.expire_all()
+    assert first.quantity == 10
+    assert client.get(f"/api/v1/products/{first.id}/stock").json()["ledger_total"] == 10
+
+
+def test_location_stock_is_paged_by_product(client, db, user):
+    shop = make_location(client)
+    products = [make_product(db, user, quantity=0) for _ in range(5)]
+    for product in products:
+        receive(client, product, shop, 1)
+
+    seen, cursor = [], None
+    while True:
+        page = client.get(f"/api/v1/locations/{shop}/stock", params={"limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+        seen += [item["product_id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(str(p.id) for p in products) and len(seen) == 5
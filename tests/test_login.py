@@ -0,0 +1,110 @@
+import asyncio
+import threading
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from main import app
+from database import models
+from utils import functions
+from utils.passwords import PasswordHasher
+
+
+@pytest.fixture
+def anonymous_client(monkeypatch):
+    monkeypatch.setattr(functions, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(functions, "ALGORITHM", "HS256")
+    with TestClient(app) as c:
+        yield c
+
+
+def register(client, email):
+    payload = {"names": "Shift Lead", "email": email, "phone": uuid4().int % 10**9, "password": "s3cret-pass", "role": ["admin"]}
+    return client.post("/api/v1/register", json=payload)
+
+
+def test_register_and_login(anonymous_client, db):
+    assert register(anonymous_client, "lead@example.com").status_code == 200
+    stored = db.query(models.User).filter_by(email="lead@example.com").one().password
+    assert stored.startswith("$2b$04$")
+
+    response = anonymous_client.post("/api/v1/login", data={"username": "lead@example.com", "password": "s3cret-pass"})
+    assert response.status_code == 200
+    token = response.json()["access_token"]
+    assert anonymous_client.get("/api/v1/ping", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+
+    wrong = anonymous_client.post("/api/v1/login", data={"username": "lead@example.com", "password": "nope"})
+    assert wrong.status_code == 401
+
+
+def login(client, email, password="s3cret-pass"):
+    response = client.post("/api/v1/login", data={"username": email, "password": password})
+    assert response.status_code == 200
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def test_changed_and_removed_users_are_revoked_at_once(anonymous_client, db):
+    register(anonymous_client, "lead@example.com")
+    clerk_id = register(anonymous_client, "clerk@example.com").json()["user_data"]["user_id"]
+    lead = login(anonymous_client, "lead@example.com")
+    db.query(models.User).filter_by(email="clerk@example.com").update({"role": "user"})
+    db.commit()
+    clerk = login(anonymous_client, "clerk@example.com")
+    assert anonymous_client.get("/api/v1/ping", headers=clerk).status_code == 200
+
+    # Clerks change their own details but not roles, and can't remove anyone
+    url = f"/api/v1/users/{clerk_id}"
+    assert anonymous_client.put(url, json={"role": ["admin"]}, headers=clerk).status_code == 403
+    assert anonymous_client.put(url, json={"password": "n3w-pass"}, headers=clerk).status_code == 200
+    login(anonymous_client, "clerk@example.com", "n3w-pass")
+    assert anonymous_client.delete(url, headers=clerk).status_code == 403
+
+    # The clerk's token was verified and cached above, it still stops working straight away
+    assert anonymous_client.delete(url, headers=lead).status_code == 200
+    assert anonymous_client.get("/api/v1/ping", headers=clerk).status_code == 401
+    assert anonymous_client.put(url, json={"names": "Gone"}, headers=clerk).status_code == 401
+
+
+def test_login_rehashes_when_cost_changes(anonymous_client, db, user):
+    user.password = functions.pwd_context.hash("s3cret-pass", rounds=5)
+    db.commit()
+
+    response = anonymous_client.post("/api/v1/login", data={"username": user.email, "password": "s3cret-pass"})
+    assert response.status_code == 200
+    db.refresh(user)
+    assert user.password.startswith("$2b$04$")
+    assert functions.pwd_context.verify("s3cret-pass", user.password)
+
+
+def test_hasher_refuses_work_beyond_its_queue():
+    release = threading.Event()
+    hasher = PasswordHasher(workers=1, queue_size=2, timeout=5)
+
+    async def storm():
+        running = [asyncio.create_task(hasher.run(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        with pytest.raises(HTTPException) as refused:
+            await hasher.run(release.wait)
+        release.set()
+        await asyncio.gather(*running)
+        return refused.value
+
+    refused = asyncio.run(storm())
+    assert refused.status_code == 503
+    assert "Retry-After" in refused.headers
+    assert hasher.stats()["rejected"] == 1
+    assert hasher.stats()["in_flight"] == 0
+    hasher.shutdown()
+
+
+def test_hasher_times_out_slow_work():
+    release = threading.Event()
+    hasher = PasswordHasher(workers=1, queue_size=4, timeout=0.05)
+
+    with pytest.raises(HTTPException) as timed_out:
+        asyncio.run(hasher.run(release.wait))
+    assert timed_out.value.status_code == 503
+    release.set()
+    hasher.shutdown()
@@ -0,0 +1,45 @@
+import logging
+
+from utils import metrics
+
+
+def test_responses_report_their_sql(client, count_queries):
+    res = client.get("/api/v1/suppliers/by-email", params={"email": "nobody@example.com"})
+
+    assert res.status_code == 404
+    assert int(res.headers["x-db-queries"]) == len(count_queries) > 0
+    assert float(res.headers["x-db-time-ms"]) >= 0
+    assert res.headers["x-db-slow-queries"] == "0"
+
+
+def test_metrics_are_labelled_by_route_template(client):
+    client.get("/api/v1/suppliers/by-email", params={"email": "nobody@example.com"})
+    client.get("/no/such/page")
+
+    body = client.get("/metrics").text
+
+    assert 'http_requests_total{method="GET",route="/api/v1/suppliers/by-email",status="404"}' in body
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in body
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/api/v1/suppliers/by-email",le="+Inf"}' in body
+    assert "# TYPE http_request_db_queries histogram" in body
+    assert 'db_pool_checkouts_total{engine="sync"}' in body
+
+
+def test_slow_statements_are_counted_and_logged(client, monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0)
+
+    with caplog.at_level(logging.WARNING, logger="sql.slow"):
+        res = client.get("/api/v1/suppliers/by-email", params={"email": "nobody@example.com"})
+
+    assert int(res.headers["x-db-slow-queries"]) == int(res.headers["x-db-queries"])
+    assert any("FROM suppliers" in r.getMessage() for r in caplog.records)
+    assert 'db_slow_queries_total{route="/api/v1/suppliers/by-email"}' in client.get("/metrics").text
+
+
+def test_metrics_token_is_enforced_when_set(client, monkeypatch):
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "s3cret")
+
+    assert client.get("/metrics").status_code == 401
+    res = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
@@ -0,0 +1,373 @@
+import hashlib
+import json
+import os
+from uuid import UUID, uuid4
+
+import pytest
+from sqlalchemy.orm import Session
+
+from database import models
+from utils import cache
+from conftest import make_product
+
+
+def product_form(sku):
+    return {
+        "product_name": "Desk Lamp",
+        "selling_price": "25.0",
+        "buying_price": "12.5",
+        "quantity": "8",
+        "category": "Lighting",
+        "brand": "Lumo",
+        "description": "LED desk lamp",
+        "sku": sku,
+        "unit": "pcs",
+        "low_stock_alert": "2",
+    }
+
+
+def product_files():
+    return [
+        ("front_image", ("front.jpg", b"front-bytes", "image/jpeg")),
+        ("back_images", ("back.jpg", b"back-bytes", "image/jpeg")),
+    ]
+
+
+def test_register_product_through_async_session(client, db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    response = client.post("/api/v1/register_product", data=product_form("LAMP-1"), files=product_files())
+    assert response.status_code == 200
+    assert response.json()["data"] == {"name": "Desk Lamp", "sku": "LAMP-1"}
+
+    product = db.query(models.Product).filter_by(sku="LAMP-1").one()
+    assert product.quantity == 8
+
+    duplicate = client.post("/api/v1/register_product", data=product_form("LAMP-1"), files=product_files())
+    assert duplicate.status_code == 400
+
+
+def test_identical_uploads_share_one_file(client, db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert client.post("/api/v1/register_product", data=product_form("LAMP-1"), files=product_files()).status_code == 200
+    assert client.post("/api/v1/register_product", data=product_form("LAMP-2"), files=product_files()).status_code == 200
+
+    first, second = db.query(models.Product).order_by(models.Product.sku).all()
+    assert first.front_image == second.front_image == hashlib.sha256(b"front-bytes").hexdigest() + ".jpg"
+    stored = sorted(os.listdir(tmp_path / "static" / "images"))
+    assert stored == sorted([first.front_image, *first.back_image])
+    assert db.get(models.StoredImage, first.front_image).ref_count == 2
+
+    response = client.get(f"/static/images/{first.front_image}")
+    assert response.content == b"front-bytes"
+    assert "immutable" in response.headers["cache-control"]
+
+    # The file goes away with its last reference only
+    assert client.delete(f"/api/v1/delete_product/{first.id}").status_code == 200
+    assert (tmp_path / "static" / "images" / second.front_image).exists()
+    assert client.delete(f"/api/v1/delete_product/{second.id}").status_code == 200
+    assert os.listdir(tmp_path / "static" / "images") == []
+    db.expire_all()
+    assert db.query(models.StoredImage).count() == 0
+
+
+def test_images_outlive_a_failed_commit(client, db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert client.post("/api/v1/register_product", data=product_form("LAMP-1"), files=product_files()).status_code == 200
+    product = db.query(models.Product).filter_by(sku="LAMP-1").one()
+    stored = sorted(os.listdir(tmp_path / "static" / "images"))
+
+    def fail(session):
+        raise RuntimeError("commit failed")
+
+    # The async session commits through the sync one, so both routes fail here
+    with monkeypatch.context() as m:
+        m.setattr(Session, "commit", fail)
+        with pytest.raises(RuntimeError):
+            client.delete(f"/api/v1/delete_product/{product.id}")
+        with pytest.raises(RuntimeError):
+            client.put(f"/api/v1/edit_product/{product.id}", json={"front_image": None, "back_image": []})
+    assert sorted(os.listdir(tmp_path / "static" / "images")) == stored
+
+    db.expire_all()
+    assert db.get(models.StoredImage, product.front_image).ref_count == 1
+    assert client.delete(f"/api/v1/delete_product/{product.id}").status_code == 200
+    assert os.listdir(tmp_path / "static" / "images") == []
+
+
+def test_delete_product_through_async_session(client, db, user):
+    product = make_product(db, user)
+    product_id = product.id
+
+    assert client.delete(f"/api/v1/delete_product/{product_id}").status_code == 200
+    db.expire_all()
+    assert db.get(models.Product, product_id) is None
+    assert client.delete(f"/api/v1/delete_product/{uuid4()}").status_code == 404
+
+
+def walk_catalog(client, **params):
+    items, cursor = [], None
+    while True:
+        query = dict(params, limit=2)
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get("/api/v1/get_products", params=query)
+        assert response.status_code == 200
+        page = response.json()
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return items
+
+
+def test_catalog_pages_filters_and_sorts(client, db, user, count_queries):
+    make_product(db, user, product_name="Kettle", category="Kitchen", selling_price=30.0, back_image=["k.jpg"])
+    make_product(db, user, product_name="Toaster", category="Kitchen", selling_price=45.0, quantity=0)
+    make_product(db, user, product_name="Mug", category="Kitchen", selling_price=5.0)
+    make_product(db, user, product_name="Pan", category="Kitchen", selling_price=30.0)
+    make_product(db, user, product_name="Drill", category="Tools", selling_price=80.0)
+
+    by_price = walk_catalog(client, category="Kitchen", sort="selling_price", order="asc")
+    assert [p["product_name"] for p in by_price][:1] == ["Mug"]
+    assert [p["selling_price"] for p in by_price] == [5.0, 30.0, 30.0, 45.0]
+    assert next(p for p in by_price if p["product_name"] == "Kettle")["back_image"] == ["k.jpg"]
+
+    in_stock = walk_catalog(client, category="Kitchen", in_stock=True, min_price=10, sort="product_name", order="desc")
+    assert [p["product_name"] for p in in_stock] == ["Pan", "Kettle"]
+
+    everything = walk_catalog(client)
+    assert len({p["id"] for p in everything}) == 5
+
+    # one query per page when it isn't served from the response cache
+    cache.bump(cache.PRODUCTS)
+    count_queries.clear()
+    client.get("/api/v1/get_products", params={"limit": 2})
+    assert len(count_queries) == 1
+
+
+def test_catalog_cursor_is_tied_to_its_sort(client, db, user):
+    for _ in range(3):
+        make_product(db, user)
+    cursor = client.get("/api/v1/get_products", params={"limit": 1, "sort": "quantity"}).json()["next_cursor"]
+    response = client.get("/api/v1/get_products", params={"cursor": cursor, "sort": "product_name"})
+    assert response.status_code == 400
+
+
+def test_edit_product_stores_back_images_as_json(client, db, user):
+    product = make_product(db, user)
+    response = client.put(f"/api/v1/edit_product/{product.id}", json={"back_image": ["a.jpg", "b.jpg"]})
+    assert response.status_code == 200
+    db.refresh(product)
+    assert product.back_image == ["a.jpg", "b.jpg"]
+
+
+IMPORT_HEADER = "sku,product_name,selling_price,buying_price,quantity,category,brand,back_image\n"
+
+
+def import_file(client, content, filename="products.csv", **params):
+    files = {"file": (filename, content.encode(), "text/plain")}
+    return client.post("/api/v1/products/import", params=params, files=files)
+
+
+def test_import_csv_reports_bad_rows_and_skips_existing(client, db, user, count_queries):
+    make_product(db, user, sku="OLD-1", quantity=3)
+    rows = [f"IMP-{i},Item {i},{i + 1}.5,1.0,{i},Bulk,Acme,a.jpg|b.jpg" for i in range(7)]
+    content = IMPORT_HEADER + "\n".join(rows + [
+        "OLD-1,Renamed,9,5,50,Bulk,Acme,",
+        "BAD-1,Broken,not-a-price,1,1,Bulk,Acme,",
+        ",No sku,1,1,1,Bulk,Acme,",
+    ]) + "\n"
+
+    count_queries.clear()
+    response = import_file(client, content, batch_size=4)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["inserted"], report["updated"], report["skipped"], report["failed"]) == (7, 0, 1, 2)
+    assert sorted(e["row"] for e in report["errors"]) == [10, 11]
+    assert report["errors"][0]["sku"] == "BAD-1"
+    # one SKU lookup per batch; the last batch only holds invalid rows and never reaches the database
+    assert len([s for s in count_queries if s.lstrip().upper().startswith("SELECT")]) == 2
+
+    product = db.query(models.Product).filter_by(sku="IMP-3").one()
+    assert (product.selling_price, product.quantity, product.back_image) == (4.5, 3, ["a.jpg", "b.jpg"])
+    assert db.query(models.Product).filter_by(sku="OLD-1").one().quantity == 3
+
+
+def test_import_jsonl_updates_existing_skus(client, db, user):
+    make_product(db, user, sku="JS-1", quantity=3)
+    lines = [
+        '{"sku": "JS-1", "product_name": "Updated", "selling_price": 12, "buying_price": 7, "quantity": 40, "category": "Bulk"}',
+        '',
+        'not json',
+        '{"sku": "JS-2", "product_name": "New", "selling_price": 5, "buying_price": 2, "quantity": 1, "category": "Bulk", "back_image": ["x.jpg"]}',
+        '{"sku": "JS-2", "product_name": "New again", "selling_price": 6, "buying_price": 2, "quantity": 2, "category": "Bulk"}',
+    ]
+    response = import_file(client, "\n".join(lines), filename="products.jsonl", on_conflict="update")
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["inserted"], report["updated"], report["failed"]) == (1, 2, 1)
+    assert report["errors"][0]["row"] == 3
+
+    db.expire_all()
+    updated = db.query(models.Product).filter_by(sku="JS-1").one()
+    assert (updated.product_name, updated.quantity) == ("Updated", 40)
+    assert db.query(models.Product).filter_by(sku="JS-2").one().product_name == "New again"
+
+
+def sync(client, cursor=None):
+    params = {"since": cursor} if cursor else {}
+    response = client.get("/api/v1/products/changes", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_imported_products_share_uploaded_images(client, db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert client.post("/api/v1/register_product", data=product_form("LAMP-1"), files=product_files()).status_code == 200
+    uploaded = db.query(models.Product).filter_by(sku="LAMP-1").one()
+    front = tmp_path / "static" / "images" / uploaded.front_image
+
+    row = {"sku": "IMP-1", "product_name": "Lamp", "selling_price": 5, "buying_price": 2,
+           "quantity": 1, "category": "Lighting", "front_image": uploaded.front_image}
+    assert import_file(client, json.dumps(row) + "\n", "rows.jsonl").json()["inserted"] == 1
+    assert db.get(models.StoredImage, uploaded.front_image).ref_count == 2
+
+    # The import still uses the front image, the upload's back image goes
+    assert client.delete(f"/api/v1/delete_product/{uploaded.id}").status_code == 200
+    assert os.listdir(tmp_path / "static" / "images") == [front.name]
+
+    row["front_image"] = ""
+    report = import_file(client, json.dumps(row) + "\n", "rows.jsonl", on_conflict="update").json()
+    assert report["updated"] == 1
+    assert not front.exists()
+    db.expire_all()
+    assert db.query(models.StoredImage).count() == 0
+
+
+def test_change_feed_returns_only_what_changed(client, db, user, monkeypatch, tmp_path):
+    from utils import changes
+    from test_sales import sale_payload
+
+    monkeypatch.setattr(changes, "SETTLE_SECONDS", 0)
+    monkeypatch.chdir(tmp_path)
+    for sku in ("FEED-1", "FEED-2", "FEED-3"):
+        client.post("/api/v1/register_product", data=product_form(sku), files=product_files())
+
+    full = sync(client)
+    assert sorted(p["sku"] for p in full["items"]) == ["FEED-1", "FEED-2", "FEED-3"]
+    cursor = full["next_cursor"]
+    assert sync(client, cursor)["items"] == []
+
+    by_sku = {p["sku"]: p for p in full["items"]}
+    client.put(f"/api/v1/edit_product/{by_sku['FEED-1']['id']}", json={"selling_price": 19.5})
+    sold = db.get(models.Product, UUID(by_sku["FEED-2"]["id"]))
+    client.post("/api/v1/sales/sell_product", json=sale_payload((sold, 3)))
+    client.delete(f"/api/v1/delete_product/{by_sku['FEED-3']['id']}")
+
+    delta = sync(client, cursor)
+    assert {p["sku"]: (p["selling_price"], p["quantity"]) for p in delta["items"]} == {
+        "FEED-1": (19.5, 8), "FEED-2": (25.0, 5)
+    }
+    assert delta["deleted"] == [by_sku["FEED-3"]["id"]]
+    caught_up = sync(client, delta["next_cursor"])
+    assert (caught_up["items"], caught_up["deleted"]) == ([], [])
+
+    # one row per product, however often it changes
+    assert db.query(models.ProductChange).count() == 3
+
+
+def test_change_feed_holds_cursor_behind_unsettled_gaps(client, db, user, monkeypatch):
+    from utils import changes
+
+    first, second = make_product(db, user), make_product(db, user)
+    changes.record_changes(db, [first.id, second.id])
+    db.commit()
+    monkeypatch.setattr(changes, "SETTLE_SECONDS", 0)
+    cursor = sync(client)["next_cursor"]
+
+    monkeypatch.setattr(changes, "SETTLE_SECONDS", 3600)
+    # Right after the cursor, nothing can be missing in between: the cursor moves on
+    changes.record_changes(db, [second.id])
+    db.commit()
+    page = sync(client, cursor)
+    assert [p["id"] for p in page["items"]] == [str(second.id)]
+    assert page["next_cursor"] != cursor
+    cursor = page["next_cursor"]
+
+    # Rewriting first twice leaves a gap, which could be a write that hasn't committed yet
+    changes.record_changes(db, [first.id])
+    changes.record_changes(db, [first.id])
+    db.commit()
+    held = sync(client, cursor)
+    assert [p["id"] for p in held["items"]] == [str(first.id)]
+    assert (held["next_cursor"], held["has_more"]) == (cursor, False)
+
+    # Once the change is older than the settle window the cursor passes it
+    monkeypatch.setattr(changes, "SETTLE_SECONDS", 0)
+    settled = sync(client, cursor)
+    assert settled["next_cursor"] != cursor
+    assert sync(client, settled["next_cursor"])["items"] == []
+
+
+def test_change_feed_rejects_bad_cursor(client):
+    assert client.get("/api/v1/products/changes", params={"since": "nope"}).status_code == 400
+
+
+def test_low_stock_lists_only_products_at_their_alert(client, db, user, count_queries):
+    low = [make_product(db, user, category=category, quantity=quantity, low_stock_alert=5)
+           for category, quantity in [("Drinks", 5), ("Drinks", 0), ("Snacks", 2), ("Toys", 1)]]
+    make_product(db, user, category="Drinks", quantity=6, low_stock_alert=5)
+
+    first = client.get("/api/v1/products/low_stock", params={"limit": 2}).json()
+    second = client.get("/api/v1/products/low_stock", params={"limit": 2, "cursor": first["next_cursor"]}).json()
+    listed = [p["id"] for p in first["items"] + second["items"]]
+    assert sorted(listed) == sorted(str(p.id) for p in low)
+    assert second["next_cursor"] is None
+
+    count_queries.clear()
+    filtered = client.get("/api/v1/products/low_stock", params=[("category", "Drinks"), ("category", "Snacks")]).json()
+    assert {p["category"] for p in filtered["items"]} == {"Drinks", "Snacks"}
+    assert len(filtered["items"]) == 3
+    assert len(count_queries) == 1
+
+    assert client.get("/api/v1/products/low_stock", params={"cursor": "bad"}).status_code == 400
+
+
+def search(client, q, **params):
+    response = client.get("/api/v1/products/search", params={"q": q, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_search_ranks_prefix_matches_and_follows_writes(client, db, user):
+    zero = make_product(db, user, product_name="Coca Cola Zéro", brand="Coca", category="Drinks", sku="SKU-COKE-001")
+    nut = make_product(db, user, product_name="Kola Nut", brand="Acme", category="Snacks", description="Pairs well with cola")
+    make_product(db, user, product_name="Garden Hose", brand="Acme", category="Garden")
+
+    assert [p["id"] for p in search(client, "cola")["items"]] == [str(zero.id), str(nut.id)]
+    assert [p["id"] for p in search(client, "coc zer")["items"]] == [str(zero.id)]
+    assert [p["id"] for p in search(client, "sku-cok")["items"]] == [str(zero.id)]
+    assert search(client, "?!")["items"] == []
+
+    # Writes are indexed straight away, bulk ones included
+    assert client.put(f"/api/v1/edit_product/{nut.id}", json={"product_name": "Hazelnut Mix", "description": "Nuts"}).status_code == 200
+    assert [p["id"] for p in search(client, "cola")["items"]] == [str(zero.id)]
+    assert [p["id"] for p in search(client, "hazel")["items"]] == [str(nut.id)]
+    import_file(client, "sku,product_name,selling_price,buying_price,quantity,category\nIMP-1,Cola Cubes,1,0.5,10,Sweets\n")
+    assert [p["sku"] for p in search(client, "cubes")["items"]] == ["IMP-1"]
+    assert client.delete(f"/api/v1/delete_product/{zero.id}").status_code == 200
+    assert search(client, "coc")["items"] == []
+
+
+def test_search_pages_through_every_match(client, db, user):
+    products = [make_product(db, user, product_name=f"Blue Widget {i}") for i in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        page = search(client, "blue wid", limit=2, **({"cursor": cursor} if cursor else {}))
+        seen += [p["id"] for p in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(str(p.id) for p in products)
+    assert client.get("/api/v1/products/search", params={"q": "blue", "cursor": "bad"}).status_code == 400
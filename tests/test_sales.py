@@ -0,0 +1,406 @@
+from datetime import datetime, timedelta, UTC
+from uuid import uuid4
+import csv, gzip, io, json
+
+from database import models
+from conftest import make_product
+from schemas.sales_schema import ExportFormat
+from utils import sales_export
+
+
+def make_sale(db, seller, product, sold_at, quantity=1, status=models.SaleStatusDB.COMPLETED):
+    sale = models.Sale(
+        id=uuid4(),
+        buyer_name="Buyer",
+        buyer_phone="0788000000",
+        payment_method=models.PaymentMethodDB.CASH,
+        subtotal=product.selling_price * quantity,
+        total=product.selling_price * quantity,
+        status=status,
+        sold_by=seller.id,
+        sold_at=sold_at,
+        products=[
+            models.ProductSold(
+                product_id=product.id,
+                product_name=product.product_name,
+                quantity_sold=quantity,
+                selling_price=product.selling_price,
+                cost_price=product.buying_price
+            )
+        ]
+    )
+    db.add(sale)
+    db.commit()
+    return sale
+
+
+def test_list_sales_is_keyset_paginated(client, db, user, count_queries):
+    product = make_product(db, user)
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    for i in range(7):
+        make_sale(db, user, product, start + timedelta(hours=i))
+
+    seen = []
+    cursor = None
+    while True:
+        count_queries.clear()
+        params = {"limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/v1/sales/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        # one query for the page of sales, one batched query for their line items
+        assert len(count_queries) == 2
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == 7
+    assert len({s["id"] for s in seen}) == 7
+    sold_at = [s["sold_at"] for s in seen]
+    assert sold_at == sorted(sold_at, reverse=True)
+    assert all(len(s["products"]) == 1 for s in seen)
+
+
+def test_cursor_walk_returns_every_sale_with_tied_timestamps(client, db, user):
+    product = make_product(db, user)
+    same_time = datetime(2025, 2, 1, 12, tzinfo=UTC)
+    expected = {str(make_sale(db, user, product, same_time).id) for _ in range(5)}
+    expected.add(str(make_sale(db, user, product, same_time - timedelta(days=1)).id))
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/v1/sales/", params=params).json()
+        seen.extend(s["id"] for s in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert len(seen) == len(expected)
+    assert set(seen) == expected
+
+
+def test_list_sales_rejects_bad_cursor(client):
+    response = client.get("/api/v1/sales/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+
+
+def sale_payload(*lines):
+    return {
+        "buyer_name": "Walk-in",
+        "buyer_phone": "0788000000",
+        "payment_method": "cash",
+        "products": [
+            {"product_id": str(p.id), "quantity_sold": qty, "selling_price": p.selling_price}
+            for p, qty in lines
+        ]
+    }
+
+
+def test_sell_product_uses_constant_round_trips(client, db, user, count_queries):
+    products = [make_product(db, user) for _ in range(6)]
+    warmup = sale_payload((products[0], 1))
+    small = sale_payload((products[0], 1), (products[1], 1))
+    large = sale_payload((products[0], 1), *[(p, 2) for p in products[2:]])
+
+    assert client.post("/api/v1/sales/sell_product", json=warmup).status_code == 200
+
+    count_queries.clear()
+    response = client.post("/api/v1/sales/sell_product", json=small)
+    assert response.status_code == 200
+    single = len(count_queries)
+    # basket read, sale, line items, stock update and rollup upsert are all counted
+    assert single >= 5
+
+    count_queries.clear()
+    response = client.post("/api/v1/sales/sell_product", json=large)
+    assert response.status_code == 200
+    assert len(count_queries) == single
+
+    db.expire_all()
+    assert [p.quantity for p in products] == [97, 99] + [98] * 4
+
+
+def test_sell_product_counts_repeated_lines_against_stock(client, db, user):
+    product = make_product(db, user, quantity=3)
+    response = client.post("/api/v1/sales/sell_product", json=sale_payload((product, 2), (product, 2)))
+    assert response.status_code == 400
+    db.refresh(product)
+    assert product.quantity == 3
+
+
+def test_concurrent_checkouts_do_not_oversell(db, user):
+    import asyncio
+    import httpx
+    from main import app
+    from auth.auth import get_current_user
+
+    first = make_product(db, user, quantity=40)
+    second = make_product(db, user, quantity=40)
+    payloads = [
+        sale_payload(*([(first, 1), (second, 1)] if i % 2 else [(second, 1), (first, 1)]))
+        for i in range(60)
+    ]
+    user_id = str(user.id)
+    app.dependency_overrides[get_current_user] = lambda: user_id
+
+    # One event loop like a uvicorn worker; checkouts interleave at every await
+    async def storm():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*[
+                client.post("/api/v1/sales/sell_product", json=payload) for payload in payloads
+            ])
+        return [r.status_code for r in responses]
+
+    try:
+        codes = asyncio.run(storm())
+    finally:
+        app.dependency_overrides.clear()
+
+    assert codes.count(200) == 40
+    assert set(codes) <= {200, 400, 409}
+
+    db.expire_all()
+    assert first.quantity == 0 and second.quantity == 0
+    for product in (first, second):
+        sold = sum(line.quantity_sold for line in db.query(models.ProductSold).filter_by(product_id=product.id))
+        assert sold == 40
+
+
+def test_summary_reads_rollup_and_follows_status_changes(client, db, user):
+    from utils import rollup
+
+    cheap = make_product(db, user, selling_price=10.0, buying_price=6.0)
+    pricey = make_product(db, user, product_name="Gadget", selling_price=50.0, buying_price=30.0)
+
+    first = sale_payload((cheap, 3), (pricey, 1))
+    first["sold_at"] = "2025-03-01T09:00:00Z"
+    first["taxes"] = 4.0
+    second = sale_payload((cheap, 1))
+    second["sold_at"] = "2025-03-02T18:30:00Z"
+
+    first_id = client.post("/api/v1/sales/sell_product", json=first).json()["sale_id"]
+    assert client.post("/api/v1/sales/sell_product", json=second).status_code == 200
+    response = client.put(f"/api/v1/sales/sales/{first_id}", json={"status": "refunded"})
+    assert response.status_code == 200
+
+    summary = client.get("/api/v1/sales/report/summary").json()
+    assert summary["total_sales"] == 2
+    assert summary["total_revenue"] == 94.0
+    assert summary["total_taxes"] == 4.0
+    assert summary["total_profit"] == (3 * 4.0 + 20.0) + 4.0
+    assert summary["completed_sales"] == 1
+    assert summary["refunded_sales"] == 1
+    assert summary["pending_sales"] == 0
+    assert summary["most_sold_product"] == {"name": "Widget", "quantity_sold": 4}
+    assert summary["top_seller"] == {"name": "Test Seller", "sales_count": 2}
+
+    day_two = client.get("/api/v1/sales/report/summary", params={"date_from": "2025-03-02", "date_to": "2025-03-02"}).json()
+    assert day_two["total_sales"] == 1
+    assert day_two["total_revenue"] == 10.0
+
+    totals = client.get("/api/v1/sales/summary").json()
+    assert totals == {"total_sales": 94.0, "total_products_sold": 5, "total_tax_collected": 4.0}
+
+    # Rebuilding from raw sales gives the same report as the incremental path
+    rollup.rebuild(db)
+    assert client.get("/api/v1/sales/report/summary").json() == summary
+
+
+def test_search_sales_batches_line_items(client, db, user, count_queries):
+    product = make_product(db, user)
+    start = datetime(2025, 1, 1, tzinfo=UTC)
+    for i in range(5):
+        make_sale(db, user, product, start + timedelta(hours=i))
+
+    count_queries.clear()
+    response = client.get("/api/v1/sales/search")
+    assert response.status_code == 200
+    assert len(response.json()) == 5
+    assert all(len(s["products"]) == 1 for s in response.json())
+    assert len(count_queries) == 2
+
+
+def test_rollup_keeps_one_row_per_key(client, db, user):
+    product = make_product(db, user)
+    for _ in range(4):
+        payload = sale_payload((product, 1))
+        payload["sold_at"] = "2025-04-01T10:00:00Z"
+        assert client.post("/api/v1/sales/sell_product", json=payload).status_code == 200
+
+    rows = db.query(models.SalesDailyRollup).all()
+    assert len(rows) == 2
+    by_product = {r.product_id: r for r in rows}
+    assert by_product[models.SALE_TOTALS_PRODUCT_ID].sales_count == 4
+    assert by_product[product.id].units_sold == 4
+
+
+def test_rebuild_normalizes_legacy_enum_names(client, db, user):
+    from sqlalchemy import text
+    from utils import rollup
+
+    product = make_product(db, user)
+    sale = make_sale(db, user, product, datetime(2025, 5, 1, tzinfo=UTC), quantity=2)
+    # What sell_product used to write before enum members were stored
+    db.execute(text("UPDATE sales SET status = 'COMPLETED', payment_method = 'CASH' WHERE id = :id"), {"id": sale.id.hex})
+    db.commit()
+
+    rollup.rebuild(db)
+
+    summary = client.get("/api/v1/sales/report/summary").json()
+    assert summary["completed_sales"] == 1
+    assert summary["most_sold_product"]["quantity_sold"] == 2
+    assert client.get(f"/api/v1/sales/{sale.id}").json()["payment_method"] == "cash"
+
+
+def test_sales_document_includes_products(client, db, user):
+    product = make_product(db, user)
+    sale = make_sale(db, user, product, datetime(2025, 6, 1, tzinfo=UTC), quantity=3)
+
+    response = client.get(f"/api/v1/sales/{sale.id}/document")
+    assert response.status_code == 200
+    document = response.json()
+    assert document["sale"]["id"] == str(sale.id)
+    assert [(p["product_name"], p["quantity_sold"]) for p in document["products"]] == [("Widget", 3)]
+    assert client.get(f"/api/v1/sales/{uuid4()}/document").status_code == 404
+
+
+def batch_sale(key, *lines):
+    payload = sale_payload(*lines)
+    payload["idempotency_key"] = key
+    payload["sold_at"] = "2025-05-01T09:00:00Z"
+    return payload
+
+
+def test_sales_batch_reports_each_sale_and_is_idempotent(client, db, user):
+    apples = make_product(db, user, quantity=5)
+    pears = make_product(db, user, quantity=2)
+    batch = {"sales": [
+        batch_sale("till-1", (apples, 2)),
+        batch_sale("till-2", (apples, 2), (pears, 1)),
+        batch_sale("till-3", (apples, 2)),           # only 1 apple left once the first two went through
+        batch_sale("till-4", (pears, 1)),
+        batch_sale("till-1", (apples, 2)),           # repeated key inside the batch
+        batch_sale("till-5", (make_product(db, user, quantity=0), 1)),
+    ]}
+
+    response = client.post("/api/v1/sales/batch", json=batch, params={"chunk_size": 2})
+    assert response.status_code == 200
+    body = response.json()
+    assert [r["status"] for r in body["results"]] == ["created", "created", "failed", "created", "duplicate", "failed"]
+    assert (body["created"], body["duplicates"], body["failed"]) == (3, 1, 2)
+    assert body["results"][4]["sale_id"] == body["results"][0]["sale_id"]
+    assert "Not enough stock" in body["results"][2]["error"]
+
+    db.expire_all()
+    assert (apples.quantity, pears.quantity) == (1, 0)
+    totals = db.get(models.SalesDailyRollup, db.query(models.SalesDailyRollup.id).filter_by(
+        product_id=models.SALE_TOTALS_PRODUCT_ID).scalar())
+    assert totals.sales_count == 3
+
+    # A till retrying the same upload after a timeout records nothing twice
+    retry = client.post("/api/v1/sales/batch", json=batch).json()
+    assert (retry["created"], retry["duplicates"]) == (0, 4)
+    assert db.query(models.Sale).count() == 3
+
+
+def test_sales_batch_uses_constant_round_trips(client, db, user, count_queries):
+    products = [make_product(db, user) for _ in range(4)]
+    small = {"sales": [batch_sale(f"s-{i}", (products[0], 1)) for i in range(2)]}
+    large = {"sales": [batch_sale(f"l-{i}", *[(p, 1) for p in products]) for i in range(20)]}
+    assert client.post("/api/v1/sales/batch", json={"sales": [batch_sale("warmup", (products[0], 1))]}).status_code == 200
+
+    count_queries.clear()
+    assert client.post("/api/v1/sales/batch", json=small).json()["created"] == 2
+    single = len(count_queries)
+
+    count_queries.clear()
+    assert client.post("/api/v1/sales/batch", json=large).json()["created"] == 20
+    assert len(count_queries) == single
+
+
+def test_sell_product_replay_returns_the_recorded_sale(client, db, user):
+    product = make_product(db, user, quantity=5)
+    payload = batch_sale("pos-42", (product, 1))
+    first = client.post("/api/v1/sales/sell_product", json=payload).json()
+    again = client.post("/api/v1/sales/sell_product", json=payload)
+    assert again.status_code == 200
+    assert again.json()["sale_id"] == first["sale_id"]
+    db.refresh(product)
+    assert product.quantity == 4
+
+
+def test_sales_batch_replays_a_chunk_that_lost_a_race(client, db, user, monkeypatch):
+    from fastapi import HTTPException
+    from routers import sales as sales_router
+
+    product = make_product(db, user, quantity=10)
+    real_reserve = sales_router.reserve_stock
+    calls = []
+
+    def reserve_once_stale(session, quantities):
+        calls.append(dict(quantities))
+        if len(calls) == 1:
+            # What reserve_stock raises when another checkout took the units first
+            raise HTTPException(status_code=409, detail="Stock changed while processing the sale")
+        real_reserve(session, quantities)
+
+    monkeypatch.setattr(sales_router, "reserve_stock", reserve_once_stale)
+    batch = {"sales": [batch_sale(f"race-{i}", (product, 2)) for i in range(3)]}
+    body = client.post("/api/v1/sales/batch", json=batch).json()
+
+    assert body["created"] == 3
+    # one aggregated reservation for the chunk, then one per replayed sale
+    assert calls == [{product.id: 6}] + [{product.id: 2}] * 3
+    db.refresh(product)
+    assert product.quantity == 4
+    assert db.query(models.Sale).count() == 3
+
+
+def test_export_streams_one_row_per_sold_line(client, db, user):
+    kettle = make_product(db, user, product_name="Kettle")
+    toaster = make_product(db, user, product_name="Toaster")
+    first = make_sale(db, user, kettle, datetime(2025, 3, 1, 23, 30, tzinfo=UTC), quantity=2)
+    first.products.append(models.ProductSold(product_id=toaster.id, product_name="Toaster", quantity_sold=1, selling_price=10.0))
+    db.commit()
+    make_sale(db, user, toaster, datetime(2025, 3, 2, 8, 0, tzinfo=UTC))
+    make_sale(db, user, kettle, datetime(2025, 3, 3, 8, 0, tzinfo=UTC))
+
+    response = client.get("/api/v1/sales/export", params={"from": "2025-03-01", "to": "2025-03-02"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    # lines of one sale follow their (random uuid) ids, so only the sales are ordered
+    assert [r["sale_id"] for r in rows][:2] == [str(first.id)] * 2
+    assert sorted(r["product_name"] for r in rows[:2]) == ["Kettle", "Toaster"]
+    assert rows[2]["sale_id"] != str(first.id) and rows[2]["product_name"] == "Toaster"
+    kettle_line = next(r for r in rows if r["product_name"] == "Kettle")
+    assert kettle_line["quantity_sold"] == "2" and kettle_line["status"] == "completed"
+
+    response = client.get("/api/v1/sales/export", params={"from": "2025-03-03", "format": "ndjson", "gzip": "true"})
+    assert response.headers["content-disposition"].endswith('.ndjson.gz"')
+    lines = [json.loads(line) for line in gzip.decompress(response.content).decode().splitlines()]
+    assert [line["product_name"] for line in lines] == ["Kettle"]
+
+    assert client.get("/api/v1/sales/export", params={"from": "2025-03-02", "to": "2025-03-01"}).status_code == 400
+
+
+def test_export_is_produced_in_chunks(db, user, monkeypatch):
+    product = make_product(db, user)
+    for day in range(1, 21):
+        make_sale(db, user, product, datetime(2025, 4, day, tzinfo=UTC))
+    monkeypatch.setattr(sales_export, "CHUNK_SIZE", 512)
+    monkeypatch.setattr(sales_export, "EXPORT_BATCH", 5)
+
+    chunks = sales_export.export_sales(None, None, ExportFormat.csv)
+    first = next(chunks)
+    assert 512 <= len(first) < 2048
+    rest = b"".join(chunks)
+    assert (first + rest).decode().count("\n") == 21
@@ -0,0 +1,114 @@
+from database import models
+from conftest import make_product
+from test_sales import sale_payload
+from utils import stock
+
+
+def ledger(db, product):
+    return [
+        (m.kind, m.quantity)
+        for m in db.query(models.InventoryMovement).filter_by(product_id=product.id).order_by(models.InventoryMovement.id)
+    ]
+
+
+def test_sales_and_refunds_are_written_to_the_ledger(client, db, user):
+    product = make_product(db, user, quantity=10)
+
+    sale_id = client.post("/api/v1/sales/sell_product", json=sale_payload((product, 3), (product, 1))).json()["sale_id"]
+    assert client.put(f"/api/v1/sales/sales/{sale_id}", json={"status": "refunded"}).status_code == 200
+    db.expire_all()
+    assert product.quantity == 10
+
+    # Undoing the refund takes the units again
+    assert client.put(f"/api/v1/sales/sales/{sale_id}", json={"status": "completed"}).status_code == 200
+    db.expire_all()
+    assert product.quantity == 6
+    assert ledger(db, product) == [
+        (models.MovementKindDB.SALE, -4), (models.MovementKindDB.REFUND, 4), (models.MovementKindDB.SALE, -4),
+    ]
+    assert {str(m.sale_id) for m in db.query(models.InventoryMovement)} == {sale_id}
+
+
+def test_receipts_and_adjustments_move_stock(client, db, user):
+    product = make_product(db, user, quantity=5)
+    url = f"/api/v1/products/{product.id}/stock/movements"
+
+    response = client.post(url, json={"kind": "receipt", "quantity": 20, "note": "Delivery 1042"})
+    assert response.status_code == 200
+    assert response.json()["kind"] == "receipt" and response.json()["created_by"] == str(user.id)
+    assert client.post(url, json={"kind": "adjustment", "quantity": -3, "note": "Broken"}).status_code == 200
+
+    assert client.post(url, json={"kind": "adjustment", "quantity": -23}).status_code == 400
+    assert client.post(url, json={"kind": "receipt", "quantity": -1}).status_code == 400
+    assert client.post(url, json={"kind": "sale", "quantity": -1}).status_code == 422
+
+    level = client.get(f"/api/v1/products/{product.id}/stock").json()
+    assert level["on_hand"] == level["quantity"] == 22
+    # make_product doesn't record opening stock
+    assert level["ledger_total"] == 17
+
+    first = client.get(url, params={"limit": 1}).json()
+    assert [m["quantity"] for m in first["items"]] == [-3]
+    rest = client.get(url, params={"cursor": first["next_cursor"]}).json()
+    assert [m["quantity"] for m in rest["items"]] == [20] and rest["next_cursor"] is None
+    assert client.get(url, params={"cursor": "bm90LWEtbnVtYmVy"}).status_code == 400
+
+
+def test_editing_quantity_records_an_adjustment(client, db, user):
+    product = make_product(db, user, quantity=5)
+    response = client.put(f"/api/v1/edit_product/{product.id}", json={"quantity": 12})
+    assert response.status_code == 200
+    assert ledger(db, product) == [(models.MovementKindDB.ADJUSTMENT, 7)]
+
+
+def test_sharded_product_sells_from_its_slots(client, db, user):
+    product = make_product(db, user, quantity=10)
+    response = client.put(f"/api/v1/products/{product.id}/stock/shards", json={"slots": 4})
+    assert response.json()["slots"] == [3, 3, 2, 2]
+
+    for _ in range(3):
+        assert client.post("/api/v1/sales/sell_product", json=sale_payload((product, 2))).status_code == 200
+    # More than any one slot holds, taken from several
+    assert client.post("/api/v1/sales/sell_product", json=sale_payload((product, 3))).status_code == 200
+    assert client.post("/api/v1/sales/sell_product", json=sale_payload((product, 2))).status_code == 400
+
+    level = client.get(f"/api/v1/products/{product.id}/stock").json()
+    assert level["on_hand"] == 1 and level["quantity"] == 10
+
+    assert stock.fold_all() == [product.id]
+    level = client.get(f"/api/v1/products/{product.id}/stock").json()
+    assert level["quantity"] == 1 and sorted(level["slots"]) == [0, 0, 0, 1]
+
+    # A receipt lands on a slot; unsharding puts everything back on the product row
+    client.post(f"/api/v1/products/{product.id}/stock/movements", json={"kind": "receipt", "quantity": 5})
+    level = client.put(f"/api/v1/products/{product.id}/stock/shards", json={"slots": 0}).json()
+    assert level == {**level, "on_hand": 6, "quantity": 6, "slots": []}
+    assert db.query(models.StockShard).count() == 0
+
+
+def test_editing_a_sharded_product_rewrites_its_slots(client, db, user):
+    product = make_product(db, user, quantity=4)
+    client.put(f"/api/v1/products/{product.id}/stock/shards", json={"slots": 2})
+    client.post("/api/v1/sales/sell_product", json=sale_payload((product, 1)))
+
+    assert client.put(f"/api/v1/edit_product/{product.id}", json={"quantity": 9}).status_code == 200
+    level = client.get(f"/api/v1/products/{product.id}/stock").json()
+    assert level["slots"] == [5, 4] and level["quantity"] == 9
+    assert ledger(db, product)[-1] == (models.MovementKindDB.ADJUSTMENT, 6)
+
+
+def test_stock_filters_read_sharded_products_live(client, db, user):
+    product = make_product(db, user, quantity=6, low_stock_alert=5)
+    make_product(db, user, quantity=3, low_stock_alert=5)
+    client.put(f"/api/v1/products/{product.id}/stock/shards", json={"slots": 2})
+    assert client.get("/api/v1/products/low_stock").json()["items"][0]["id"] != str(product.id)
+
+    # Sold from the shards, the product row keeps saying 6 until the next fold
+    client.post("/api/v1/sales/sell_product", json=sale_payload((product, 2)))
+    low = client.get("/api/v1/products/low_stock").json()["items"]
+    assert str(product.id) in [p["id"] for p in low] and len(low) == 2
+
+    client.post("/api/v1/sales/sell_product", json=sale_payload((product, 4)))
+    sold_out = client.get("/api/v1/get_products", params={"in_stock": False}).json()["items"]
+    assert [p["id"] for p in sold_out] == [str(product.id)]
+    assert len(client.get("/api/v1/get_products", params={"in_stock": True}).json()["items"]) == 1
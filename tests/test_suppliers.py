@@ -0,0 +1,109 @@
+from database import models
+
+
+def create(client, name, contact_person, email, status="active"):
+    payload = {"name": name, "contact_person": contact_person, "email": email, "phone": "0788000000",
+               "address": "Kigali", "status": status}
+    response = client.post("/api/v1/suppliers/", json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def search(client, query, **params):
+    response = client.get("/api/v1/suppliers/search", params={"query": query, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_search_matches_inside_names_and_follows_writes(client):
+    acme = create(client, "Acme Supplies", "Jane Roe", "jane@acme.example")
+    beta = create(client, "Beta Foods", "Tom Acmeson", "tom@beta.example")
+    create(client, "Gamma 100%", "Kim", "kim@gamma.example")
+
+    # Name matches rank above contact person matches
+    assert [s["id"] for s in search(client, "ACME")["items"]] == [acme["id"], beta["id"]]
+    assert [s["id"] for s in search(client, "ne r")["items"]] == [acme["id"]]
+    # Too short for the trigram index, and LIKE wildcards are taken literally
+    assert {s["id"] for s in search(client, "me")["items"]} == {acme["id"], beta["id"]}
+    assert [s["name"] for s in search(client, "%")["items"]] == ["Gamma 100%"]
+
+    assert client.put(f"/api/v1/suppliers/{beta['id']}", json={"contact_person": "Tom Lee"}).status_code == 200
+    assert [s["id"] for s in search(client, "acme")["items"]] == [acme["id"]]
+    client.delete(f"/api/v1/suppliers/{acme['id']}")
+    assert search(client, "acme")["items"] == []
+
+
+def test_search_is_paginated(client):
+    created = [create(client, f"Northwind {i}", "Ann", f"ann{i}@northwind.example") for i in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        page = search(client, "northwind", limit=2, **({"cursor": cursor} if cursor else {}))
+        seen += [s["id"] for s in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(s["id"] for s in created)
+    assert client.get("/api/v1/suppliers/search", params={"query": "north", "cursor": "bad"}).status_code == 400
+
+
+def test_filter_by_status(client):
+    active = create(client, "Active Co", "Ann", "ann@active.example")
+    create(client, "Dormant Co", "Bob", "bob@dormant.example", status="inactive")
+    response = client.get("/api/v1/suppliers/filter", params={"status": "ACTIVE"})
+    assert [s["id"] for s in response.json()] == [active["id"]]
+
+
+def test_reorder_point_covers_lead_time_demand():
+    from utils.replenishment import suggest
+
+    # 2 a day, every day: no safety stock needed
+    assert suggest(180, 360, 90, on_hand=11, lead_time=5, pack_size=12) is None
+    steady = suggest(180, 360, 90, on_hand=10, lead_time=5, pack_size=12)
+    assert steady == {"demand_per_day": 2.0, "safety_stock": 0, "reorder_point": 10, "order_quantity": 36}
+
+    # The same units sold in bursts need a buffer
+    bursty = suggest(180, 180 * 20, 90, on_hand=10, lead_time=5, pack_size=1)
+    assert bursty["safety_stock"] > 0 and bursty["reorder_point"] > 10
+    assert suggest(0, 0, 90, on_hand=0, lead_time=5, pack_size=1) is None
+
+
+def test_purchase_orders_group_suggestions_by_supplier(client, db, user):
+    from datetime import datetime, timedelta, UTC
+    from conftest import make_product
+    from test_sales import sale_payload
+
+    fast = make_product(db, user, product_name="Fast mover", quantity=20)
+    slow = make_product(db, user, product_name="Slow mover", quantity=1000)
+    other = make_product(db, user, product_name="Other", quantity=5)
+    cheap = create(client, "Cheap Co", "Ann", "ann@cheap.example")
+    usual = create(client, "Usual Co", "Bob", "bob@usual.example")
+
+    terms = {"lead_time_days": 7, "pack_size": 5, "unit_cost": 4.0}
+    client.put(f"/api/v1/suppliers/{cheap['id']}/products/{fast.id}", json={**terms, "unit_cost": 3.0})
+    client.put(f"/api/v1/suppliers/{usual['id']}/products/{fast.id}", json={**terms, "preferred": True})
+    client.put(f"/api/v1/suppliers/{usual['id']}/products/{slow.id}", json=terms)
+    client.put(f"/api/v1/suppliers/{cheap['id']}/products/{other.id}", json={**terms, "pack_size": 1})
+    assert len(client.get(f"/api/v1/suppliers/{usual['id']}/products").json()) == 2
+
+    yesterday = (datetime.now(UTC) - timedelta(days=1)).isoformat()
+    for lines in ([(fast, 18), (slow, 1)], [(other, 4)]):
+        client.post("/api/v1/sales/sell_product", json={**sale_payload(*lines), "sold_at": yesterday})
+
+    assert client.get("/api/v1/suppliers/purchase_orders").json() == {"computed_at": None, "orders": []}
+    assert client.post("/api/v1/suppliers/purchase_orders/refresh").json() == {"suggestions": 2}
+
+    orders = {o["supplier_name"]: o for o in client.get("/api/v1/suppliers/purchase_orders").json()["orders"]}
+    assert set(orders) == {"Cheap Co", "Usual Co"}
+    # The preferred supplier gets the order, whole packs only
+    (line,) = orders["Usual Co"]["lines"]
+    assert line["product_name"] == "Fast mover" and line["on_hand"] == 2
+    assert line["quantity"] % 5 == 0 and line["quantity"] + 2 > line["reorder_point"]
+    assert orders["Usual Co"]["total_cost"] == line["quantity"] * 4.0
+    assert [l["product_name"] for l in orders["Cheap Co"]["lines"]] == ["Other"]
+
+    only = client.get("/api/v1/suppliers/purchase_orders", params={"supplier_id": cheap["id"]}).json()["orders"]
+    assert [o["supplier_name"] for o in only] == ["Cheap Co"]
+    # A supplier's links go with it
+    assert client.delete(f"/api/v1/suppliers/{cheap['id']}").status_code == 204
+    assert db.query(models.SupplierProduct).filter_by(supplier_id=cheap["id"]).count() == 0
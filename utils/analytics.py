@@ -0,0 +1,195 @@
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+from database import models
+from utils import stock
+from utils.auth_cache import TTLCache
+from datetime import date
+from itertools import accumulate
+from typing import NamedTuple
+from uuid import UUID
+import os
+
+# Results are kept per date range for ANALYTICS_CACHE_TTL seconds, 0 turns caching off
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", 16))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", 300))
+# Cumulative revenue share that closes the A and the B class
+ABC_A = float(os.getenv("ANALYTICS_ABC_A", 0.8))
+ABC_B = float(os.getenv("ANALYTICS_ABC_B", 0.95))
+# Rows fetched per round trip
+CHUNK = 10000
+
+results = TTLCache(ANALYTICS_CACHE_SIZE, ANALYTICS_CACHE_TTL)
+
+
+class ProductFigures(NamedTuple):
+    rank: int
+    product_id: UUID
+    sku: str
+    product_name: str
+    category: str
+    units: int
+    revenue: float
+    cost: float
+    gross_margin: float
+    margin_pct: float | None
+    on_hand: int
+    sell_through: float | None
+    stock_turnover: float | None
+    days_of_cover: float | None
+    abc: str
+    category_abc: str
+
+
+def abc_classes(revenue: list[float]) -> list[str]:
+    """
+    Pareto class of each value: A while the share of the total earned by the
+    bigger values before it is under ABC_A, B under ABC_B, C after that and
+    for anything that earned nothing.
+    """
+    order = sorted(range(len(revenue)), key=lambda i: -revenue[i])
+    total = sum(revenue[i] for i in order if revenue[i] > 0)
+    classes = ["C"] * len(revenue)
+    if total <= 0:
+        return classes
+    before = accumulate((revenue[i] for i in order), initial=0.0)
+    for i, earned_before in zip(order, before):
+        if revenue[i] <= 0:
+            break
+        share = earned_before / total
+        classes[i] = "A" if share < ABC_A else "B" if share < ABC_B else "C"
+    return classes
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator if denominator else None
+
+
+def _columns(db: Session, date_from: date, date_to: date) -> dict[str, list]:
+    """
+    Every product with its units, revenue and cost over the range, one list per
+    column. Sales are summed in the database from the daily rollup, so the
+    work grows with products x days, not with the number of sold lines.
+    Refunded sales don't count. Stock is the live one, shards included.
+    """
+    R = models.SalesDailyRollup
+    P = models.Product
+    sold = (
+        select(
+            R.product_id,
+            func.sum(R.units_sold).label("units"),
+            func.sum(R.revenue).label("revenue"),
+            func.sum(R.cost).label("cost"),
+        )
+        .where(
+            R.product_id != models.SALE_TOTALS_PRODUCT_ID,
+            R.status != models.SaleStatusDB.REFUNDED,
+            R.day >= date_from,
+            R.day <= date_to,
+        )
+        .group_by(R.product_id)
+        .subquery()
+    )
+    names = ["product_id", "sku", "product_name", "category", "on_hand", "buying_price", "units", "revenue", "cost"]
+    columns = {name: [] for name in names}
+    result = db.execute(
+        select(
+            P.id, P.sku, P.product_name, P.category, stock.on_hand(), P.buying_price,
+            func.coalesce(sold.c.units, 0), func.coalesce(sold.c.revenue, 0.0), func.coalesce(sold.c.cost, 0.0),
+        )
+        .outerjoin(sold, sold.c.product_id == P.id)
+        .execution_options(yield_per=CHUNK)
+    )
+    for chunk in result.partitions():
+        for name, values in zip(names, zip(*chunk)):
+            columns[name].extend(values)
+    return columns
+
+
+def compute(db: Session, date_from: date, date_to: date) -> dict:
+    """
+    Revenue, gross margin, units, sell-through, stock turnover, days of cover
+    and ABC class of every product, and the same per category. Turnover and
+    cover are measured against the stock on hand now: the cost of the units
+    sold over the range per unit of stock value, and how many days the stock
+    lasts at the range's average daily sales.
+    """
+    c = _columns(db, date_from, date_to)
+    days = (date_to - date_from).days + 1
+    count = len(c["product_id"])
+    margin = [revenue - cost for revenue, cost in zip(c["revenue"], c["cost"])]
+    abc = abc_classes(c["revenue"])
+
+    # Products of each category, for the class within the category
+    by_category: dict[str, list[int]] = {}
+    for i, category in enumerate(c["category"]):
+        by_category.setdefault(category, []).append(i)
+    category_abc = [""] * count
+    for members in by_category.values():
+        for i, cls in zip(members, abc_classes([c["revenue"][i] for i in members])):
+            category_abc[i] = cls
+
+    order = sorted(range(count), key=lambda i: (-c["revenue"][i], c["sku"][i]))
+    products = [
+        ProductFigures(
+            rank=rank,
+            product_id=c["product_id"][i],
+            sku=c["sku"][i],
+            product_name=c["product_name"][i],
+            category=c["category"][i],
+            units=c["units"][i],
+            revenue=round(c["revenue"][i], 2),
+            cost=round(c["cost"][i], 2),
+            gross_margin=round(margin[i], 2),
+            margin_pct=_ratio(margin[i], c["revenue"][i]),
+            on_hand=c["on_hand"][i],
+            sell_through=_ratio(c["units"][i], c["units"][i] + max(c["on_hand"][i], 0)),
+            stock_turnover=_ratio(c["cost"][i], max(c["on_hand"][i], 0) * c["buying_price"][i]),
+            days_of_cover=_ratio(max(c["on_hand"][i], 0), c["units"][i] / days),
+            abc=abc[i],
+            category_abc=category_abc[i],
+        )
+        for rank, i in enumerate(order, start=1)
+    ]
+
+    categories = []
+    for category, members in by_category.items():
+        revenue = sum(c["revenue"][i] for i in members)
+        cost = sum(c["cost"][i] for i in members)
+        units = sum(c["units"][i] for i in members)
+        on_hand = sum(max(c["on_hand"][i], 0) for i in members)
+        categories.append({
+            "category": category,
+            "products": len(members),
+            "units": units,
+            "revenue": round(revenue, 2),
+            "gross_margin": round(revenue - cost, 2),
+            "margin_pct": _ratio(revenue - cost, revenue),
+            "on_hand": on_hand,
+            "sell_through": _ratio(units, units + on_hand),
+            "stock_turnover": _ratio(cost, sum(max(c["on_hand"][i], 0) * c["buying_price"][i] for i in members)),
+            "days_of_cover": _ratio(on_hand, units / days),
+        })
+    for row, cls in zip(categories, abc_classes([row["revenue"] for row in categories])):
+        row["abc"] = cls
+    categories.sort(key=lambda row: (-row["revenue"], row["category"]))
+
+    return {
+        "date_from": date_from,
+        "date_to": date_to,
+        "days": days,
+        "revenue": round(sum(c["revenue"]), 2),
+        "gross_margin": round(sum(margin), 2),
+        "units": sum(c["units"]),
+        "categories": categories,
+        "products": products,
+    }
+
+
+def product_analytics(db: Session, date_from: date, date_to: date) -> dict:
+    """compute(), served from the per range cache while it's fresh."""
+    key = (date_from, date_to)
+    cached = results.get(key)
+    if cached is None:
+        cached = compute(db, date_from, date_to)
+        results.set(key, cached)
+    return cached
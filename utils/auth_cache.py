@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from typing import NamedTuple
+from uuid import UUID
+import hashlib, os, threading, time
+
+# Verified tokens are reused for at most AUTH_CACHE_TTL seconds and never past their own exp.
+# AUTH_CACHE_TTL=0 turns the cache off and every request verifies its token again.
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", 10000))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", 300))
+AUTH_CACHE_USER_RECORDS = os.getenv("AUTH_CACHE_USER_RECORDS", "true").lower() in ("1", "true", "yes", "on")
+
+
+class CurrentUser(NamedTuple):
+    id: UUID
+    role: str
+
+    @property
+    def roles(self) -> list[str]:
+        return [r for r in self.role.split(",") if r]
+
+
+class TTLCache:
+    """
+    Thread safe LRU cache whose entries also expire. Entries can carry a tag
+    (the user id here) so everything cached for one user can be dropped at once.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict = OrderedDict()  # key -> (value, expires_at, tag)
+        self._tags: dict = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def set(self, key, value, expires_at: float | None = None, tag=None) -> None:
+        if not self.enabled:
+            return
+        expires_at = min(expires_at or float("inf"), self.clock() + self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, tag)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def pop(self, key) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def pop_tag(self, tag) -> None:
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key) -> None:
+        _, _, tag = self._entries.pop(key)
+        if tag is not None:
+            keys = self._tags[tag]
+            keys.discard(key)
+            if not keys:
+                del self._tags[tag]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+# token digest -> user id ("sub"); the raw token is never kept in memory
+tokens = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+# user id -> CurrentUser, for routes that need the role
+users = TTLCache(AUTH_CACHE_SIZE if AUTH_CACHE_USER_RECORDS else 0, AUTH_CACHE_TTL)
+
+
+def token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+
+def revoke_user(user_id) -> None:
+    """
+    Forget every cached token and the cached record of a user, after a role
+    change or removal. Their next request is checked against users again.
+    """
+    user_id = str(user_id)
+    tokens.pop_tag(user_id)
+    users.pop(user_id)
+
+
+def cache_stats() -> dict:
+    return {"tokens": tokens.stats(), "users": users.stats()}
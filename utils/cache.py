@@ -0,0 +1,135 @@
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+from collections import OrderedDict
+from functools import lru_cache
+import hashlib, os, threading
+
+# Resources with a version counter. Every write to one of them bumps its counter,
+# which changes the ETag of every cached response built from it.
+PRODUCTS = "products"
+SUPPLIERS = "suppliers"
+LOCATIONS = "locations"
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1024))
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 3600))
+# redis://host:6379/0 shares versions and bodies between workers; unset keeps them in process
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL")
+
+# Clients may keep a copy but must revalidate it, which costs a 304 and no DB work
+CACHE_CONTROL = "private, no-cache"
+
+
+class MemoryBackend:
+    """Per-process versions and an LRU of response bodies. Only coherent with a single worker."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._versions: dict[str, int] = {}
+        self._bodies: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def versions(self, resources) -> list[int]:
+        with self._lock:
+            return [self._versions.get(r, 0) for r in resources]
+
+    def bump(self, resources) -> None:
+        with self._lock:
+            for r in resources:
+                self._versions[r] = self._versions.get(r, 0) + 1
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+            return body
+
+    def set(self, key: str, body: bytes) -> None:
+        with self._lock:
+            self._bodies[key] = body
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.maxsize:
+                self._bodies.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._versions.clear()
+            self._bodies.clear()
+
+
+class RedisBackend:
+    """Versions and bodies in Redis, so every worker sees the same counters."""
+
+    def __init__(self, url: str, ttl: int):
+        import redis  # optional dependency, only needed when RESPONSE_CACHE_URL is set
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def versions(self, resources) -> list[int]:
+        return [int(v or 0) for v in self.client.mget([f"cache:version:{r}" for r in resources])]
+
+    def bump(self, resources) -> None:
+        pipe = self.client.pipeline()
+        for r in resources:
+            pipe.incr(f"cache:version:{r}")
+        pipe.execute()
+
+    def get(self, key: str) -> bytes | None:
+        return self.client.get(f"cache:body:{key}")
+
+    def set(self, key: str, body: bytes) -> None:
+        # Old versions are never read again, the TTL clears them out
+        self.client.set(f"cache:body:{key}", body, ex=self.ttl)
+
+    def clear(self) -> None:
+        keys = list(self.client.scan_iter("cache:*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+backend = RedisBackend(RESPONSE_CACHE_URL, RESPONSE_CACHE_TTL) if RESPONSE_CACHE_URL else MemoryBackend(RESPONSE_CACHE_SIZE)
+
+
+def bump(*resources: str) -> None:
+    """Call after committing a write to these resources."""
+    backend.bump(resources)
+
+
+@lru_cache(maxsize=None)
+def _adapter(model) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def _etag(request: Request, resources, versions) -> str:
+    query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+    tag = f"{request.url.path}?{query}|" + ",".join(f"{r}:{v}" for r, v in zip(resources, versions))
+    return '"' + hashlib.sha256(tag.encode()).hexdigest()[:32] + '"'
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    return header.strip() == "*" or etag in [t.strip() for t in header.split(",")]
+
+
+def cached_response(request: Request, resources: tuple[str, ...], model, build) -> Response:
+    """
+    Serve a read from the response cache. The ETag is derived from the URL and
+    the current versions of `resources`, so a matching If-None-Match gets a 304
+    before `build` (the DB work) runs. Otherwise the cached body for that ETag
+    is sent, or `build()` is called and its result serialized with `model`.
+    """
+    versions = backend.versions(resources)
+    etag = _etag(request, resources, versions)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    body = backend.get(etag)
+    if body is None:
+        adapter = _adapter(model)
+        body = adapter.dump_json(adapter.validate_python(build(), from_attributes=True))
+        backend.set(etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
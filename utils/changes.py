@@ -0,0 +1,56 @@
+from sqlalchemy import select, insert, delete
+from sqlalchemy.orm import Session
+from database import models
+from datetime import datetime, timedelta, UTC
+import os
+
+# Sequence numbers are handed out at insert time but become visible at commit, so on
+# databases with concurrent writers a lower seq can show up after a higher one was read.
+# The feed still returns changes younger than this, but doesn't move the cursor past them.
+SETTLE_SECONDS = float(os.getenv("CHANGE_FEED_SETTLE_SECONDS", 2))
+
+
+def record_changes(db: Session, product_ids) -> None:
+    """Give each product a new change seq, replacing its previous one. Doesn't commit."""
+    ids = list(dict.fromkeys(product_ids))
+    if not ids:
+        return
+    db.execute(delete(models.ProductChange).where(models.ProductChange.product_id.in_(ids)))
+    now = datetime.now(UTC)
+    db.execute(insert(models.ProductChange), [{"product_id": i, "changed_at": now} for i in ids])
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes, they were written in UTC
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+def changes_since(db: Session, since: int, limit: int) -> tuple[list, list, int, bool]:
+    """
+    Products changed after `since`, in seq order: (products, deleted ids, next seq, has_more).
+    One query, the change rows outer joined to the products they point at.
+    """
+    rows = db.execute(
+        select(models.ProductChange.seq, models.ProductChange.product_id, models.ProductChange.changed_at, models.Product)
+        .outerjoin(models.Product, models.Product.id == models.ProductChange.product_id)
+        .where(models.ProductChange.seq > since)
+        .order_by(models.ProductChange.seq)
+        .limit(limit + 1)
+    ).all()
+    overflow = len(rows) > limit
+    rows = rows[:limit]
+
+    settled_before = datetime.now(UTC) - timedelta(seconds=SETTLE_SECONDS)
+    next_seq, advancing = since, True
+    latest = {}
+    for seq, product_id, changed_at, product in rows:
+        latest[product_id] = product
+        # Safe to move past a row when nothing can be missing below it: no gap, or old enough
+        if advancing and (seq == next_seq + 1 or _aware(changed_at) <= settled_before):
+            next_seq = seq
+        else:
+            advancing = False
+
+    products = [p for p in latest.values() if p is not None]
+    deleted = [product_id for product_id, p in latest.items() if p is None]
+    return products, deleted, next_seq, overflow and next_seq > since
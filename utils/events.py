@@ -0,0 +1,134 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from itertools import count
+import asyncio, os, threading
+
+# Most events one screen may have waiting; past that its backlog is dropped and
+# it's told to resync, so a stalled client can't make the server buffer forever.
+MAX_PENDING = int(os.getenv("EVENTS_MAX_PENDING", 500))
+
+# Events of these types replace an earlier, still unsent event for the same key
+COALESCE_BY = {"stock": "product_id", "low_stock": "product_id", "sale": "sale_id"}
+
+_PENDING = "pending_events"
+_unique = count()
+
+
+class Subscriber:
+    """Events waiting for one client. Only touched from the event loop it was created on."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_pending: int):
+        self.loop = loop
+        self.max_pending = max_pending
+        self.pending: OrderedDict = OrderedDict()
+        self.overflowed = False
+        self.coalesced = 0
+        self._wakeup = asyncio.Event()
+
+    def push(self, events: list[dict]) -> None:
+        for e in events:
+            field = COALESCE_BY.get(e["type"])
+            key = (e["type"], e[field]) if field else next(_unique)
+            earlier = self.pending.get(key)
+            if earlier is not None:
+                self.coalesced += 1
+                if e["type"] == "stock":
+                    # Keep the latest level but report the combined movement
+                    e = {**e, "delta": earlier["delta"] + e["delta"]}
+                self.pending[key] = e
+            elif len(self.pending) >= self.max_pending:
+                self.pending.clear()
+                self.overflowed = True
+            else:
+                self.pending[key] = e
+        self._wakeup.set()
+
+    async def next_batch(self, timeout: float) -> list[dict]:
+        """Wait up to `timeout` seconds for events and take everything pending."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return []
+        self._wakeup.clear()
+        batch = list(self.pending.values())
+        self.pending.clear()
+        if self.overflowed:
+            self.overflowed = False
+            batch.insert(0, {"type": "resync"})
+        return batch
+
+
+class EventBus:
+    """In-process pub/sub. publish() can be called from any thread."""
+
+    def __init__(self):
+        self._subscribers: set[Subscriber] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, max_pending: int = MAX_PENDING) -> Subscriber:
+        subscriber = Subscriber(asyncio.get_running_loop(), max_pending)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, events: list[dict]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        for subscriber in subscribers:
+            if subscriber.loop is current:
+                subscriber.push(events)
+                continue
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.push, events)
+            except RuntimeError:
+                # Its event loop is gone
+                self.unsubscribe(subscriber)
+
+
+bus = EventBus()
+
+
+def queue(db: Session, *events: dict) -> None:
+    """Publish `events` once the session's transaction commits, drop them if it rolls back."""
+    db.info.setdefault(_PENDING, []).extend(events)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_after_commit(session):
+    events = session.info.pop(_PENDING, None)
+    if events:
+        bus.publish(events)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_rollback(session):
+    session.info.pop(_PENDING, None)
+
+
+def stock_change(product, before: int, after: int) -> list[dict]:
+    """A stock event, plus a low_stock one when this change takes the product to its alert level."""
+    events = [{"type": "stock", "product_id": product.id, "sku": product.sku,
+               "quantity": after, "delta": after - before}]
+    if before > product.low_stock_alert >= after:
+        events.append({"type": "low_stock", "product_id": product.id, "sku": product.sku,
+                       "quantity": after, "low_stock_alert": product.low_stock_alert})
+    return events
+
+
+def sale_event(sale) -> dict:
+    status = getattr(sale.status, "value", sale.status)
+    return {"type": "sale", "sale_id": sale.id, "status": status, "total": sale.total,
+            "sold_by": sale.sold_by, "sold_at": sale.sold_at}
@@ -10,8 +10,11 @@ load_dotenv()
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRES", 60))
 SECRET_KEY = os.getenv("SECRETE_KEY")
 ALGORITHM = os.getenv("ALGORITHM")
+# bcrypt cost factor, each +1 doubles the time per hash. Hashes made with another
+# cost still verify and are rewritten with this one at the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
 # Password hasher
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 # Verify/Hash password
 def verify_password(plain_password, hashed_password):
@@ -28,9 +31,12 @@ def generate_access_token(data: dict, expires_delta: Optional[timedelta] = None)
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 # Decode token
-def decode_access_token(token: str):
+def decode_access_payload(token: str):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
     except JWTError:
         return None
+
+def decode_access_token(token: str):
+    payload = decode_access_payload(token)
+    return payload.get("sub") if payload else None
@@ -0,0 +1,240 @@
+from fastapi import UploadFile
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, update, delete, case
+from sqlalchemy.dialects import postgresql, sqlite, mysql
+from sqlalchemy.orm import Session
+from concurrent.futures import ProcessPoolExecutor
+from collections import Counter
+from dataclasses import dataclass
+from database import models
+import glob, hashlib, importlib.util, logging, os, re, tempfile, threading
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = os.getenv("IMAGE_DIR", "static/images")
+CHUNK_SIZE = 1024 * 1024
+# Longest side, in pixels, of the resized copies made next to each original
+VARIANT_SIZES = [int(s) for s in os.getenv("IMAGE_VARIANT_SIZES", "256,800").split(",") if s.strip()]
+VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", 2))
+
+# sha256 name, optionally with a _<size> variant suffix. These never change once written.
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}(_\d+)?\.[a-z0-9]{1,8}$")
+SAFE_EXT = re.compile(r"^\.[a-z0-9]{1,8}$")
+
+# Pillow is optional, without it originals are stored and no variants are made
+HAS_PILLOW = importlib.util.find_spec("PIL") is not None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+images = models.StoredImage.__table__
+
+
+@dataclass
+class StagedImage:
+    """An upload written to a temp file in IMAGE_DIR, not yet under its final name."""
+    temp_path: str
+    filename: str
+    size: int
+
+
+def _extension(filename: str | None) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if SAFE_EXT.match(ext) else ""
+
+
+def _write_to_temp(source, ext: str) -> StagedImage:
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=IMAGE_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := source.read(CHUNK_SIZE):
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return StagedImage(temp_path, f"{digest.hexdigest()}{ext}", size)
+
+
+async def stage_upload(upload: UploadFile) -> StagedImage:
+    """Copy and hash an upload in chunks on a worker thread, keeping the event loop free."""
+    return await run_in_threadpool(_write_to_temp, upload.file, _extension(upload.filename))
+
+
+def publish(staged: list[StagedImage]) -> list[str]:
+    """
+    Move staged uploads to their content addressed names and return the names
+    that didn't exist yet. Call it after acquire() so a concurrent release()
+    can't remove the file in between.
+    """
+    created = []
+    for image in staged:
+        path = os.path.join(IMAGE_DIR, image.filename)
+        if os.path.exists(path):
+            os.unlink(image.temp_path)
+        else:
+            os.replace(image.temp_path, path)
+            created.append(image.filename)
+    return created
+
+
+def discard(staged: list[StagedImage]) -> None:
+    """Remove temp files of uploads that were never published."""
+    for image in staged:
+        if os.path.exists(image.temp_path):
+            os.unlink(image.temp_path)
+
+
+def _upsert_refs(dialect: str, rows: list[dict]):
+    if dialect == "mysql":
+        stmt = mysql.insert(images).values(rows)
+        return stmt.on_duplicate_key_update(ref_count=images.c.ref_count + stmt.inserted.ref_count)
+    if dialect == "postgresql":
+        stmt = postgresql.insert(images).values(rows)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(images).values(rows)
+    else:
+        raise NotImplementedError(f"Image reference upsert isn't supported on {dialect}")
+    return stmt.on_conflict_do_update(
+        index_elements=["filename"],
+        set_={"ref_count": images.c.ref_count + stmt.excluded.ref_count}
+    )
+
+
+def _tracked(filenames) -> Counter:
+    # Files from before content addressing have random names and are never reference counted
+    return Counter(name for name in filenames if name and HASHED_NAME.match(name))
+
+
+def acquire(db: Session, filenames: list[str], sizes: dict[str, int] | None = None) -> None:
+    """Add one reference per occurrence of each name, in a single upsert."""
+    counts = _tracked(filenames)
+    if not counts:
+        return
+    sizes = sizes or {}
+    rows = [{"filename": name, "size": sizes.get(name), "ref_count": n} for name, n in counts.items()]
+    db.execute(_upsert_refs(db.get_bind().dialect.name, rows))
+
+
+def release(db: Session, filenames: list[str]) -> list[str]:
+    """
+    Drop one reference per occurrence of each name and forget images nobody
+    uses any more. Returns their file names, for reclaim() once this is
+    committed: removing the files any earlier would lose them if the commit
+    fails.
+    """
+    counts = _tracked(filenames)
+    if not counts:
+        return []
+    db.execute(
+        update(models.StoredImage)
+        .where(models.StoredImage.filename.in_(list(counts)))
+        .values(ref_count=models.StoredImage.ref_count - case(dict(counts), value=models.StoredImage.filename))
+        .execution_options(synchronize_session=False)
+    )
+    unused = db.scalars(
+        select(models.StoredImage.filename)
+        .where(models.StoredImage.filename.in_(list(counts)), models.StoredImage.ref_count <= 0)
+    ).all()
+    if unused:
+        db.execute(delete(models.StoredImage).where(models.StoredImage.filename.in_(unused)))
+    return list(unused)
+
+
+def reclaim(db: Session, filenames: list[str]) -> list[str]:
+    """
+    Of the names release() returned, after its commit, those still unused,
+    for remove_files() before commit. The names are claimed again with a zero
+    count first, so an upload of the same content that committed in between
+    keeps its file, and one still in flight waits on the rows and writes the
+    file again after us.
+    """
+    if not filenames:
+        return []
+    rows = [{"filename": name, "size": None, "ref_count": 0} for name in set(filenames)]
+    db.execute(_upsert_refs(db.get_bind().dialect.name, rows))
+    unused = db.scalars(
+        select(models.StoredImage.filename)
+        .where(models.StoredImage.filename.in_(list(set(filenames))), models.StoredImage.ref_count <= 0)
+    ).all()
+    if unused:
+        db.execute(delete(models.StoredImage).where(models.StoredImage.filename.in_(unused)))
+    return list(unused)
+
+
+def remove_files(filenames: list[str]) -> None:
+    """Delete originals and their resized variants."""
+    for name in filenames:
+        stem, ext = os.path.splitext(name)
+        for path in [os.path.join(IMAGE_DIR, name), *glob.glob(os.path.join(IMAGE_DIR, f"{stem}_*{ext}"))]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+
+def _make_variants(path: str, sizes: list[int]) -> list[str]:
+    """Runs in a worker process. Writes <sha>_<size><ext> next to the original."""
+    from PIL import Image
+
+    stem, ext = os.path.splitext(path)
+    written = []
+    try:
+        with Image.open(path) as original:
+            for size in sizes:
+                target = f"{stem}_{size}{ext}"
+                if os.path.exists(target) or max(original.size) <= size:
+                    continue
+                copy = original.copy()
+                copy.thumbnail((size, size))
+                # Write under a temp name so the static route never serves half a file
+                temp = f"{target}.part"
+                copy.save(temp, format=original.format)
+                os.replace(temp, target)
+                written.append(target)
+    except Exception as e:
+        # Not an image Pillow can read; the original is still served
+        logger.warning("Could not create variants of %s: %s", path, e)
+    return written
+
+
+def _variant_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=VARIANT_WORKERS)
+        return _pool
+
+
+def schedule_variants(filenames: list[str]) -> None:
+    """Queue resized copies of new originals without waiting for them."""
+    if not HAS_PILLOW or not VARIANT_SIZES:
+        return
+    pool = _variant_pool()
+    for name in filenames:
+        pool.submit(_make_variants, os.path.join(IMAGE_DIR, name), VARIANT_SIZES)
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that lets browsers and CDNs keep content addressed images forever."""
+
+    IMMUTABLE = "public, max-age=31536000, immutable"
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if HASHED_NAME.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = self.IMMUTABLE
+        return response
@@ -0,0 +1,197 @@
+from contextvars import ContextVar
+from dataclasses import dataclass
+from sqlalchemy import event
+import logging, os, threading, time
+
+# Statements slower than this are counted as slow and logged
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+# Set to require "Authorization: Bearer <token>" on /metrics
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+slow_log = logging.getLogger("sql.slow")
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {_number(v)}" for k, v in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: dict[tuple, list] = {}  # labels -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, *labels, value: float) -> None:
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = sorted((k, list(v)) for k, v in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts in series:
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                le = 'le="' + (bound if bound == "+Inf" else _number(float(bound))) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [le])} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {counts[len(self.buckets)]}")
+        return lines
+
+
+requests_total = Counter("http_requests_total", "Requests by route and status.", ("method", "route", "status"))
+request_seconds = Histogram("http_request_duration_seconds", "Request latency until the last body byte.", ("method", "route"))
+request_queries = Histogram(
+    "http_request_db_queries", "SQL statements per request.", ("method", "route"), buckets=QUERY_COUNT_BUCKETS
+)
+db_seconds = Counter("db_query_seconds_total", "Time spent in SQL statements.", ("route",))
+slow_queries = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS.", ("route",))
+
+REGISTRY = [requests_total, request_seconds, request_queries, db_seconds, slow_queries]
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_seconds: float = 0.0
+    slow: int = 0
+
+
+# Shared by reference with the threadpool and greenlets that run the request's queries
+current: ContextVar[RequestStats | None] = ContextVar("request_db_stats", default=None)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._metrics_started
+    stats = current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        if stats is not None:
+            stats.slow += 1
+        slow_log.warning("%.1f ms: %s", elapsed * 1000, " ".join(statement.split())[:500])
+
+
+def instrument(*engines) -> None:
+    """Time every statement run on these (sync) engines."""
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", _before_execute)
+        event.listen(engine, "after_cursor_execute", _after_execute)
+
+
+class MetricsMiddleware:
+    """
+    Times each HTTP request, counts its SQL statements and reports them in the
+    X-DB-Queries, X-DB-Time-Ms and X-DB-Slow-Queries headers. Statements run
+    after the headers went out (streamed bodies) only reach the metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_stats(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-db-queries", str(stats.queries).encode()),
+                    (b"x-db-time-ms", f"{stats.db_seconds * 1000:.1f}".encode()),
+                    (b"x-db-slow-queries", str(stats.slow).encode()),
+                ]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            current.reset(token)
+            # Route templates, not raw paths, so ids don't explode the label set
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            requests_total.inc(method, route, str(status))
+            request_seconds.observe(method, route, value=time.perf_counter() - started)
+            request_queries.observe(method, route, value=stats.queries)
+            db_seconds.inc(route, amount=stats.db_seconds)
+            if stats.slow:
+                slow_queries.inc(route, amount=stats.slow)
+
+
+def _samples(name: str, kind: str, help: str, samples: list[tuple[dict, float]]) -> list[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+    return lines
+
+
+POOL_METRICS = (
+    ("size", "gauge", "Configured pool size."),
+    ("checked_out", "gauge", "Connections in use."),
+    ("checked_in", "gauge", "Idle connections in the pool."),
+    ("overflow", "gauge", "Connections opened beyond the pool size."),
+    ("checkouts", "counter", "Connections handed out since start."),
+    ("wait_seconds_total", "counter", "Time spent waiting for a connection."),
+    ("wait_seconds_max", "gauge", "Longest wait for a connection."),
+)
+
+
+def render(pool_stats: dict) -> str:
+    """Everything in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    for field, kind, help in POOL_METRICS:
+        samples = [({"engine": engine}, entry[field]) for engine, entry in pool_stats.items() if field in entry]
+        if samples:
+            name = f"db_pool_{field}" + ("_total" if kind == "counter" and not field.endswith("_total") else "")
+            lines += _samples(name, kind, help, samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,91 @@
+from fastapi import HTTPException, status
+from concurrent.futures import ThreadPoolExecutor
+from utils.functions import pwd_context
+import asyncio, os, threading
+
+# bcrypt runs on its own small pool so a burst of logins can't take the threads
+# every sync endpoint shares. Work beyond the queue limit is refused right away.
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 64))
+HASH_TIMEOUT = float(os.getenv("PASSWORD_HASH_TIMEOUT", 10))
+HASH_RETRY_AFTER = os.getenv("PASSWORD_HASH_RETRY_AFTER", "2")
+
+
+class PasswordHasher:
+    """
+    Bounded executor for password hashing. At most `queue_size` hashes are
+    running or waiting; callers wait at most `timeout` seconds for theirs.
+    Both limits answer 503 with Retry-After.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+            return self._executor
+
+    def _busy(self, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": HASH_RETRY_AFTER}
+        )
+
+    def _finished(self, _future) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def run(self, fn, *args):
+        with self._lock:
+            if self.in_flight >= self.queue_size:
+                self.rejected += 1
+                raise self._busy("Too many logins in progress, retry shortly")
+            self.in_flight += 1
+        # The slot is given back when the hash really finishes, even if the caller stopped waiting
+        future = self._get_executor().submit(fn, *args)
+        future.add_done_callback(self._finished)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timed_out += 1
+            raise self._busy("Password check timed out, retry shortly")
+
+    async def hash(self, password: str) -> str:
+        return await self.run(pwd_context.hash, password)
+
+    async def verify(self, password: str, hashed: str) -> tuple[bool, str | None]:
+        """Check a password; the second value is a new hash when the stored one uses old settings."""
+        return await self.run(pwd_context.verify_and_update, password, hashed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+hasher = PasswordHasher(HASH_WORKERS, HASH_QUEUE_SIZE, HASH_TIMEOUT)
@@ -0,0 +1,191 @@
+from pydantic import ValidationError
+from sqlalchemy import select, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import models
+from utils.changes import record_changes
+from utils import stock, images
+from schemas.product_schema import ProductImportRow, ImportConflict, ImportFormat, ImportReport, ImportRowError
+from datetime import datetime, UTC
+from uuid import UUID, uuid4
+from collections import Counter
+import csv, io, json
+
+# The report keeps counting past this, it just stops listing every bad row
+MAX_REPORTED_ERRORS = 1000
+
+
+def detect_format(filename: str | None, content_type: str | None) -> ImportFormat:
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson")) or content_type in ("application/x-ndjson", "application/jsonl"):
+        return ImportFormat.jsonl
+    return ImportFormat.csv
+
+
+def iter_rows(stream, fmt: ImportFormat):
+    """
+    Yield (row number, fields, error) for each record of a binary upload, reading
+    it line by line so the whole file never sits in memory. Empty CSV cells are
+    dropped so the row model defaults apply.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    try:
+        if fmt == ImportFormat.csv:
+            reader = csv.DictReader(text)
+            for row in reader:
+                fields = {k.strip(): v.strip() for k, v in row.items() if k and v not in (None, "")}
+                yield reader.line_num, fields, None
+        else:
+            for line_no, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    fields = json.loads(line)
+                except ValueError as e:
+                    yield line_no, None, f"Invalid JSON: {e}"
+                    continue
+                if not isinstance(fields, dict):
+                    yield line_no, None, "Expected a JSON object"
+                    continue
+                yield line_no, fields, None
+    finally:
+        # Leave the upload's file open, UploadFile closes it
+        text.detach()
+
+
+class ProductImporter:
+    """Writes validated import rows batch by batch, one transaction per batch."""
+
+    def __init__(self, db: Session, created_by: UUID, on_conflict: ImportConflict):
+        self.db = db
+        self.created_by = created_by
+        self.on_conflict = on_conflict
+        self.report = ImportReport()
+
+    def fail(self, row: int, error: str, sku: str | None = None) -> None:
+        self.report.failed += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append(ImportRowError(row=row, sku=sku, error=error))
+        else:
+            self.report.errors_truncated = True
+
+    def write_batch(self, batch: list[tuple[int, dict]]) -> None:
+        # Validate first, later rows for the same SKU replace (update) or lose to (skip) earlier ones
+        pending: dict[str, tuple[int, dict]] = {}
+        for row_no, fields in batch:
+            try:
+                data = ProductImportRow.model_validate(fields).model_dump()
+            except ValidationError as e:
+                error = "; ".join(f"{'.'.join(map(str, err['loc'])) or 'row'}: {err['msg']}" for err in e.errors())
+                self.fail(row_no, error, fields.get("sku"))
+                continue
+            if data["sku"] in pending:
+                if self.on_conflict == ImportConflict.skip:
+                    self.report.skipped += 1
+                    continue
+                self.report.updated += 1
+            pending[data["sku"]] = (row_no, data)
+
+        if not pending:
+            return
+        # A concurrent import may commit one of our new SKUs first; the retry sees it as existing
+        for attempt in (1, 2):
+            try:
+                inserted, updated, skipped = self._write(pending)
+            except IntegrityError as e:
+                self.db.rollback()
+                if attempt == 2:
+                    for row_no, data in pending.values():
+                        self.fail(row_no, f"Could not be written: {e.orig}", data["sku"])
+                continue
+            self.report.inserted += inserted
+            self.report.updated += updated
+            self.report.skipped += skipped
+            return
+
+    def _write(self, pending: dict[str, tuple[int, dict]]) -> tuple[int, int, int]:
+        # One set based lookup for every SKU of the batch, locked when we may overwrite stock
+        P = models.Product
+        query = select(P.sku, P.id, P.quantity, P.stock_slots, P.front_image, P.back_image) \
+            .where(models.Product.sku.in_(list(pending)))
+        if self.on_conflict == ImportConflict.update:
+            query = query.order_by(models.Product.id).with_for_update()
+        existing = {row.sku: row for row in self.db.execute(query)}
+
+        now = datetime.now(UTC)
+        inserts, updates, sharded, ledger = [], [], [], []
+        # Image references taken and dropped, counted like edit_product does
+        acquired, released = Counter(), Counter()
+        for sku, (_, data) in pending.items():
+            if sku not in existing:
+                inserts.append({**data, "id": uuid4(), "created_by": self.created_by,
+                                "created_at": now, "last_modified": now})
+                ledger += stock.movements(models.MovementKindDB.RECEIPT, {inserts[-1]["id"]: data["quantity"]},
+                                          created_by=self.created_by, note="Imported")
+                acquired.update([data["front_image"], *data["back_image"]])
+            elif self.on_conflict == ImportConflict.update:
+                current = existing[sku]
+                row = {**data, "id": current.id, "last_modified": now}
+                if current.stock_slots:
+                    # Their stock lives in stock_shards, set_level rewrites it there
+                    sharded.append((current.id, row.pop("quantity")))
+                else:
+                    ledger += stock.movements(models.MovementKindDB.ADJUSTMENT, {current.id: data["quantity"] - current.quantity},
+                                              created_by=self.created_by, note="Imported")
+                updates.append(row)
+                old_images = Counter([current.front_image, *(current.back_image or [])])
+                new_images = Counter([data["front_image"], *data["back_image"]])
+                acquired += new_images - old_images
+                released += old_images - new_images
+
+        if inserts:
+            self.db.execute(insert(models.Product), inserts)
+        if updates:
+            # ORM bulk UPDATE by primary key, executemany under the hood
+            self.db.execute(update(models.Product), updates)
+        for product_id, quantity in sharded:
+            delta = stock.set_level(self.db, self.db.get(models.Product, product_id), quantity)
+            ledger += stock.movements(models.MovementKindDB.ADJUSTMENT, {product_id: delta},
+                                      created_by=self.created_by, note="Imported")
+        stock.record_movements(self.db, ledger)
+        images.acquire(self.db, list(acquired.elements()))
+        unused = images.release(self.db, list(released.elements()))
+        record_changes(self.db, [row["id"] for row in inserts + updates])
+        self.db.commit()
+        if unused:
+            images.remove_files(images.reclaim(self.db, unused))
+            self.db.commit()
+        return len(inserts), len(updates), len(pending) - len(inserts) - len(updates)
+
+def import_products(
+    db: Session,
+    stream,
+    fmt: ImportFormat,
+    created_by: UUID,
+    on_conflict: ImportConflict = ImportConflict.skip,
+    batch_size: int = 500,
+) -> ImportReport:
+    """
+    Stream a CSV or JSONL upload into the products table. Only one batch of rows
+    is held at a time and each batch is committed on its own, so a bad row or a
+    failure late in the file never undoes the batches before it.
+    """
+    importer = ProductImporter(db, created_by, on_conflict)
+    batch = []
+    last_row = 0
+    try:
+        for row_no, fields, error in iter_rows(stream, fmt):
+            last_row = row_no
+            if error:
+                importer.fail(row_no, error)
+                continue
+            batch.append((row_no, fields))
+            if len(batch) >= batch_size:
+                importer.write_batch(batch)
+                batch = []
+    except (UnicodeDecodeError, csv.Error) as e:
+        # The rest of the file can't be read reliably, keep what was parsed so far
+        importer.fail(last_row + 1, f"Unreadable input, import stopped: {e}")
+    if batch:
+        importer.write_batch(batch)
+    return importer.report
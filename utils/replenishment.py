@@ -0,0 +1,138 @@
+from sqlalchemy import select, func, insert, delete
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import models
+from database.database import SessionLocal
+from utils import cache, stock
+from datetime import date, datetime, timedelta, UTC
+from math import ceil, sqrt
+import asyncio, logging, os
+
+# Days of sales history the demand rate is estimated from
+REPLENISH_HISTORY_DAYS = int(os.getenv("REPLENISH_HISTORY_DAYS", 90))
+# Safety factor on demand variability over the lead time, 1.65 covers ~95% of lead times
+REPLENISH_SERVICE_Z = float(os.getenv("REPLENISH_SERVICE_Z", 1.65))
+# An order covers the lead time plus this many days of demand
+REPLENISH_REVIEW_DAYS = int(os.getenv("REPLENISH_REVIEW_DAYS", 14))
+# How often the suggestions are rebuilt, 0 turns the background job off
+REPLENISH_SECONDS = float(os.getenv("REPLENISH_SECONDS", 3600))
+# Rows fetched and inserted per round trip
+CHUNK = 5000
+
+log = logging.getLogger(__name__)
+
+
+def demand(db: Session, first_day: date, last_day: date) -> dict:
+    """
+    {product_id: (units, sum of squared daily units)} over the days, from the
+    daily rollup. Days without sales are the zeros of the series, so only the
+    sums are needed for the mean and the variance. Refunded sales don't count.
+    """
+    R = models.SalesDailyRollup
+    daily = (
+        select(R.product_id, R.day, func.sum(R.units_sold).label("units"))
+        .where(
+            R.product_id != models.SALE_TOTALS_PRODUCT_ID,
+            R.status != models.SaleStatusDB.REFUNDED,
+            R.day >= first_day,
+            R.day <= last_day,
+        )
+        .group_by(R.product_id, R.day)
+        .subquery()
+    )
+    rows = db.execute(
+        select(daily.c.product_id, func.sum(daily.c.units), func.sum(daily.c.units * daily.c.units))
+        .group_by(daily.c.product_id)
+    )
+    return {product_id: (units, squares) for product_id, units, squares in rows}
+
+
+def suggest(units: int, squares: int, days: int, on_hand: int, lead_time: int, pack_size: int) -> dict | None:
+    """
+    Reorder point and order quantity of one product. The reorder point is the
+    demand expected over the lead time plus safety stock for its variability.
+    Once stock is at or below it, order enough whole packs to get back to the
+    reorder point plus REPLENISH_REVIEW_DAYS of demand. None when there's
+    nothing to order.
+    """
+    rate = units / days
+    spread = sqrt(max(squares / days - rate * rate, 0.0))
+    safety_stock = ceil(REPLENISH_SERVICE_Z * spread * sqrt(lead_time))
+    reorder_point = ceil(rate * lead_time) + safety_stock
+    if not units or on_hand > reorder_point:
+        return None
+    wanted = reorder_point + ceil(rate * REPLENISH_REVIEW_DAYS) - on_hand
+    order_quantity = ceil(wanted / pack_size) * pack_size
+    if order_quantity <= 0:
+        return None
+    return {
+        "demand_per_day": rate, "safety_stock": safety_stock,
+        "reorder_point": reorder_point, "order_quantity": order_quantity,
+    }
+
+
+def plan(db: Session, today: date | None = None) -> list[dict]:
+    """
+    One suggestion per product that has a supplier and has reached its
+    reorder point, ordered from its preferred supplier, else the one with the
+    shortest lead time, then the cheapest. The whole catalog takes two queries:
+    demand per product, and the supplier terms with live stock.
+    """
+    last_day = today or date.today()
+    first_day = last_day - timedelta(days=REPLENISH_HISTORY_DAYS - 1)
+    sold = demand(db, first_day, last_day)
+    computed_at = datetime.now(UTC)
+
+    S, P = models.SupplierProduct, models.Product
+    terms = db.execute(
+        select(S.product_id, S.supplier_id, S.lead_time_days, S.pack_size, S.unit_cost, stock.on_hand())
+        .join(P, P.id == S.product_id)
+        .order_by(S.product_id, S.preferred.desc(), S.lead_time_days, S.unit_cost, S.supplier_id)
+        .execution_options(yield_per=CHUNK)
+    )
+    suggestions, last_product = [], None
+    for product_id, supplier_id, lead_time, pack_size, unit_cost, on_hand in terms:
+        # Rows come best supplier first, the others of the product are skipped
+        if product_id == last_product:
+            continue
+        last_product = product_id
+        units, squares = sold.get(product_id, (0, 0))
+        figures = suggest(units, squares, REPLENISH_HISTORY_DAYS, on_hand, lead_time, pack_size)
+        if figures:
+            suggestions.append({
+                "product_id": product_id, "supplier_id": supplier_id, "on_hand": on_hand,
+                "unit_cost": unit_cost, "computed_at": computed_at, **figures,
+            })
+    return suggestions
+
+
+def rebuild(db: Session, today: date | None = None) -> int:
+    """Replace the suggestions table with a fresh plan, in one transaction. Returns the row count."""
+    suggestions = plan(db, today)
+    db.execute(delete(models.ReplenishmentSuggestion))
+    for start in range(0, len(suggestions), CHUNK):
+        db.execute(insert(models.ReplenishmentSuggestion), suggestions[start:start + CHUNK])
+    db.commit()
+    cache.bump(cache.SUPPLIERS)
+    return len(suggestions)
+
+
+def rebuild_all() -> int:
+    with SessionLocal() as db:
+        return rebuild(db)
+
+
+async def replenish_periodically() -> None:
+    """Run rebuild_all every REPLENISH_SECONDS for as long as the app runs."""
+    if REPLENISH_SECONDS <= 0:
+        return
+    while True:
+        await asyncio.sleep(REPLENISH_SECONDS)
+        try:
+            await run_in_threadpool(rebuild_all)
+        except Exception:
+            log.exception("Rebuilding replenishment suggestions failed")
+
+
+if __name__ == "__main__":
+    print(f"{rebuild_all()} products to reorder.")
@@ -0,0 +1,131 @@
+from sqlalchemy import select, insert, text
+from sqlalchemy.dialects import postgresql, sqlite, mysql
+from sqlalchemy.orm import Session, selectinload
+from database import models
+from datetime import datetime, date, UTC
+
+rollup = models.SalesDailyRollup.__table__
+
+KEY = ["day", "status", "sold_by", "product_id"]
+MEASURES = ["sales_count", "units_sold", "revenue", "cost", "taxes"]
+
+
+def sale_day(sold_at: datetime) -> date:
+    if sold_at.tzinfo is not None:
+        sold_at = sold_at.astimezone(UTC)
+    return sold_at.date()
+
+
+def _deltas(sale: models.Sale, sign: int) -> dict:
+    """Rollup increments of one sale, keyed by product_id (SALE_TOTALS_PRODUCT_ID for the sale level row)."""
+    deltas = {
+        models.SALE_TOTALS_PRODUCT_ID: {"product_name": None, "sales_count": sign, "units_sold": 0,
+                                        "revenue": sign * sale.total, "cost": 0.0, "taxes": sign * sale.taxes}
+    }
+    for line in sale.products:
+        row = deltas.setdefault(line.product_id, {
+            "product_name": line.product_name, "sales_count": sign, "units_sold": 0,
+            "revenue": 0.0, "cost": 0.0, "taxes": 0.0
+        })
+        row["units_sold"] += sign * line.quantity_sold
+        row["revenue"] += sign * (line.selling_price * line.quantity_sold - line.discount)
+        row["cost"] += sign * (line.cost_price or 0.0) * line.quantity_sold
+    return deltas
+
+
+def _upsert(dialect: str, rows: list[dict]):
+    """INSERT the rows, adding the measures onto any row that already has the same key."""
+    if dialect == "mysql":
+        stmt = mysql.insert(rollup).values(rows)
+        return stmt.on_duplicate_key_update({m: rollup.c[m] + stmt.inserted[m] for m in MEASURES})
+    if dialect == "postgresql":
+        stmt = postgresql.insert(rollup).values(rows)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(rollup).values(rows)
+    else:
+        raise NotImplementedError(f"Sales rollup upsert isn't supported on {dialect}")
+    return stmt.on_conflict_do_update(
+        index_elements=KEY,
+        set_={m: rollup.c[m] + stmt.excluded[m] for m in MEASURES}
+    )
+
+
+def _accumulate(totals: dict, sale: models.Sale, sign: int = 1, status=None) -> None:
+    """Add a sale's deltas into `totals`, keyed by the full rollup key."""
+    key = (sale_day(sale.sold_at), models.SaleStatusDB(status or sale.status), sale.sold_by)
+    for product_id, d in _deltas(sale, sign).items():
+        row = totals.get(key + (product_id,))
+        if row is None:
+            totals[key + (product_id,)] = d
+            continue
+        for field in MEASURES:
+            row[field] += d[field]
+
+
+def _rows(totals: dict) -> list[dict]:
+    return [
+        {"day": day, "status": status, "sold_by": sold_by, "product_id": product_id, **d}
+        for (day, status, sold_by, product_id), d in totals.items()
+    ]
+
+
+def apply_sales(db: Session, sales, sign: int = 1, status=None) -> None:
+    """
+    Add (sign=1) or take back (sign=-1) the contribution of several sales to the
+    daily rollup, using `status` instead of each sale's own status when given.
+    Rows sharing a key are merged first, so it's one multi-row upsert whatever
+    the number of sales; concurrent writers hitting the same key serialize on
+    the unique index instead of creating duplicate rows.
+    """
+    totals = {}
+    for sale in sales:
+        _accumulate(totals, sale, sign, status)
+    if totals:
+        db.execute(_upsert(db.get_bind().dialect.name, _rows(totals)))
+
+
+def apply_sale(db: Session, sale: models.Sale, sign: int = 1, status=None) -> None:
+    apply_sales(db, [sale], sign, status)
+
+
+def normalize_legacy_enums(db: Session) -> None:
+    """
+    Sales written before enum members were stored directly hold names like
+    'COMPLETED' / 'CASH' instead of the enum values. Postgres native enums never
+    accepted those, so only the string backed dialects need fixing.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        return
+    db.execute(text("UPDATE sales SET status = LOWER(status) WHERE status <> LOWER(status)"))
+    db.execute(text("UPDATE sales SET payment_method = LOWER(payment_method) WHERE payment_method <> LOWER(payment_method)"))
+
+
+def rebuild(db: Session, chunk_size: int = 1000) -> None:
+    """Recompute the whole rollup from sales/products_sold, for existing databases."""
+    normalize_legacy_enums(db)
+
+    totals = {}
+    sales = db.scalars(
+        select(models.Sale)
+        .options(selectinload(models.Sale.products))
+        .execution_options(yield_per=chunk_size)
+    )
+    for sale in sales:
+        _accumulate(totals, sale)
+
+    db.execute(rollup.delete())
+    rows = _rows(totals)
+    for start in range(0, len(rows), chunk_size):
+        db.execute(insert(rollup), rows[start:start + chunk_size])
+    db.commit()
+
+
+if __name__ == "__main__":
+    from database.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        rebuild(db)
+        print("Sales rollup rebuilt.")
+    finally:
+        db.close()
@@ -0,0 +1,88 @@
+from sqlalchemy import select
+from database import models
+from database.database import SessionLocal
+from schemas.sales_schema import ExportFormat
+from datetime import datetime
+from enum import Enum
+from uuid import UUID
+import csv, io, json, os, zlib
+
+# Rows fetched per round trip; on PostgreSQL they come from a server-side cursor
+EXPORT_BATCH = int(os.getenv("SALES_EXPORT_BATCH", 1000))
+# Bytes buffered before a chunk is handed to the response
+CHUNK_SIZE = 64 * 1024
+
+S, L = models.Sale, models.ProductSold
+SALE_COLUMNS = [
+    S.id.label("sale_id"), S.sold_at, S.status, S.payment_method, S.payment_reference, S.currency,
+    S.buyer_name, S.buyer_phone, S.buyer_email, S.sold_by, S.location_id, S.subtotal, S.total_discount, S.taxes,
+    S.total, S.notes,
+]
+LINE_COLUMNS = [
+    L.id.label("line_id"), L.product_id, L.product_name, L.quantity_sold, L.selling_price,
+    L.cost_price, L.discount.label("line_discount"),
+]
+COLUMNS = [c.key for c in SALE_COLUMNS + LINE_COLUMNS]
+
+
+def export_query(start: datetime | None, end: datetime | None):
+    """One row per sold line, sales without lines still get a row, oldest first."""
+    stmt = select(*SALE_COLUMNS, *LINE_COLUMNS).select_from(S).outerjoin(L, L.sale_id == S.id)
+    if start:
+        stmt = stmt.where(S.sold_at >= start)
+    if end:
+        stmt = stmt.where(S.sold_at < end)
+    return stmt.order_by(S.sold_at, S.id, L.id)
+
+
+def _plain(value):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+def sale_lines(start: datetime | None, end: datetime | None):
+    """
+    Stream the export rows with their own session. The response body is sent after
+    the request's dependencies are closed, so the route's session can't be used.
+    """
+    with SessionLocal() as db:
+        result = db.execute(export_query(start, end).execution_options(yield_per=EXPORT_BATCH))
+        for row in result:
+            yield [_plain(v) for v in row]
+
+
+def _chunks(rows, fmt: ExportFormat):
+    buffer = io.StringIO()
+    if fmt == ExportFormat.csv:
+        writer = csv.writer(buffer)
+        writer.writerow(COLUMNS)
+        write = writer.writerow
+    else:
+        write = lambda row: buffer.write(json.dumps(dict(zip(COLUMNS, row))) + "\n")
+    for row in rows:
+        write(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_sales(start: datetime | None, end: datetime | None, fmt: ExportFormat, gzip: bool = False):
+    """Bytes of the export, produced as they are read so memory doesn't grow with the range."""
+    chunks = _chunks(sale_lines(start, end), fmt)
+    return _gzip(chunks) if gzip else chunks
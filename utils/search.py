@@ -0,0 +1,125 @@
+from sqlalchemy import text, bindparam, Float, Integer, Uuid
+from sqlalchemy.orm import Session
+from database import models
+from uuid import UUID
+import os, re
+
+# Words beyond this are ignored, a typeahead box never needs more
+MAX_TERMS = 8
+# Only this many matches are ranked. A one or two letter prefix can match most
+# of the catalog, and scoring all of it would cost a keystroke ~100ms at 100k
+# products; once the words narrow the matches below the cap, ranking is exact.
+MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", 2000))
+
+# Column weights for SQLite's bm25, in products_fts column order (product_id is never searched)
+BM25_WEIGHTS = "0.0, 10.0, 4.0, 2.0, 8.0, 1.0"
+FTS_COLUMNS = "{product_name brand category sku description}"
+
+# Each dialect yields (id, score) for every match, lower score ranks first
+PRODUCT_HITS = {
+    "sqlite": (
+        f"SELECT product_id AS id, bm25(products_fts, {BM25_WEIGHTS}) AS score "
+        "FROM products_fts WHERE products_fts MATCH :query"
+    ),
+    "postgresql": (
+        f"SELECT id, -ts_rank({models.PRODUCT_SEARCH_VECTOR}, q) AS score "
+        f"FROM products, to_tsquery('simple', :query) AS q WHERE ({models.PRODUCT_SEARCH_VECTOR}) @@ q"
+    ),
+    "mysql": (
+        "SELECT id, -MATCH (product_name, brand, category, sku, description) "
+        "AGAINST (:query IN BOOLEAN MODE) AS score FROM products "
+        "WHERE MATCH (product_name, brand, category, sku, description) AGAINST (:query IN BOOLEAN MODE)"
+    ),
+}
+
+# Supplier search keeps matching anywhere in the name or contact person. Trigram
+# indexes serve queries of at least three characters, shorter ones are a plain LIKE.
+TRIGRAM = 3
+SUPPLIER_HITS = {
+    "sqlite": (
+        "SELECT rowid AS id, bm25(suppliers_fts, 2.0, 1.0) AS score "
+        "FROM suppliers_fts WHERE suppliers_fts MATCH :query"
+    ),
+    "postgresql": (
+        "SELECT id, -greatest(similarity(name, :q), similarity(contact_person, :q)) AS score "
+        "FROM suppliers WHERE name ILIKE :pattern OR contact_person ILIKE :pattern"
+    ),
+}
+SUPPLIER_LIKE = (
+    "SELECT id, 0.0 AS score FROM suppliers "
+    "WHERE name LIKE :pattern ESCAPE '\\' OR contact_person LIKE :pattern ESCAPE '\\'"
+)
+
+
+def terms(q: str) -> list[str]:
+    """Lower-cased words of the search box; punctuation and underscores only separate words."""
+    return re.findall(r"[^\W_]+", q.lower())[:MAX_TERMS]
+
+
+def match_expression(dialect: str, words: list[str]) -> str:
+    """Every word must match, each one as a prefix of an indexed word."""
+    if dialect == "sqlite":
+        return f"{FTS_COLUMNS} : (" + " AND ".join(f'"{w}"*' for w in words) + ")"
+    if dialect == "postgresql":
+        return " & ".join(f"{w}:*" for w in words)
+    if dialect == "mysql":
+        return " ".join(f"+{w}*" for w in words)
+    raise NotImplementedError(f"Product search isn't supported on {dialect}")
+
+
+def _ranked_page(db: Session, hits: str, params: dict, id_type, limit: int, after):
+    """One page of an (id, score) query, plus its last hit when another page follows."""
+    sql = f"WITH hits AS ({hits} LIMIT :candidates) SELECT id, score FROM hits"
+    params = {**params, "candidates": MAX_CANDIDATES, "limit": limit + 1}
+    if after:
+        sql += " WHERE score > :score OR (score = :score AND id > :after_id)"
+        params.update(score=after[0], after_id=after[1])
+    sql += " ORDER BY score, id LIMIT :limit"
+
+    stmt = text(sql)
+    if after:
+        stmt = stmt.bindparams(bindparam("after_id", type_=id_type))
+    rows = db.execute(stmt.columns(id=id_type, score=Float), params).all()
+    if len(rows) > limit:
+        return rows[:limit], rows[limit - 1]
+    return rows, None
+
+
+def _load(db: Session, model, hits) -> list:
+    if not hits:
+        return []
+    found = {row.id: row for row in db.query(model).filter(model.id.in_([h.id for h in hits]))}
+    return [found[h.id] for h in hits if h.id in found]
+
+
+def search_products(db: Session, q: str, limit: int, after: tuple[float, UUID] | None = None):
+    """
+    One page of products matching `q`, best first, plus the page's last hit
+    when another page follows. `after` is the (score, id) of that hit.
+    """
+    words = terms(q)
+    if not words:
+        return [], None
+    dialect = db.get_bind().dialect.name
+    if dialect not in PRODUCT_HITS:
+        raise NotImplementedError(f"Product search isn't supported on {dialect}")
+    hits, last = _ranked_page(db, PRODUCT_HITS[dialect], {"query": match_expression(dialect, words)}, Uuid, limit, after)
+    return _load(db, models.Product, hits), last
+
+
+def search_suppliers(db: Session, q: str, limit: int, after: tuple[float, int] | None = None):
+    """Like search_products, for suppliers whose name or contact person contains `q`."""
+    q = q.strip()
+    if not q:
+        return [], None
+    dialect = db.get_bind().dialect.name
+    pattern = "%" + re.sub(r"([\\%_])", r"\\\1", q) + "%"
+    if len(q) >= TRIGRAM and dialect == "sqlite":
+        # A quoted phrase of trigrams matches the text as a substring
+        hits, params = SUPPLIER_HITS["sqlite"], {"query": '"' + q.replace('"', '""') + '"'}
+    elif len(q) >= TRIGRAM and dialect == "postgresql":
+        hits, params = SUPPLIER_HITS["postgresql"], {"q": q, "pattern": pattern}
+    else:
+        hits, params = SUPPLIER_LIKE, {"pattern": pattern}
+    hits, last = _ranked_page(db, hits, params, Integer, limit, after)
+    return _load(db, models.Supplier, hits), last
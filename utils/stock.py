@@ -0,0 +1,450 @@
+from fastapi import HTTPException, status
+from sqlalchemy import update, case, select, insert, delete, func, bindparam, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite, mysql
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import models
+from database.database import SessionLocal
+from utils.changes import record_changes
+from utils import cache
+from uuid import UUID
+import asyncio, logging, os, random
+
+# Slots a hot product's stock is spread over by default when it is sharded
+STOCK_SHARDS = int(os.getenv("STOCK_SHARDS", 8))
+# How often sharded stock is folded back into products.quantity, 0 turns it off
+STOCK_FOLD_SECONDS = float(os.getenv("STOCK_FOLD_SECONDS", 30))
+
+shards = models.StockShard.__table__
+location_stock = models.LocationStock.__table__
+log = logging.getLogger(__name__)
+
+
+def lock_products(db: Session, product_ids) -> dict[UUID, models.Product]:
+    """
+    Load every product of a basket in one query. Rows are locked in primary key
+    order so two checkouts touching the same SKUs can't deadlock each other.
+    Sharded products are left unlocked, their stock lives in stock_shards and
+    is taken by reserve_shards; they (and unknown ids) cost a second query.
+    """
+    ids = set(product_ids)
+    rows = (
+        db.query(models.Product)
+        .filter(models.Product.id.in_(list(ids)), models.Product.stock_slots == 0)
+        .order_by(models.Product.id)
+        .with_for_update()
+        .all()
+    )
+    products = {p.id: p for p in rows}
+    if len(products) < len(ids):
+        rest = db.query(models.Product).filter(models.Product.id.in_(list(ids - products.keys())))
+        products.update((p.id, p) for p in rest)
+    return products
+
+
+def split_sharded(quantities: dict[UUID, int], products: dict) -> tuple[dict, dict]:
+    """({product_id: units} of plain products, the same for sharded ones)."""
+    plain, hot = {}, {}
+    for product_id, units in quantities.items():
+        product = products.get(product_id)
+        (hot if product is not None and product.stock_slots else plain)[product_id] = units
+    return plain, hot
+
+
+def _shard_totals(product_ids):
+    return (
+        select(shards.c.product_id, func.coalesce(func.sum(shards.c.quantity), 0))
+        .where(shards.c.product_id.in_(list(product_ids)))
+        .group_by(shards.c.product_id)
+    )
+
+
+def available_stock(db: Session, products: dict) -> dict[UUID, int]:
+    """Units each loaded product has now: quantity, or the sum of its shards when sharded."""
+    available = {product_id: p.quantity for product_id, p in products.items()}
+    hot = [product_id for product_id, p in products.items() if p.stock_slots]
+    if hot:
+        available.update(db.execute(_shard_totals(hot)).all())
+    return available
+
+
+def on_hand():
+    """SQL expression for a product's live stock: quantity, or the sum of its shards when sharded."""
+    P = models.Product
+    shard_total = (
+        select(func.coalesce(func.sum(shards.c.quantity), 0))
+        .where(shards.c.product_id == P.id)
+        .scalar_subquery()
+    )
+    return case((P.stock_slots > 0, shard_total), else_=P.quantity)
+
+
+def current_stock(db: Session, product_ids) -> dict[UUID, int]:
+    """Like available_stock, straight from the database in one query."""
+    P = models.Product
+    return dict(db.execute(select(P.id, on_hand()).where(P.id.in_(list(product_ids)))).all())
+
+
+def reserve_stock(db: Session, quantities: dict[UUID, int]) -> None:
+    """
+    Take `quantities` ({product_id: units}) out of stock with a single UPDATE.
+    Each row is only touched while it still holds enough units, so a concurrent
+    checkout that got there first makes the whole reservation fail instead of
+    driving stock negative.
+    """
+    if not quantities:
+        return
+    needed = case(quantities, value=models.Product.id)
+    result = db.execute(
+        update(models.Product)
+        .where(models.Product.id.in_(list(quantities)), models.Product.quantity >= needed)
+        .values(quantity=models.Product.quantity - needed)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(quantities):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Stock changed while processing the sale, not enough units left"
+        )
+
+
+_take_from_slot = (
+    update(shards)
+    .where(shards.c.product_id == bindparam("b_product"), shards.c.slot == bindparam("b_slot"))
+    .values(quantity=shards.c.quantity - bindparam("b_units"))
+)
+
+
+def reserve_shards(db: Session, quantities: dict[UUID, int], products: dict) -> None:
+    """
+    reserve_stock for sharded products. Each product is first tried on one
+    random slot with a guarded decrement, the only row the checkout locks. If
+    that slot runs short, all of the product's slots are locked in slot order
+    and the units are taken from as many as it needs. Products go in id order,
+    so checkouts can't deadlock on each other's slots.
+    """
+    for product_id in sorted(quantities):
+        units = quantities[product_id]
+        slot = random.randrange(products[product_id].stock_slots)
+        taken = db.execute(
+            update(shards)
+            .where(shards.c.product_id == product_id, shards.c.slot == slot, shards.c.quantity >= units)
+            .values(quantity=shards.c.quantity - units)
+        )
+        if taken.rowcount:
+            continue
+
+        slots = db.execute(
+            select(shards.c.slot, shards.c.quantity)
+            .where(shards.c.product_id == product_id)
+            .order_by(shards.c.slot)
+            .with_for_update()
+        ).all()
+        if sum(quantity for _, quantity in slots) < units:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Stock changed while processing the sale, not enough units left"
+            )
+        plan = []
+        for slot, quantity in sorted(slots, key=lambda s: -s.quantity):
+            take = min(quantity, units)
+            plan.append({"b_product": product_id, "b_slot": slot, "b_units": take})
+            units -= take
+            if not units:
+                break
+        db.execute(_take_from_slot, plan)
+
+
+def restock(db: Session, quantities: dict[UUID, int], products: dict) -> None:
+    """Put units back ({product_id: units}): onto the product row, or onto one random slot when sharded."""
+    plain, hot = split_sharded({k: v for k, v in quantities.items() if v}, products)
+    if plain:
+        added = case(plain, value=models.Product.id)
+        db.execute(
+            update(models.Product)
+            .where(models.Product.id.in_(list(plain)))
+            .values(quantity=models.Product.quantity + added)
+            .execution_options(synchronize_session=False)
+        )
+    if hot:
+        db.execute(_take_from_slot, [
+            {"b_product": product_id, "b_slot": random.randrange(products[product_id].stock_slots), "b_units": -units}
+            for product_id, units in sorted(hot.items())
+        ])
+
+
+def load_locations(db: Session, location_ids) -> dict[UUID, models.Location]:
+    ids = [location_id for location_id in set(location_ids) if location_id]
+    if not ids:
+        return {}
+    return {l.id: l for l in db.query(models.Location).filter(models.Location.id.in_(ids))}
+
+
+def require_location(locations: dict, location_id: UUID) -> models.Location:
+    """The location a sale or movement names, which has to exist and still be open."""
+    location = locations.get(location_id)
+    if not location:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Location with ID {location_id} not found")
+    if not location.is_active:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Location '{location.name}' is not active")
+    return location
+
+
+def location_levels(db: Session, pairs, lock: bool = False) -> dict[tuple[UUID, UUID], int]:
+    """
+    Units held per (location_id, product_id) in one query, 0 for pairs with no
+    row yet. Each location's rows are found through the primary key.
+    """
+    wanted = {}
+    for location_id, product_id in pairs:
+        wanted.setdefault(location_id, set()).add(product_id)
+    if not wanted:
+        return {}
+    query = select(location_stock.c.location_id, location_stock.c.product_id, location_stock.c.quantity).where(or_(*(
+        and_(location_stock.c.location_id == location_id, location_stock.c.product_id.in_(list(product_ids)))
+        for location_id, product_ids in wanted.items()
+    )))
+    if lock:
+        query = query.order_by(location_stock.c.location_id, location_stock.c.product_id).with_for_update()
+    levels = {(location_id, product_id): 0 for location_id, product_ids in wanted.items() for product_id in product_ids}
+    levels.update(((location_id, product_id), quantity) for location_id, product_id, quantity in db.execute(query))
+    return levels
+
+
+def take_from_location(db: Session, location_id: UUID, quantities: dict[UUID, int]) -> None:
+    """reserve_stock for one location's rows: all or nothing, never below zero."""
+    if not quantities:
+        return
+    needed = case(quantities, value=location_stock.c.product_id)
+    result = db.execute(
+        update(location_stock)
+        .where(
+            location_stock.c.location_id == location_id,
+            location_stock.c.product_id.in_(list(quantities)),
+            location_stock.c.quantity >= needed,
+        )
+        .values(quantity=location_stock.c.quantity - needed)
+    )
+    if result.rowcount != len(quantities):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Stock changed while processing the sale, not enough units left"
+        )
+
+
+def _location_upsert(dialect: str, rows: list[dict]):
+    """INSERT the rows, adding quantity onto a row that already exists, like rollup._upsert."""
+    if dialect == "mysql":
+        stmt = mysql.insert(location_stock).values(rows)
+        return stmt.on_duplicate_key_update(quantity=location_stock.c.quantity + stmt.inserted.quantity)
+    if dialect == "postgresql":
+        stmt = postgresql.insert(location_stock).values(rows)
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(location_stock).values(rows)
+    else:
+        raise NotImplementedError(f"Location stock upsert isn't supported on {dialect}")
+    return stmt.on_conflict_do_update(
+        index_elements=["location_id", "product_id"],
+        set_={"quantity": location_stock.c.quantity + stmt.excluded.quantity}
+    )
+
+
+def add_to_location(db: Session, location_id: UUID, quantities: dict[UUID, int]) -> None:
+    """Put units ({product_id: units}) on a location's shelves, creating its rows as needed."""
+    rows = [
+        {"location_id": location_id, "product_id": product_id, "quantity": units}
+        for product_id, units in sorted(quantities.items()) if units
+    ]
+    if rows:
+        db.execute(_location_upsert(db.get_bind().dialect.name, rows))
+
+
+def transfer(db: Session, source: models.Location, destination: models.Location, quantities: dict[UUID, int],
+             created_by: UUID, note: str | None = None) -> list[models.InventoryMovement]:
+    """
+    Move units from one location to another. The source rows are locked and
+    checked first, so either every line moves or none does. Company-wide stock
+    doesn't change; the ledger gets a pair of TRANSFER rows per product.
+    Doesn't commit.
+    """
+    levels = location_levels(db, [(source.id, product_id) for product_id in quantities], lock=True)
+    for product_id, units in quantities.items():
+        if levels[(source.id, product_id)] < units:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Not enough stock of product {product_id} at '{source.name}'. Available: {levels[(source.id, product_id)]}"
+            )
+    take_from_location(db, source.id, quantities)
+    add_to_location(db, destination.id, quantities)
+    rows = [
+        models.InventoryMovement(
+            product_id=product_id, kind=models.MovementKindDB.TRANSFER, quantity=sign * units,
+            location_id=location.id, created_by=created_by, note=note
+        )
+        for product_id, units in sorted(quantities.items())
+        for sign, location in ((-1, source), (1, destination))
+    ]
+    db.add_all(rows)
+    return rows
+
+
+def movements(kind: models.MovementKindDB, quantities: dict[UUID, int], **fields) -> list[dict]:
+    """Ledger rows for signed {product_id: units}, sharing `fields` (sale_id, created_by, note)."""
+    return [
+        {"product_id": product_id, "kind": kind, "quantity": units, **fields}
+        for product_id, units in quantities.items() if units
+    ]
+
+
+def record_movements(db: Session, rows: list[dict]) -> None:
+    """Append rows to the ledger in one statement. Doesn't commit."""
+    if rows:
+        db.execute(insert(models.InventoryMovement), rows)
+
+
+def _spread(total: int, slots: int) -> list[int]:
+    return [total // slots + (slot < total % slots) for slot in range(slots)]
+
+
+def _lock_slots(db: Session, product_ids) -> dict[UUID, int]:
+    """Lock the shards of these products, in (product, slot) order, and return their totals."""
+    totals = {}
+    for product_id, quantity in db.execute(
+        select(shards.c.product_id, shards.c.quantity)
+        .where(shards.c.product_id.in_(list(product_ids)))
+        .order_by(shards.c.product_id, shards.c.slot)
+        .with_for_update()
+    ):
+        totals[product_id] = totals.get(product_id, 0) + quantity
+    return totals
+
+
+def _rewrite_slots(db: Session, levels: dict[UUID, tuple[int, int]]) -> None:
+    """Set each product's slots ({product_id: (total, slots)}) to an even split of total."""
+    rows = [
+        {"b_product": product_id, "b_slot": slot, "b_quantity": quantity}
+        for product_id, (total, slots) in levels.items()
+        for slot, quantity in enumerate(_spread(total, slots))
+    ]
+    if rows:
+        db.execute(
+            update(shards)
+            .where(shards.c.product_id == bindparam("b_product"), shards.c.slot == bindparam("b_slot"))
+            .values(quantity=bindparam("b_quantity")),
+            rows
+        )
+
+
+def set_level(db: Session, product: models.Product, quantity: int) -> int:
+    """
+    Set a (locked) product's stock to `quantity`, the way edit_product and
+    imports overwrite it. Returns the change, for the ledger.
+    """
+    if not product.stock_slots:
+        delta = quantity - product.quantity
+        product.quantity = quantity
+        return delta
+    current = _lock_slots(db, [product.id]).get(product.id, 0)
+    _rewrite_slots(db, {product.id: (quantity, product.stock_slots)})
+    product.quantity = quantity
+    return quantity - current
+
+
+def shard(db: Session, product: models.Product, slots: int) -> None:
+    """
+    Spread a (locked) product's stock over `slots` stock_shards rows, or fold it
+    back into the product row for good with slots=0. Stock itself doesn't change.
+    """
+    on_hand = product.quantity
+    if product.stock_slots:
+        on_hand = _lock_slots(db, [product.id]).get(product.id, 0)
+        db.execute(delete(shards).where(shards.c.product_id == product.id))
+    if slots:
+        db.execute(insert(shards), [
+            {"product_id": product.id, "slot": slot, "quantity": quantity}
+            for slot, quantity in enumerate(_spread(on_hand, slots))
+        ])
+    product.stock_slots = slots
+    product.quantity = on_hand
+
+
+def fold(db: Session) -> list[UUID]:
+    """
+    Write the shard totals of every sharded product back to products.quantity,
+    so listings, filters and the low-stock list see sales made since the last
+    fold, and even the slots out again: checkouts keep drawing on the same
+    random slots until one runs dry, which sends them down the slow path.
+    Returns the products whose quantity changed. Doesn't commit.
+    """
+    products = (
+        db.query(models.Product)
+        .filter(models.Product.stock_slots > 0)
+        .order_by(models.Product.id)
+        .with_for_update()
+        .all()
+    )
+    if not products:
+        return []
+    totals = _lock_slots(db, [p.id for p in products])
+    _rewrite_slots(db, {p.id: (totals.get(p.id, 0), p.stock_slots) for p in products})
+    changed = []
+    for product in products:
+        if product.quantity != totals.get(product.id, 0):
+            product.quantity = totals.get(product.id, 0)
+            changed.append(product.id)
+    return changed
+
+
+def ledger_total(db: Session, product_id: UUID) -> int:
+    return db.scalar(
+        select(func.coalesce(func.sum(models.InventoryMovement.quantity), 0))
+        .where(models.InventoryMovement.product_id == product_id)
+    )
+
+
+def stock_level(db: Session, product: models.Product) -> dict:
+    slots = []
+    if product.stock_slots:
+        slots = db.scalars(
+            select(shards.c.quantity).where(shards.c.product_id == product.id).order_by(shards.c.slot)
+        ).all()
+    locations = db.execute(
+        select(location_stock.c.location_id, location_stock.c.quantity)
+        .where(location_stock.c.product_id == product.id)
+        .order_by(location_stock.c.location_id)
+    ).all()
+    return {
+        "product_id": product.id,
+        "on_hand": sum(slots) if product.stock_slots else product.quantity,
+        "quantity": product.quantity,
+        "slots": slots,
+        "ledger_total": ledger_total(db, product.id),
+        "locations": [{"location_id": location_id, "quantity": quantity} for location_id, quantity in locations],
+    }
+
+
+def fold_all() -> list[UUID]:
+    """One fold in its own transaction, recorded in the change feed like any product write."""
+    with SessionLocal() as db:
+        changed = fold(db)
+        record_changes(db, changed)
+        db.commit()
+    if changed:
+        cache.bump(cache.PRODUCTS)
+    return changed
+
+
+async def fold_periodically() -> None:
+    """Run fold_all every STOCK_FOLD_SECONDS for as long as the app runs."""
+    if STOCK_FOLD_SECONDS <= 0:
+        return
+    while True:
+        await asyncio.sleep(STOCK_FOLD_SECONDS)
+        try:
+            await run_in_threadpool(fold_all)
+        except Exception:
+            log.exception("Folding sharded stock failed")
+
+
+if __name__ == "__main__":
+    print(f"Folded {len(fold_all())} sharded products.")